@@ -0,0 +1,111 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+
+from answer import trake_listing
+from answer.models import Answer, TeamAnswer, TeamTRAKEAnswer
+from answer.views import AnswerListCreateAPIView, TeamAnswerListCreateAPIView, filter_video_name
+
+
+class _Rollback(Exception):
+    pass
+
+
+def video_for(block: int) -> str:
+    return f"L{block // 400 + 1:02d}_V{block % 400 + 1:03d}"
+
+
+def seed(start: int, stop: int, per_query: int, batch_size: int = 5000):
+    """Thêm row [start, stop) cho Answer / TeamAnswer / TeamTRAKEAnswer; mỗi query_index (và video) ``per_query`` row."""
+    rounds = ('prelims', 'final')
+    for model in (Answer, TeamAnswer, TeamTRAKEAnswer):
+        objs = []
+        for i in range(start, stop):
+            block = i // per_query
+            fields = {
+                'video_name': video_for(block),
+                'frame_index': i,
+                'url': f"/media/cframes/{video_for(block)}/{i}.webp",
+                'query_index': block,
+            }
+            if model is TeamTRAKEAnswer:
+                fields['group'] = i % 4
+            else:
+                fields['round'] = rounds[i % 2]
+            objs.append(model(**fields))
+        model.objects.bulk_create(objs, batch_size=batch_size)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark answer / team answer / TRAKE list endpoints (filter theo index) khi số row tăng'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='1000,10000,100000', help='Các mốc số row mỗi bảng, cách nhau bởi dấu phẩy')
+        parser.add_argument('--per-query', type=int, default=50, help='Số row mỗi query_index / video')
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--keep', action='store_true', help='Giữ lại dữ liệu giả (mặc định rollback)')
+        parser.add_argument('--explain', action='store_true', help='In query plan ở mốc cuối')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['rows'].split(',') if size.strip())
+        per_query = options['per_query']
+        factory = APIRequestFactory()
+        answer_list = AnswerListCreateAPIView.as_view()
+        team_list = TeamAnswerListCreateAPIView.as_view()
+        video = video_for(0)
+
+        def endpoint(view, path, params):
+            return lambda: len(view(factory.get(path, params)).data['data'])
+
+        probes = [
+            ('answers query_index', endpoint(answer_list, '/api/answers/', {'query_index': 0})),
+            ('answers query_index+round', endpoint(answer_list, '/api/answers/', {'query_index': 0, 'round': 'prelims'})),
+            ('answers video_name', endpoint(answer_list, '/api/answers/', {'video_name': video})),
+            ('answers video prefix', endpoint(answer_list, '/api/answers/', {'video_name': video[:-1]})),
+            ('team query_index+round', endpoint(team_list, '/api/team-answers/', {'query_index': 0, 'round': 'final'})),
+            ('team video_name', endpoint(team_list, '/api/team-answers/', {'video_name': video})),
+            # List TRAKE qua view trả snapshot cache từ lần thứ hai: đo thẳng query gom nhóm
+            ('trake query_index', lambda: sum(len(g['items']) for e in trake_listing.grouped_by_query([0]) for g in e['data'])),
+        ]
+
+        try:
+            with transaction.atomic():
+                seeded = 0
+                for size in sizes:
+                    seed(seeded, size, per_query)
+                    seeded = size
+                    trake_listing.invalidate()
+                    self.stdout.write(f"--- {size} rows / table ---")
+                    for label, probe in probes:
+                        timings = []
+                        for _ in range(options['iterations']):
+                            start = time.perf_counter()
+                            items = probe()
+                            timings.append((time.perf_counter() - start) * 1000)
+                        timings.sort()
+                        self.stdout.write(
+                            f"{label:<26} {items:>4} items  "
+                            f"mean {statistics.mean(timings):7.3f} ms  p95 {timings[int(len(timings) * 0.95)]:7.3f} ms"
+                        )
+
+                if options['explain']:
+                    plans = [
+                        ('answers query_index+round',
+                         Answer.objects.filter(round='prelims', query_index=0).order_by('-created_at')),
+                        ('answers video_name', filter_video_name(Answer.objects.order_by('-created_at'), video)),
+                        ('team video prefix', filter_video_name(TeamAnswer.objects.order_by('-created_at'), video[:-1])),
+                        ('trake query_index', TeamTRAKEAnswer.objects.filter(query_index=0).order_by('-created_at')),
+                    ]
+                    for label, queryset in plans:
+                        self.stdout.write(f"\n{label}:\n{queryset.explain()}")
+
+                if not options['keep']:
+                    raise _Rollback()
+        except _Rollback:
+            self.stdout.write('Rolled back synthetic rows')
+        finally:
+            # Snapshot TRAKE (Redis dùng chung) không được giữ dữ liệu giả
+            trake_listing.invalidate()
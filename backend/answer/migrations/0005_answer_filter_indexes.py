@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('answer', '0004_dressession_evaluation_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['query_index', 'round', '-created_at'], name='answer_qidx_round_created'),
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['round', '-created_at'], name='answer_round_created'),
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['video_name'], name='answer_video_name'),
+        ),
+        migrations.AddIndex(
+            model_name='teamanswer',
+            index=models.Index(fields=['query_index', 'round', '-created_at'], name='team_ans_qidx_round_created'),
+        ),
+        migrations.AddIndex(
+            model_name='teamanswer',
+            index=models.Index(fields=['round', '-created_at'], name='team_ans_round_created'),
+        ),
+        migrations.AddIndex(
+            model_name='teamtrakeanswer',
+            index=models.Index(fields=['query_index', '-created_at'], name='trake_qidx_created'),
+        ),
+        migrations.AddIndex(
+            model_name='teamtrakeanswer',
+            index=models.Index(fields=['group', 'video_name', 'frame_index'], name='trake_group_video_frame'),
+        ),
+    ]
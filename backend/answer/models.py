@@ -46,6 +46,13 @@ class Answer(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Answer'
         verbose_name_plural = 'Answers'
+        # Khớp filter của list view: query_index [+ round] rồi order_by('-created_at');
+        # video_name lọc theo prefix / exact (xem views.filter_video_name)
+        indexes = [
+            models.Index(fields=['query_index', 'round', '-created_at'], name='answer_qidx_round_created'),
+            models.Index(fields=['round', '-created_at'], name='answer_round_created'),
+            models.Index(fields=['video_name'], name='answer_video_name'),
+        ]
 
     def __str__(self):
         return f"Answer {self.id} - {self.video_name} Frame {self.frame_index} ({self.round})"
@@ -96,6 +103,11 @@ class TeamAnswer(models.Model):
         verbose_name_plural = 'Team Answers'
         # Unique constraint for video_name, frame_index, query_index combination
         unique_together = [['video_name', 'frame_index', 'query_index', 'qa']]
+        # video_name đã là cột đầu của unique index ở trên (dùng được cho lọc prefix / exact)
+        indexes = [
+            models.Index(fields=['query_index', 'round', '-created_at'], name='team_ans_qidx_round_created'),
+            models.Index(fields=['round', '-created_at'], name='team_ans_round_created'),
+        ]
     def __str__(self):
         return f"TeamAnswer {self.id} - {self.video_name} Frame {self.frame_index} Query {self.query_index} ({self.round})"
 
@@ -141,6 +153,12 @@ class TeamTRAKEAnswer(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Team TRAKE Answer'
         verbose_name_plural = 'Team TRAKE Answers'
+        # List theo query_index (hoặc tất cả, order_by('query_index', '-created_at'));
+        # kiểm tra trùng / xoá theo group (+ video_name, frame_index)
+        indexes = [
+            models.Index(fields=['query_index', '-created_at'], name='trake_qidx_created'),
+            models.Index(fields=['group', 'video_name', 'frame_index'], name='trake_group_video_frame'),
+        ]
 
     def __str__(self):
         return f"TeamTRAKEAnswer {self.id} - {self.video_name} Frame {self.frame_index} Query {self.query_index} Group {self.group}"
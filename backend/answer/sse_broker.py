@@ -0,0 +1,124 @@
+"""
+Fan-out Redis pub/sub -> các client SSE trong cùng process.
+
+Trước đây mỗi client SSE mở một kết nối pubsub riêng và poll ``get_message`` qua
+``sync_to_async`` (chiếm một thread của thread pool cho mỗi client). Ở đây mỗi channel chỉ có
+một kết nối ``redis.asyncio`` cho cả process (một task trên event loop), message được đẩy vào
+``asyncio.Queue`` của từng client:
+
+- queue giới hạn ``SSE_CLIENT_BUFFER`` message; client đọc chậm bị bỏ message cũ nhất
+  (message mới nhất luôn được giữ);
+- kết nối Redis chỉ mở khi có client và đóng khi client cuối cùng ngắt; mất kết nối thì tự
+  kết nối lại sau ``RECONNECT_DELAY`` giây;
+- keep-alive do từng client tự gửi khi queue rỗng quá ``SSE_KEEPALIVE_INTERVAL`` giây
+  (xem ``sse_views.TeamAnswerSSEView`` / ``team_trake_sse_views.TeamTRAKEAnswerSSEView``).
+"""
+
+import asyncio
+import logging
+from typing import Dict, Optional, Set
+
+import redis.asyncio as aioredis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY = 1.0
+
+
+def _redis_client() -> aioredis.Redis:
+    # Cùng cấu hình với TeamAnswerSSEService / TeamTRAKEAnswerSSEService (không đặt
+    # socket_timeout: kết nối subscribe chờ message vô thời hạn)
+    return aioredis.Redis(
+        host=getattr(settings, 'REDIS_HOST', 'localhost'),
+        port=int(getattr(settings, 'REDIS_PORT', 6379)),
+        password=getattr(settings, 'REDIS_PASSWORD', None),
+        db=int(getattr(settings, 'REDIS_DB', 0)),
+        decode_responses=True,
+        socket_connect_timeout=5,
+    )
+
+
+class SSEBroker:
+    """Một subscriber Redis cho ``channel``, phát lại message tới queue của mọi client đang nghe."""
+
+    def __init__(self, channel: str, buffer_size: int):
+        self.channel = channel
+        self.buffer_size = buffer_size
+        self.loop = asyncio.get_running_loop()
+        self.clients: Set[asyncio.Queue] = set()
+        self.dropped = 0
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.buffer_size)
+        self.clients.add(queue)
+        if self._task is None or self._task.done():
+            self._ready.clear()
+            self._task = self.loop.create_task(self._listen())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.clients.discard(queue)
+        if not self.clients and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def wait_ready(self, timeout: float) -> bool:
+        """Chờ subscriber kết nối Redis xong (False nếu quá ``timeout``)."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _publish(self, data: str):
+        lagging = 0
+        for queue in list(self.clients):
+            if queue.full():
+                # Client không đọc kịp: bỏ message cũ nhất
+                queue.get_nowait()
+                lagging += 1
+            queue.put_nowait(data)
+        if lagging:
+            self.dropped += lagging
+            logger.warning(f"{lagging} slow SSE client(s) on {self.channel}, dropped oldest message ({self.dropped} total)")
+
+    async def _listen(self):
+        while True:
+            client = _redis_client()
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                self._ready.set()
+                logger.info(f"SSE broker subscribed to {self.channel} ({len(self.clients)} clients)")
+                async for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self._publish(message['data'])
+            except asyncio.CancelledError:
+                logger.info(f"SSE broker unsubscribed from {self.channel}")
+                raise
+            except Exception as e:
+                logger.error(f"SSE broker lost Redis connection on {self.channel}: {e}")
+            finally:
+                self._ready.clear()
+                try:
+                    await pubsub.aclose()
+                    await client.aclose()
+                except Exception as e:
+                    logger.warning(f"Error closing SSE broker connection: {e}")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+_brokers: Dict[str, SSEBroker] = {}
+
+
+def get_broker(channel: str) -> SSEBroker:
+    """Broker của ``channel`` trên event loop hiện tại (tạo mới nếu chưa có hoặc loop đã đổi)."""
+    broker = _brokers.get(channel)
+    if broker is None or broker.loop is not asyncio.get_running_loop():
+        broker = SSEBroker(channel, int(getattr(settings, 'SSE_CLIENT_BUFFER', 100)))
+        _brokers[channel] = broker
+    return broker
+
@@ -1,11 +1,11 @@
 import json
 import logging
-import time
 import asyncio
+from django.conf import settings
 from django.views import View
 from django.http import StreamingHttpResponse
 from django.utils import timezone
-from asgiref.sync import sync_to_async
+from .sse_broker import get_broker
 from .sse_service import team_answer_sse_service
 
 logger = logging.getLogger(__name__)
@@ -57,12 +57,13 @@ class TeamAnswerSSEView(View):
         Yields:
             str: SSE formatted event data
         """
-        pubsub = None
+        broker = get_broker(team_answer_sse_service.CHANNEL_NAME)
+        queue = broker.subscribe()
+        keepalive = float(getattr(settings, 'SSE_KEEPALIVE_INTERVAL', 15))
         
         try:
-            # Check and ensure Redis connection (make it async)
-            redis_connected = await sync_to_async(team_answer_sse_service.ensure_redis_connection)()
-            if not redis_connected:
+            # Shared subscriber of this process (see sse_broker.py)
+            if not await broker.wait_ready(timeout=5):
                 logger.error("Failed to establish Redis connection for SSE")
                 yield self._format_sse_message({
                     'type': 'error', 
@@ -70,11 +71,7 @@ class TeamAnswerSSEView(View):
                 })
                 return
             
-            # Subscribe to Redis channel (make it async)
-            pubsub = await sync_to_async(team_answer_sse_service.redis_client.pubsub)()
-            await sync_to_async(pubsub.subscribe)(team_answer_sse_service.CHANNEL_NAME)
-            
-            logger.info("Client subscribed to team answers SSE")
+            logger.info(f"Client subscribed to team answers SSE ({len(broker.clients)} clients)")
             
             # Send connection confirmation
             yield self._format_sse_message({
@@ -83,52 +80,18 @@ class TeamAnswerSSEView(View):
                 'timestamp': timezone.now().isoformat()
             })
             
-            # Listen for messages with non-blocking approach
             while True:
                 try:
-                    # Get message with timeout to prevent blocking (make it async)
-                    message = await sync_to_async(pubsub.get_message)(timeout=1.0)
-                    
-                    if message is not None:
-                        if message['type'] == 'message':
-                            try:
-                                # Forward the message data
-                                yield f"data: {message['data']}\n\n"
-                            except Exception as e:
-                                logger.error(f"Error forwarding SSE message: {e}")
-                                # Don't break, continue the loop
-                                continue
-                        elif message['type'] == 'subscribe':
-                            # Ignore subscription confirmation
-                            continue
-                    else:
-                        # No message received, send keep-alive to prevent timeout
-                        yield ": keep-alive\n\n"
-                    
-                    # Use async sleep instead of blocking
-                    await asyncio.sleep(0.1)
-                        
-                except Exception as e:
-                    logger.error(f"Error in SSE message loop: {e}")
-                    # Don't break on Redis timeout, continue the loop
-                    await asyncio.sleep(0.5)
+                    data = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    # No message received, send keep-alive to prevent timeout
+                    yield ": keep-alive\n\n"
                     continue
+                yield f"data: {data}\n\n"
                     
-        except Exception as e:
-            logger.error(f"SSE Connection Error: {e}")
-            yield self._format_sse_message({
-                'type': 'error',
-                'message': 'Connection error occurred',
-                'timestamp': timezone.now().isoformat()
-            })
         finally:
-            if pubsub:
-                try:
-                    await sync_to_async(pubsub.unsubscribe)(team_answer_sse_service.CHANNEL_NAME)
-                    await sync_to_async(pubsub.close)()
-                    logger.info("Client unsubscribed from team answers SSE")
-                except Exception as e:
-                    logger.warning(f"Error closing pubsub connection: {e}")
+            broker.unsubscribe(queue)
+            logger.info("Client unsubscribed from team answers SSE")
     
     def _format_sse_message(self, data):
         """
@@ -4,6 +4,8 @@ from django.conf import settings
 from django.utils import timezone
 import logging
 
+from . import trake_listing
+
 logger = logging.getLogger(__name__)
 
 
@@ -108,6 +110,9 @@ class TeamTRAKEAnswerSSEService:
             data: Data to send
             query_index (int): Query index for filtering (optional)
         """
+        # Mọi thay đổi TeamTRAKEAnswer đều publish qua đây: snapshot danh sách cũ không còn đúng
+        trake_listing.invalidate()
+
         if not self.redis_client:
             logger.warning("Redis not available, skipping TeamTRAKE SSE publish")
             return
@@ -135,6 +140,8 @@ class TeamTRAKEAnswerSSEService:
             new_group (int): New group number assigned
             query_index (int): Query index for filtering (optional)
         """
+        trake_listing.invalidate()
+
         try:
             if not self.ensure_redis_connection():
                 logger.error("Redis not available for TeamTRAKE group update message")
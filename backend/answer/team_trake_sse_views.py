@@ -2,6 +2,7 @@ import json
 import logging
 import time
 import asyncio
+from django.conf import settings
 from django.views import View
 from django.http import StreamingHttpResponse
 from django.utils import timezone
@@ -10,9 +11,9 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import JSONParser
+from rest_framework.settings import api_settings
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from asgiref.sync import sync_to_async
 
 from .models import TeamTRAKEAnswer
 from .serializers import (
@@ -21,6 +22,8 @@ from .serializers import (
     TeamTRAKEAnswerBulkCreateSerializer
 )
 from .team_trake_sse_service import team_trake_answer_sse_service
+from . import trake_listing
+from .sse_broker import get_broker
 
 logger = logging.getLogger(__name__)
 
@@ -71,12 +74,13 @@ class TeamTRAKEAnswerSSEView(View):
         Yields:
             str: SSE formatted event data
         """
-        pubsub = None
+        broker = get_broker(team_trake_answer_sse_service.CHANNEL_NAME)
+        queue = broker.subscribe()
+        keepalive = float(getattr(settings, 'SSE_KEEPALIVE_INTERVAL', 15))
         
         try:
-            # Check and ensure Redis connection (make it async)
-            redis_connected = await sync_to_async(team_trake_answer_sse_service.ensure_redis_connection)()
-            if not redis_connected:
+            # Shared subscriber of this process (see sse_broker.py)
+            if not await broker.wait_ready(timeout=5):
                 logger.error("Failed to establish Redis connection for TeamTRAKE SSE")
                 yield self._format_sse_message({
                     'type': 'error', 
@@ -84,11 +88,7 @@ class TeamTRAKEAnswerSSEView(View):
                 })
                 return
             
-            # Subscribe to Redis channel (make it async)
-            pubsub = await sync_to_async(team_trake_answer_sse_service.redis_client.pubsub)()
-            await sync_to_async(pubsub.subscribe)(team_trake_answer_sse_service.CHANNEL_NAME)
-            
-            logger.info("Client subscribed to TeamTRAKE answers SSE")
+            logger.info(f"Client subscribed to TeamTRAKE answers SSE ({len(broker.clients)} clients)")
             
             # Send connection confirmation
             yield self._format_sse_message({
@@ -97,52 +97,18 @@ class TeamTRAKEAnswerSSEView(View):
                 'timestamp': timezone.now().isoformat()
             })
             
-            # Listen for messages with non-blocking approach
             while True:
                 try:
-                    # Get message with timeout to prevent blocking (make it async)
-                    message = await sync_to_async(pubsub.get_message)(timeout=1.0)
-                    
-                    if message is not None:
-                        if message['type'] == 'message':
-                            try:
-                                # Forward the message data
-                                yield f"data: {message['data']}\n\n"
-                            except Exception as e:
-                                logger.error(f"Error forwarding TeamTRAKE SSE message: {e}")
-                                # Don't break, continue the loop
-                                continue
-                        elif message['type'] == 'subscribe':
-                            # Ignore subscription confirmation
-                            continue
-                    else:
-                        # No message received, send keep-alive to prevent timeout
-                        yield ": keep-alive\n\n"
-                    
-                    # Use async sleep instead of blocking
-                    await asyncio.sleep(0.1)
-                        
-                except Exception as e:
-                    logger.error(f"Error in TeamTRAKE SSE message loop: {e}")
-                    # Don't break on Redis timeout, continue the loop
-                    await asyncio.sleep(0.5)
+                    data = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    # No message received, send keep-alive to prevent timeout
+                    yield ": keep-alive\n\n"
                     continue
+                yield f"data: {data}\n\n"
                     
-        except Exception as e:
-            logger.error(f"TeamTRAKE SSE Connection Error: {e}")
-            yield self._format_sse_message({
-                'type': 'error',
-                'message': 'Connection error occurred',
-                'timestamp': timezone.now().isoformat()
-            })
         finally:
-            if pubsub:
-                try:
-                    await sync_to_async(pubsub.unsubscribe)(team_trake_answer_sse_service.CHANNEL_NAME)
-                    await sync_to_async(pubsub.close)()
-                    logger.info("Client unsubscribed from TeamTRAKE answers SSE")
-                except Exception as e:
-                    logger.warning(f"Error closing TeamTRAKE pubsub connection: {e}")
+            broker.unsubscribe(queue)
+            logger.info("Client unsubscribed from TeamTRAKE answers SSE")
     
     def _format_sse_message(self, data):
         """
@@ -168,6 +134,8 @@ class TeamTRAKEAnswerListCreateSSEAPIView(APIView):
         operation_description="Get TeamTRAKEAnswer grouped by group for a specific query_index or all query_indexes if not specified",
         manual_parameters=[
             openapi.Parameter('query_index', openapi.IN_QUERY, description="Filter by query index (optional)", type=openapi.TYPE_INTEGER, required=False),
+            openapi.Parameter('page', openapi.IN_QUERY, description="Page number when listing all query indexes (optional)", type=openapi.TYPE_INTEGER, required=False),
+            openapi.Parameter('page_size', openapi.IN_QUERY, description="Number of query indexes per page (optional)", type=openapi.TYPE_INTEGER, required=False),
         ],
         responses={
             200: openapi.Response(
@@ -187,7 +155,6 @@ class TeamTRAKEAnswerListCreateSSEAPIView(APIView):
         query_index = request.query_params.get('query_index')
         
         if query_index is not None:
-            # Single query_index case (existing behavior)
             try:
                 query_index = int(query_index)
             except ValueError:
@@ -196,69 +163,31 @@ class TeamTRAKEAnswerListCreateSSEAPIView(APIView):
                     'data': []
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Get all TeamTRAKEAnswer for the query_index
-            queryset = TeamTRAKEAnswer.objects.filter(query_index=query_index).order_by('-created_at')
-            
-            # Group by group field
-            grouped_data = {}
-            for item in queryset:
-                group_key = item.group
-                if group_key not in grouped_data:
-                    grouped_data[group_key] = []
-                grouped_data[group_key].append(TeamTRAKEAnswerSerializer(item).data)
-            
-            # Sort items within each group by frame_index ascending
-            for group_key in grouped_data:
-                grouped_data[group_key].sort(key=lambda x: x.get('frame_index', 0))
-            
-            # Convert to list of dicts with group and items fields, sorted by group
-            result = []
-            for group in sorted(grouped_data.keys()):
-                result.append({'group': group, 'items': grouped_data[group]})
-            
+            # Groups sorted by group, items by frame_index (see trake_listing.py)
             return Response({
                 'message': f'TeamTRAKEAnswer for query_index {query_index} retrieved successfully',
-                'data': result
+                'data': trake_listing.list_query(query_index)
             }, status=status.HTTP_200_OK)
         
-        else:
-            # All query_indexes case (new behavior)
-            # Get all TeamTRAKEAnswer and group by query_index
-            all_queryset = TeamTRAKEAnswer.objects.all().order_by('query_index', '-created_at')
-            
-            # Group by query_index first, then by group within each query_index
-            query_data = {}
-            for item in all_queryset:
-                qi = item.query_index
-                if qi not in query_data:
-                    query_data[qi] = {}
-                
-                group_key = item.group
-                if group_key not in query_data[qi]:
-                    query_data[qi][group_key] = []
-                query_data[qi][group_key].append(TeamTRAKEAnswerSerializer(item).data)
-            
-            # Process each query_index
-            result = []
-            for qi in sorted(query_data.keys()):
-                # Sort items within each group by frame_index ascending
-                for group_key in query_data[qi]:
-                    query_data[qi][group_key].sort(key=lambda x: x.get('frame_index', 0))
-                
-                # Convert to list of dicts with group and items fields, sorted by group
-                groups_data = []
-                for group in sorted(query_data[qi].keys()):
-                    groups_data.append({'group': group, 'items': query_data[qi][group]})
-                
-                result.append({
-                    'query_index': qi,
-                    'data': groups_data
-                })
-            
-            return Response({
-                'message': 'All TeamTRAKEAnswer retrieved successfully',
-                'data': result
-            }, status=status.HTTP_200_OK)
+        # All query_indexes, optionally paginated by query_index
+        page = request.query_params.get('page')
+        page_size = request.query_params.get('page_size')
+        if page is not None or page_size is not None:
+            try:
+                page = int(page or 1)
+                page_size = int(page_size or api_settings.PAGE_SIZE or 20)
+                if page < 1 or page_size < 1:
+                    raise ValueError
+            except ValueError:
+                return Response({
+                    'message': 'page and page_size must be positive integers',
+                    'data': []
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'message': 'All TeamTRAKEAnswer retrieved successfully',
+            **trake_listing.list_all(page, page_size)
+        }, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
         operation_summary="Create multiple TeamTRAKEAnswer with SSE",
@@ -1,6 +1,8 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.core.exceptions import ValidationError
-from .models import Answer, TeamAnswer
+from .models import Answer, TeamAnswer, TeamTRAKEAnswer
+from .serializers import TeamTRAKEAnswerSerializer
+from . import trake_listing
 
 class AnswerModelTest(TestCase):
     def setUp(self):
@@ -75,3 +77,55 @@ class TeamAnswerModelTest(TestCase):
         )
         self.assertEqual(team_answer.query_index, 0)
         self.assertEqual(team_answer.round, "prelims")
+
+
+class VideoNameFilterTest(TestCase):
+    def setUp(self):
+        for video in ("L01_V001", "L01_V002", "L02_V001", "K01_V001"):
+            Answer.objects.create(video_name=video, frame_index=1, url="http://example.com/frame.jpg")
+
+    def names(self, value):
+        from .views import filter_video_name
+        return sorted(filter_video_name(Answer.objects.all(), value).values_list('video_name', flat=True))
+
+    def test_full_name_matches_exactly(self):
+        self.assertEqual(self.names("l01_v001"), ["L01_V001"])
+
+    def test_partial_name_matches_prefix(self):
+        self.assertEqual(self.names("L01"), ["L01_V001", "L01_V002"])
+        self.assertEqual(self.names("V001"), [])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TeamTRAKEListingTest(TestCase):
+    def setUp(self):
+        trake_listing.invalidate()
+        for query_index, group, frame_index in [(2, 1, 30), (2, 0, 10), (1, 1, 5), (1, 1, 2), (2, 0, 1)]:
+            TeamTRAKEAnswer.objects.create(
+                video_name="L01_V001", frame_index=frame_index, url="http://example.com/frame.jpg",
+                query_index=query_index, group=group
+            )
+
+    def test_grouped_by_query_and_group(self):
+        data = trake_listing.list_all()['data']
+        self.assertEqual([entry['query_index'] for entry in data], [1, 2])
+        self.assertEqual(
+            [(g['group'], [item['frame_index'] for item in g['items']]) for g in data[1]['data']],
+            [(0, [1, 10]), (1, [30])]
+        )
+        expected = TeamTRAKEAnswerSerializer(TeamTRAKEAnswer.objects.get(query_index=1, frame_index=2)).data
+        self.assertEqual(data[0]['data'][0]['items'][0], dict(expected))
+
+    def test_pagination_by_query_index(self):
+        result = trake_listing.list_all(page=2, page_size=1)
+        self.assertEqual([entry['query_index'] for entry in result['data']], [2])
+        self.assertEqual(result['pagination']['count'], 2)
+        self.assertEqual(result['pagination']['total_pages'], 2)
+
+    def test_publish_invalidates_snapshot(self):
+        from .team_trake_sse_service import team_trake_answer_sse_service
+
+        self.assertEqual(len(trake_listing.list_query(1)), 1)
+        deleted_count, _ = TeamTRAKEAnswer.objects.filter(query_index=1).delete()
+        team_trake_answer_sse_service.publish_bulk_delete_message(deleted_count, query_index=1)
+        self.assertEqual(trake_listing.list_query(1), [])
@@ -0,0 +1,139 @@
+"""
+Danh sách TeamTRAKEAnswer nhóm theo query_index -> group cho ``GET /api/team-trake-answers/``.
+
+Một query ``.values()`` sắp theo (query_index, group, frame_index, -created_at), gom trong một
+lượt bằng ``itertools.groupby`` (trước đây: serializer cho từng row, dict + sort trong Python).
+Thứ tự giống hệt cách cũ: group tăng dần, item trong group theo frame_index, trùng frame_index
+thì mới nhất trước.
+
+Kết quả được cache trong Redis (``CACHES['default']``) theo version token, giống
+query/search_cache.py. Mọi thay đổi đi qua ``TeamTRAKEAnswerSSEService`` (create, bulk delete,
+group delete, update group) gọi ``invalidate()`` trước khi publish; thay đổi không qua SSE
+service (admin, shell) chỉ thấy sau ``TRAKE_LIST_CACHE_TTL``.
+"""
+
+import logging
+import math
+import uuid
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import serializers
+
+from .models import TeamTRAKEAnswer
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'trake-list'
+VERSION_KEY = f'{KEY_PREFIX}:version'
+
+# Cùng field với TeamTRAKEAnswerSerializer
+FIELDS = ('id', 'video_name', 'frame_index', 'url', 'query_index', 'group', 'created_at', 'updated_at')
+ORDERING = ('query_index', 'group', 'frame_index', '-created_at')
+
+_datetime = serializers.DateTimeField()
+_query_index = itemgetter('query_index')
+_group = itemgetter('group')
+
+
+def _item(row: Dict[str, Any]) -> Dict[str, Any]:
+    row['created_at'] = _datetime.to_representation(row['created_at'])
+    row['updated_at'] = _datetime.to_representation(row['updated_at'])
+    return row
+
+
+def _groups(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {'group': group, 'items': [_item(row) for row in items]}
+        for group, items in groupby(rows, key=_group)
+    ]
+
+
+def _rows(query_indexes: Optional[Iterable[int]] = None):
+    queryset = TeamTRAKEAnswer.objects.order_by(*ORDERING)
+    if query_indexes is not None:
+        queryset = queryset.filter(query_index__in=list(query_indexes))
+    return queryset.values(*FIELDS).iterator(chunk_size=2000)
+
+
+def grouped_by_query(query_indexes: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+    """``[{'query_index', 'data': [{'group', 'items'}]}]`` cho các query_index (mặc định: tất cả)."""
+    return [
+        {'query_index': query_index, 'data': _groups(rows)}
+        for query_index, rows in groupby(_rows(query_indexes), key=_query_index)
+    ]
+
+
+def _version() -> str:
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(VERSION_KEY, version, timeout=None):
+            version = cache.get(VERSION_KEY) or version
+    return version
+
+
+def _cached(scope: str, build: Callable[[], Any]) -> Any:
+    try:
+        # Version lấy trước khi đọc DB: nếu bị invalidate giữa chừng thì snapshot này nằm ở
+        # version cũ và không bao giờ được đọc lại
+        key = f'{KEY_PREFIX}:{_version()}:{scope}'
+        cached = cache.get(key)
+    except Exception as e:
+        # Redis lỗi thì đọc thẳng DB
+        logger.warning(f"TeamTRAKE list cache unavailable: {e}")
+        return build()
+    if cached is not None:
+        return cached
+
+    value = build()
+    try:
+        cache.set(key, value, timeout=getattr(settings, 'TRAKE_LIST_CACHE_TTL', 600))
+    except Exception as e:
+        logger.warning(f"TeamTRAKE list cache unavailable: {e}")
+    return value
+
+
+def list_query(query_index: int) -> List[Dict[str, Any]]:
+    """Các group (``[{'group', 'items'}]``) của một query_index."""
+    def build():
+        grouped = grouped_by_query([query_index])
+        return grouped[0]['data'] if grouped else []
+    return _cached(f'query:{query_index}', build)
+
+
+def list_all(page: Optional[int] = None, page_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Mọi query_index, hoặc một trang ``page`` (từ 1) gồm ``page_size`` query_index liên tiếp
+    (đủ mọi group của từng query_index). Trả ``{'data': [...]}``, có phân trang thì thêm
+    ``'pagination': {'page', 'page_size', 'count', 'total_pages'}`` (count: số query_index).
+    """
+    if page is None or page_size is None:
+        return _cached('all', lambda: {'data': grouped_by_query()})
+
+    def build():
+        indexes = list(
+            TeamTRAKEAnswer.objects.order_by('query_index').values_list('query_index', flat=True).distinct()
+        )
+        selected = indexes[(page - 1) * page_size:page * page_size]
+        return {
+            'data': grouped_by_query(selected) if selected else [],
+            'pagination': {
+                'page': page,
+                'page_size': page_size,
+                'count': len(indexes),
+                'total_pages': math.ceil(len(indexes) / page_size),
+            },
+        }
+    return _cached(f'page:{page}:{page_size}', build)
+
+
+def invalidate():
+    """Bỏ mọi snapshot đã cache (gọi mỗi khi TeamTRAKEAnswer thay đổi)."""
+    try:
+        cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    except Exception as e:
+        logger.warning(f"TeamTRAKE list cache invalidation failed: {e}")
@@ -6,6 +6,7 @@ from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 import json
 import logging
+import re
 
 from .models import Answer, TeamAnswer
 from .serializers import (
@@ -16,6 +17,22 @@ from .sse_service import team_answer_sse_service
 
 logger = logging.getLogger(__name__)
 
+# Tên video đầy đủ, ví dụ L01_V001
+VIDEO_NAME_RE = re.compile(r'^[A-Za-z]+\d+_V\d+$')
+
+
+def filter_video_name(queryset, value):
+    """
+    Lọc theo video_name: tên đầy đủ thì so khớp chính xác, còn lại lọc theo prefix (``L01``,
+    ``L01_V00``). Cả hai dùng được index trên video_name; ``icontains`` (LIKE '%...%') thì
+    luôn quét toàn bảng. Collation mặc định của MySQL không phân biệt hoa thường nên
+    ``istartswith`` vẫn là ``LIKE 'x%'``.
+    """
+    value = value.strip()
+    if VIDEO_NAME_RE.match(value):
+        return queryset.filter(video_name__iexact=value)
+    return queryset.filter(video_name__istartswith=value)
+
 
 class AnswerListCreateAPIView(APIView):
     """
@@ -29,7 +46,7 @@ class AnswerListCreateAPIView(APIView):
         manual_parameters=[
             openapi.Parameter('round', openapi.IN_QUERY, description="Filter by round: 'prelims' or 'final'", type=openapi.TYPE_STRING),
             openapi.Parameter('query_index', openapi.IN_QUERY, description="Filter by query index", type=openapi.TYPE_INTEGER),
-            openapi.Parameter('video_name', openapi.IN_QUERY, description="Filter by video name", type=openapi.TYPE_STRING),
+            openapi.Parameter('video_name', openapi.IN_QUERY, description="Filter by video name (exact name or prefix, e.g. L01_V001 or L01)", type=openapi.TYPE_STRING),
         ],
         responses={
             200: openapi.Response(
@@ -59,7 +76,7 @@ class AnswerListCreateAPIView(APIView):
         
         video_name_filter = request.query_params.get('video_name')
         if video_name_filter:
-            queryset = queryset.filter(video_name__icontains=video_name_filter)
+            queryset = filter_video_name(queryset, video_name_filter)
         
         serializer = AnswerSerializer(queryset, many=True, context={'request': request})
         
@@ -315,7 +332,7 @@ class TeamAnswerListCreateAPIView(APIView):
         manual_parameters=[
             openapi.Parameter('round', openapi.IN_QUERY, description="Filter by round: 'prelims' or 'final'", type=openapi.TYPE_STRING),
             openapi.Parameter('query_index', openapi.IN_QUERY, description="Filter by query index", type=openapi.TYPE_INTEGER),
-            openapi.Parameter('video_name', openapi.IN_QUERY, description="Filter by video name", type=openapi.TYPE_STRING),
+            openapi.Parameter('video_name', openapi.IN_QUERY, description="Filter by video name (exact name or prefix, e.g. L01_V001 or L01)", type=openapi.TYPE_STRING),
         ],
         responses={
             200: openapi.Response(
@@ -345,7 +362,7 @@ class TeamAnswerListCreateAPIView(APIView):
         
         video_name_filter = request.query_params.get('video_name')
         if video_name_filter:
-            queryset = queryset.filter(video_name__icontains=video_name_filter)
+            queryset = filter_video_name(queryset, video_name_filter)
         
         serializer = TeamAnswerSerializer(queryset, many=True, context={'request': request})
         
@@ -581,7 +598,7 @@ class TeamAnswerBulkDeleteAPIView(APIView):
         manual_parameters=[
             openapi.Parameter('round', openapi.IN_QUERY, description="Filter by round: 'prelims' or 'final'", type=openapi.TYPE_STRING),
             openapi.Parameter('query_index', openapi.IN_QUERY, description="Filter by query index", type=openapi.TYPE_INTEGER),
-            openapi.Parameter('video_name', openapi.IN_QUERY, description="Filter by video name", type=openapi.TYPE_STRING),
+            openapi.Parameter('video_name', openapi.IN_QUERY, description="Filter by video name (exact name or prefix, e.g. L01_V001 or L01)", type=openapi.TYPE_STRING),
         ],
         responses={
             200: openapi.Response(description="Team answers deleted successfully"),
@@ -603,7 +620,7 @@ class TeamAnswerBulkDeleteAPIView(APIView):
         
         video_name_filter = request.query_params.get('video_name')
         if video_name_filter:
-            queryset = queryset.filter(video_name__icontains=video_name_filter)
+            queryset = filter_video_name(queryset, video_name_filter)
         
         # Check if any team answers match the criteria
         count = queryset.count()
@@ -195,6 +195,21 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+# Search server client (query/search_client.py)
+SEARCH_TIMEOUT = float(os.environ.get('SEARCH_TIMEOUT', '10'))
+SEARCH_HEDGE_ENABLED = os.environ.get('SEARCH_HEDGE_ENABLED', 'True').lower() == 'true'
+# Chờ bao lâu trước khi gửi hedged request khi chưa đủ số liệu p95 / mức chờ tối thiểu (giây)
+SEARCH_HEDGE_DEFAULT_DELAY = float(os.environ.get('SEARCH_HEDGE_DEFAULT_DELAY', '2.0'))
+SEARCH_HEDGE_MIN_DELAY = float(os.environ.get('SEARCH_HEDGE_MIN_DELAY', '0.2'))
+# Thời gian giữ kết quả search của một session trong Redis (query/search_cache.py), giây
+SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', '300'))
+# Snapshot danh sách TeamTRAKEAnswer (answer/trake_listing.py); bị xoá ngay khi có thay đổi qua SSE service, giây
+TRAKE_LIST_CACHE_TTL = int(os.environ.get('TRAKE_LIST_CACHE_TTL', '600'))
+# SSE (answer/sse_broker.py): số message tối đa chờ gửi cho mỗi client (đầy thì bỏ message cũ nhất)
+# và khoảng gửi keep-alive khi không có message, giây
+SSE_CLIENT_BUFFER = int(os.environ.get('SSE_CLIENT_BUFFER', '100'))
+SSE_KEEPALIVE_INTERVAL = float(os.environ.get('SSE_KEEPALIVE_INTERVAL', '15'))
+
 # CORS Configuration
 def get_cors_allowed_origins():
     origins = []
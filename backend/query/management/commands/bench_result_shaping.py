@@ -0,0 +1,65 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from query.result_shaping import payload_chains, shape_frames
+from query.search_codec import COMPACT_VERSION, expand_results
+
+
+def synthetic_payload(k: int, stages: int, max_frames: int, seed: int = 0) -> dict:
+    """Response /search dạng cột (compact-v1) giống search server trả cho ``k`` chain."""
+    rng = random.Random(seed)
+    videos, video_ids, results = [], {}, []
+    for _ in range(k):
+        video = f"L{rng.randint(1, 30):02d}_V{rng.randint(1, 300):03d}"
+        if video not in video_ids:
+            video_ids[video] = len(videos)
+            videos.append(video)
+        frames = sorted(rng.sample(range(0, 30000, 25), rng.randint(1, max_frames)))
+        results.append({
+            'v': video_ids[video],
+            'f': frames,
+            's': [[round(rng.random(), 4) for _ in range(stages)] for _ in frames],
+            't': round(rng.random() * stages, 4),
+            'p': [rng.choice([-1, -1, 0, stages - 1]) for _ in frames],
+        })
+    return {'status': 'success', 'results_found': k, 'encoding': COMPACT_VERSION, 'videos': videos, 'results': results}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark result shaping (search server response -> gallery / samevideo frames)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=200, help='Số chain trong response')
+        parser.add_argument('--stages', type=int, default=3)
+        parser.add_argument('--max-frames', type=int, default=8, help='Số frame tối đa mỗi chain')
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        payload = synthetic_payload(options['k'], options['stages'], options['max_frames'])
+        frames_total = sum(len(item['f']) for item in payload['results'])
+        base_url = 'http://localhost:8000'
+        self.stdout.write(f"k={options['k']}, {frames_total} frames, {options['iterations']} iterations")
+
+        def nested(viewmode):
+            # Dạng lồng nhau (server cũ / không gửi Accept): dựng lại path rồi tách chuỗi
+            data = {'results': expand_results(payload['results'], payload['videos'])}
+            return shape_frames(payload_chains(data), base_url, viewmode)
+
+        def compact(viewmode):
+            return shape_frames(payload_chains(payload), base_url, viewmode)
+
+        for viewmode in ('gallery', 'samevideo'):
+            for label, fn in (('nested', nested), ('compact', compact)):
+                timings = []
+                for _ in range(options['iterations']):
+                    start = time.perf_counter()
+                    fn(viewmode)
+                    timings.append((time.perf_counter() - start) * 1000)
+                timings.sort()
+                self.stdout.write(
+                    f"{viewmode:<10} {label:<8} mean {statistics.mean(timings):7.3f} ms  "
+                    f"p50 {timings[len(timings) // 2]:7.3f} ms  p95 {timings[int(len(timings) * 0.95)]:7.3f} ms"
+                )
@@ -0,0 +1,32 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_existing_images(apps, schema_editor):
+    Query = apps.get_model('query', 'Query')
+    for query in Query.objects.exclude(image='').exclude(image__isnull=True).iterator():
+        digest = hashlib.sha256()
+        try:
+            with query.image.open('rb') as f:
+                for chunk in f.chunks():
+                    digest.update(chunk)
+        except (OSError, ValueError):
+            continue
+        Query.objects.filter(pk=query.pk).update(image_hash=digest.hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('query', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='query',
+            name='image_hash',
+            field=models.CharField(blank=True, default='', help_text='SHA-256 of the image content, sent to the search server instead of the file', max_length=64),
+        ),
+        migrations.RunPython(hash_existing_images, migrations.RunPython.noop),
+    ]
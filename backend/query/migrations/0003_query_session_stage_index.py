@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('query', '0002_query_image_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='query',
+            index=models.Index(fields=['session', 'stage'], name='query_session_stage'),
+        ),
+    ]
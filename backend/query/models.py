@@ -1,5 +1,6 @@
 from django.db import models
 from django.utils import timezone
+import hashlib
 import os
 
 def query_image_upload_path(instance, filename):
@@ -41,6 +42,12 @@ class Query(models.Model):
         blank=True,
         help_text="Uploaded image for the query"
     )
+    image_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        help_text="SHA-256 of the image content, sent to the search server instead of the file"
+    )
     time = models.DateTimeField(
         default=timezone.now,
         help_text="Timestamp when the query was created"
@@ -62,10 +69,41 @@ class Query(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Query'
         verbose_name_plural = 'Queries'
+        # filter(session=...).order_by('stage') khi search / sync session
+        indexes = [
+            models.Index(fields=['session', 'stage'], name='query_session_stage'),
+        ]
 
     def __str__(self):
         return f"Query {self.id} - {self.text[:50] if self.text else 'No text'}"
 
+    def compute_image_hash(self):
+        """SHA-256 of the image content ('' if there is no image or the file cannot be read)"""
+        if not self.image:
+            return ''
+        digest = hashlib.sha256()
+        try:
+            for chunk in self.image.chunks():
+                digest.update(chunk)
+            if not self.image._committed:
+                # Upload chưa lưu: đưa con trỏ về đầu để storage ghi đủ file
+                self.image.file.seek(0)
+        except (OSError, ValueError) as e:
+            print(f"Error hashing image file {self.image.name}: {e}")
+            return ''
+        return digest.hexdigest()
+
+    def save(self, *args, **kwargs):
+        """Hash the image when it is uploaded (or when an older row has no hash yet)"""
+        if not self.image:
+            self.image_hash = ''
+        elif not self.image._committed or not self.image_hash:
+            self.image_hash = self.compute_image_hash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'image' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'image_hash'}
+        super().save(*args, **kwargs)
+
     def delete_image_file(self):
         """Delete the associated image file from storage"""
         if self.image:
@@ -80,3 +118,15 @@ class Query(models.Model):
         """Override delete method to remove image file"""
         self.delete_image_file()
         super().delete(*args, **kwargs)
+
+
+def delete_image_files(names):
+    """Delete stored query images by storage name (used after bulk sync commits)"""
+    storage = Query._meta.get_field('image').storage
+    for name in names:
+        try:
+            if name and storage.exists(name):
+                storage.delete(name)
+                print(f"Deleted image file: {name}")
+        except Exception as e:
+            print(f"Error deleting image file {name}: {e}")
@@ -0,0 +1,142 @@
+"""
+Dựng ``frames`` trả cho frontend từ ``results`` của search server, trong một lượt.
+
+Trước đây kết quả đi qua ba bước: ``expand_payload`` dựng lại path ``<video>/<frame>.jpg``,
+``adjust_faiss_response`` đoán định dạng rồi tách path bằng ``rsplit`` / ``replace``, sau đó
+``_process_frames_by_viewmode`` + ``flatten_frames`` duyệt và sort lại. Ở đây:
+
+- ``compact_chains``: đọc thẳng dạng cột ``compact-v1`` (bảng ``videos`` + frame index là số),
+  không tạo / tách chuỗi path;
+- ``nested_chains``: JSON lồng nhau của server cũ (hoặc khi server không gửi được dạng gọn);
+- ``shape_frames``: mỗi frame tạo đúng một dict, đưa thẳng vào layout của viewmode:
+    * ``gallery``: list phẳng theo thứ tự rank;
+    * ``samevideo``: mỗi chain một nhóm (frame tăng dần); kết quả một stage (cặp path, score)
+      được gom theo video, giữ thứ tự xuất hiện đầu tiên;
+    * viewmode khác: chain giữ nguyên dạng list lồng nhau, kết quả một stage là list phẳng.
+
+Benchmark: ``python manage.py bench_result_shaping --k 200``.
+"""
+
+from operator import itemgetter
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, TypedDict
+
+from .search_codec import COMPACT_VERSION
+
+
+class FrameData(TypedDict):
+    url: str
+    video_name: str
+    frame_index: int
+    score: float
+    is_peak_frame: bool
+    peak_stage: int
+
+
+class Chain(NamedTuple):
+    """Một phần tử ``results``: các frame của một video cùng điểm tổng."""
+    video: str
+    frames: Sequence[int]
+    # peak_stage của từng frame (-1: không phải peak); None với kết quả một stage (path, score)
+    peaks: Optional[Sequence[int]]
+    score: float
+
+
+_frame_index = itemgetter('frame_index')
+
+
+def compact_chains(results: List[Dict[str, Any]], videos: List[str]) -> Iterator[Chain]:
+    for item in results:
+        yield Chain(videos[item['v']], item['f'], item.get('p'), item['t'])
+
+
+def _split_path(path: Any):
+    if not isinstance(path, str) or '/' not in path:
+        return None
+    video, filename = path.rsplit('/', 1)
+    return video, int(filename.replace('.jpg', ''))
+
+
+def nested_chains(results: List[Any]) -> Iterator[Chain]:
+    """
+    ``[[path, [scores, total, is_peak, peak_stage]], ...]`` mỗi chain, hoặc ``[path, score]``
+    với truy vấn một stage. Path không có dạng ``<video>/<frame>.jpg`` bị bỏ qua.
+    """
+    for chain in results:
+        if len(chain) == 2 and isinstance(chain[0], str):
+            parsed = _split_path(chain[0])
+            if parsed is not None:
+                yield Chain(parsed[0], [parsed[1]], None, chain[1])
+            continue
+
+        video, frames, peaks, total = None, [], [], 0
+        for item in chain:
+            if not isinstance(item, (list, tuple)) or len(item) < 2:
+                continue
+            parsed = _split_path(item[0])
+            if parsed is None:
+                continue
+            score_info = item[1]
+            if isinstance(score_info, (list, tuple)) and len(score_info) >= 2:
+                score, peak = score_info[1], score_info[3] if len(score_info) > 3 else -1
+            else:
+                score, peak = score_info, -1
+            if video is not None and parsed[0] != video:
+                # temporal_search không tạo chain nhiều video; nếu có thì tách theo video
+                yield Chain(video, frames, peaks, total)
+                frames, peaks = [], []
+            video, total = parsed[0], score
+            frames.append(parsed[1])
+            peaks.append(peak)
+        yield Chain(video or '', frames, peaks, total)
+
+
+def payload_chains(payload: Dict[str, Any]) -> Iterator[Chain]:
+    """Chain từ response /search (dạng gọn hoặc lồng nhau, xem search_codec.py)."""
+    results = payload.get('results') or []
+    if payload.get('encoding') == COMPACT_VERSION:
+        return compact_chains(results, payload.get('videos', []))
+    return nested_chains(results)
+
+
+def shape_frames(chains: Iterable[Chain], base_url: str, viewmode: str) -> List[Any]:
+    """Frames theo ``viewmode`` (xem docstring module); URL ảnh dạng ``<base_url>/media/cframes/<video>/<frame>.webp``."""
+    prefix = f"{base_url}/media/cframes/"
+    gallery = viewmode == 'gallery'
+    samevideo = viewmode == 'samevideo'
+    flat: List[FrameData] = []
+    nested: List[List[FrameData]] = []
+    video_groups: Dict[str, List[FrameData]] = {}
+
+    for video, frame_indexes, peaks, score in chains:
+        video_prefix = f"{prefix}{video}/"
+        if peaks is None:
+            frames = [
+                {'url': f"{video_prefix}{frame}.webp", 'video_name': video, 'frame_index': frame,
+                 'score': score, 'is_peak_frame': False, 'peak_stage': -1}
+                for frame in frame_indexes
+            ]
+            if samevideo:
+                video_groups.setdefault(video, []).extend(frames)
+            else:
+                flat.extend(frames)
+            continue
+
+        pairs = zip(frame_indexes, peaks)
+        if samevideo:
+            pairs = sorted(pairs, key=itemgetter(0))
+        frames = [
+            {'url': f"{video_prefix}{frame}.webp", 'video_name': video, 'frame_index': frame,
+             'score': score, 'is_peak_frame': peak >= 0, 'peak_stage': peak}
+            for frame, peak in pairs
+        ]
+        if gallery:
+            flat.extend(frames)
+        else:
+            nested.append(frames)
+
+    if video_groups:
+        # Dict giữ thứ tự video xuất hiện đầu tiên (theo rank)
+        for group in video_groups.values():
+            group.sort(key=_frame_index)
+        nested.extend(video_groups.values())
+    return nested if nested and not flat else flat + nested
@@ -0,0 +1,97 @@
+"""
+Cache kết quả temporal search của ``GET /api/queries/?session=...`` trong Redis (``CACHES['default']``).
+
+Frontend poll cùng một session nhiều lần với cùng stage / weights / k / temporal_time; mỗi
+lần đều chạy lại temporal search. Kết quả được cache theo fingerprint của mọi thứ ảnh hưởng
+tới response (nội dung stage, hash ảnh, payload, viewmode, tập search URL, host trả URL ảnh).
+
+Mỗi session có một version token nằm trong key; tạo / sửa / xoá query của session (signal
+``post_save`` / ``post_delete`` trong signals.py, kể cả ``QuerySet.delete()``) đổi token nên mọi
+entry cũ của session không còn được đọc tới và tự hết hạn theo TTL. ``QuerySet.update()`` /
+``bulk_*`` không gửi signal: phải tự gọi ``invalidate_session``. Index trên search server đổi (hot reload,
+ingest) thì entry cũ vẫn dùng được tới khi hết ``SEARCH_CACHE_TTL``.
+"""
+
+import hashlib
+import json
+import logging
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('django')
+
+KEY_PREFIX = 'query-search'
+
+
+def _version_key(session_id: Any) -> str:
+    return f'{KEY_PREFIX}:{session_id}:version'
+
+
+def fingerprint(
+    queries_structure: List[Dict[str, Any]],
+    image_hashes: Dict[str, str],
+    payload: Dict[str, Any],
+    viewmode: str,
+    search_urls: Iterable[str],
+    base_url: str,
+) -> str:
+    """Hash ổn định của các tham số quyết định kết quả search (thứ tự URL không quan trọng)."""
+    material = {
+        'queries_structure': queries_structure,
+        'image_hashes': image_hashes,
+        'payload': payload,
+        'viewmode': viewmode,
+        'search_urls': sorted({url.rstrip('/') for url in search_urls}),
+        'base_url': base_url,
+    }
+    encoded = json.dumps(material, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+async def _session_version(session_id: Any) -> str:
+    key = _version_key(session_id)
+    version = await cache.aget(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        # add: hai request đồng thời không ghi đè version của nhau
+        if not await cache.aadd(key, version, timeout=None):
+            version = await cache.aget(key) or version
+    return version
+
+
+async def lookup(session_id: Any, digest: str) -> Optional[Dict[str, Any]]:
+    try:
+        version = await _session_version(session_id)
+        return await cache.aget(f'{KEY_PREFIX}:{session_id}:{version}:{digest}')
+    except Exception as e:
+        # Redis lỗi thì search như bình thường
+        logger.warning(f"Search cache unavailable: {e}")
+        return None
+
+
+async def store(session_id: Any, digest: str, value: Dict[str, Any]):
+    try:
+        version = await _session_version(session_id)
+        await cache.aset(
+            f'{KEY_PREFIX}:{session_id}:{version}:{digest}', value,
+            timeout=getattr(settings, 'SEARCH_CACHE_TTL', 300)
+        )
+    except Exception as e:
+        logger.warning(f"Search cache unavailable: {e}")
+
+
+def invalidate_session(session_id: Any):
+    """Bỏ mọi kết quả đã cache của session (gọi từ code đồng bộ: views, signals)."""
+    if session_id is None:
+        return
+    try:
+        cache.set(_version_key(session_id), uuid.uuid4().hex, timeout=None)
+    except Exception as e:
+        logger.warning(f"Search cache invalidation failed for session {session_id}: {e}")
@@ -0,0 +1,222 @@
+"""
+HTTP client dùng chung cho các lời gọi backend -> search server.
+
+- Mỗi search URL một ``httpx.AsyncClient`` (keep-alive, connection pool) sống suốt process,
+  thay vì tạo session mới mỗi request; view async không giữ worker thread trong lúc chờ.
+- Theo dõi độ trễ và lỗi gần đây của từng server; thứ tự thử ưu tiên server khỏe, nhanh.
+- Hedged request: nếu server đầu chưa trả lời sau khoảng p95 độ trễ của nó, gửi thêm tới
+  server kế tiếp; response về trước được dùng, request còn lại bị huỷ (cancel task, đóng
+  connection). Server lỗi thì chuyển ngay sang server sau.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger('django')
+
+# Cửa sổ độ trễ để tính p95 / số mẫu tối thiểu trước khi tin p95
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+# Server vừa lỗi bị xếp cuối trong khoảng này (giây)
+ERROR_COOLDOWN = 30.0
+
+
+class SearchServerError(Exception):
+    """Mọi search server đều lỗi; ``errors`` là danh sách (url, lỗi) theo thứ tự thử."""
+
+    def __init__(self, errors: List[Tuple[str, str]]):
+        self.errors = errors
+        last = errors[-1][1] if errors else 'no search server'
+        super().__init__(last)
+
+
+class SearchServer:
+    """Connection pool + thống kê sức khỏe của một search URL."""
+
+    def __init__(self, url: str, pool_size: int = 16):
+        self.url = url.rstrip('/')
+        self.pool_size = pool_size
+        # AsyncClient gắn với event loop tạo ra nó (uvicorn: một loop mỗi process)
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._consecutive_errors = 0
+        self._last_error_at = 0.0
+
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            options = {}
+            if 'ngrok' in self.url.lower():
+                # Tắt verify SSL và bỏ qua trang cảnh báo của ngrok
+                options['verify'] = False
+                options['headers'] = {
+                    'ngrok-skip-browser-warning': 'true',
+                    'User-Agent': 'Backend-API-Client/1.0'
+                }
+            client = self._clients[loop] = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                **options
+            )
+        return client
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+            self._consecutive_errors = 0
+
+    def record_cancelled(self, elapsed: float):
+        """Request thua hedge bị huỷ: ít nhất đã chậm ``elapsed`` giây, tính như một mẫu độ trễ."""
+        with self._lock:
+            self._latencies.append(elapsed)
+
+    def record_error(self):
+        with self._lock:
+            self._consecutive_errors += 1
+            self._last_error_at = time.monotonic()
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def health_key(self) -> Tuple[int, float]:
+        """Khóa sắp xếp: server vừa lỗi xếp sau, rồi tới độ trễ trung vị (chưa có số liệu = 0, được thử sớm)."""
+        with self._lock:
+            cooling = self._consecutive_errors > 0 and time.monotonic() - self._last_error_at < ERROR_COOLDOWN
+            samples = sorted(self._latencies)
+        median = samples[len(samples) // 2] if samples else 0.0
+        return (1 if cooling else 0, median)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count = len(self._latencies)
+            errors = self._consecutive_errors
+        return {
+            'url': self.url,
+            'samples': count,
+            'p50_ms': _ms(self.latency_percentile(0.5)),
+            'p95_ms': _ms(self.latency_percentile(0.95)),
+            'consecutive_errors': errors,
+        }
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value * 1000, 1)
+
+
+_servers: Dict[str, SearchServer] = {}
+_servers_lock = threading.Lock()
+
+
+def get_server(url: str) -> SearchServer:
+    key = url.rstrip('/')
+    server = _servers.get(key)
+    if server is None:
+        with _servers_lock:
+            server = _servers.setdefault(key, SearchServer(key))
+    return server
+
+
+def order_servers(urls: List[str]) -> List[SearchServer]:
+    """Server theo thứ tự nên thử; cùng mức sức khỏe thì giữ thứ tự người dùng truyền vào."""
+    servers = list(dict.fromkeys(get_server(url) for url in urls))
+    return [server for _, server in sorted(enumerate(servers), key=lambda item: (item[1].health_key(), item[0]))]
+
+
+def hedge_delay(server: SearchServer) -> float:
+    """Thời gian chờ server ``server`` trước khi gửi hedged request tới server kế tiếp."""
+    p95 = server.latency_percentile(0.95)
+    if p95 is None:
+        return getattr(settings, 'SEARCH_HEDGE_DEFAULT_DELAY', 2.0)
+    return max(getattr(settings, 'SEARCH_HEDGE_MIN_DELAY', 0.2), p95)
+
+
+async def _attempt(server: SearchServer, path: str, data: Dict[str, Any], files: List[Any],
+                   headers: Dict[str, str], timeout: float, passthrough_status: Tuple[int, ...] = ()) -> httpx.Response:
+    start = time.perf_counter()
+    try:
+        response = await server.client().post(
+            f"{server.url}{path}", data=data, files=files or None, headers=headers, timeout=timeout
+        )
+        if response.status_code not in passthrough_status:
+            response.raise_for_status()
+    except httpx.HTTPError:
+        server.record_error()
+        raise
+    server.record_success(time.perf_counter() - start)
+    return response
+
+
+async def post(urls: List[str], path: str, data: Dict[str, Any], files: Optional[List[Any]] = None,
+               headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None,
+               hedge: Optional[bool] = None, passthrough_status: Tuple[int, ...] = ()) -> Tuple[httpx.Response, str]:
+    """
+    POST ``path`` tới các search server trong ``urls``, trả về (response, url đã dùng, không có '/' cuối).
+
+    ``files`` phải là bytes (không phải file object) vì có thể được gửi song song tới hai server.
+    Response có status trong ``passthrough_status`` (ví dụ 409: server cần gửi lại ảnh) được trả
+    về như response thành công, không tính là server lỗi.
+    SearchServerError nếu mọi server đều lỗi.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'SEARCH_TIMEOUT', 10.0)
+    if hedge is None:
+        hedge = getattr(settings, 'SEARCH_HEDGE_ENABLED', True)
+    servers = order_servers(urls)
+    pending: Dict[asyncio.Task, Tuple[SearchServer, float]] = {}
+    errors: List[Tuple[str, str]] = []
+    next_index = 0
+    hedge_at = None
+
+    def launch():
+        nonlocal next_index, hedge_at
+        server = servers[next_index]
+        next_index += 1
+        task = asyncio.ensure_future(_attempt(server, path, data, files or [], headers or {}, timeout, passthrough_status))
+        pending[task] = (server, time.perf_counter())
+        hedge_at = time.monotonic() + hedge_delay(server) if hedge and next_index < len(servers) else None
+
+    if servers:
+        launch()
+    try:
+        while pending:
+            wait_for = None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+            done, _ = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                logger.info(f"Search server {servers[next_index - 1].url} chậm, gửi hedged request tới {servers[next_index].url}")
+                launch()
+                continue
+            for task in done:
+                server, _ = pending.pop(task)
+                try:
+                    response = task.result()
+                except Exception as e:
+                    errors.append((server.url, str(e) or type(e).__name__))
+                    logger.warning(f"Search server {server.url} lỗi: {e!r}")
+                    continue
+                return response, server.url
+            if not pending and next_index < len(servers):
+                # Server đang chờ đều lỗi: chuyển ngay sang server kế tiếp
+                launch()
+    finally:
+        # Request thua hedge (hoặc client ngắt kết nối): huỷ hẳn, connection được đóng
+        for task, (server, started) in pending.items():
+            task.cancel()
+            server.record_cancelled(time.perf_counter() - started)
+    raise SearchServerError(errors)
+
+
+def stats() -> List[Dict[str, Any]]:
+    return [server.stats() for server in list(_servers.values())]
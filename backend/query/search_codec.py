@@ -0,0 +1,77 @@
+"""
+Giải mã response của search server (/search, /search/batch).
+
+Search server trả JSON lồng nhau mặc định, hoặc dạng cột gọn ("compact-v1", xem
+server/encoding.py) khi request gửi header Accept tương ứng:
+- ``application/x-msgpack``: msgpack (chỉ xin khi backend cài msgpack)
+- ``application/vnd.lucifer.compact+json``: JSON dạng cột
+
+``decode_search_response`` mặc định trả về payload với ``results`` ở định dạng cũ
+``[[path, [scores_tuple, total, is_peak, peak_stage]], ...]`` nên phần xử lý
+kết quả không cần biết server đã dùng encoding nào. ``expand=False`` giữ nguyên dạng cột
+cho ``result_shaping.payload_chains`` đọc thẳng.
+"""
+
+import json
+from typing import Any, Dict, List
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+COMPACT_JSON_MEDIA_TYPE = 'application/vnd.lucifer.compact+json'
+MSGPACK_MEDIA_TYPE = 'application/x-msgpack'
+COMPACT_VERSION = 'compact-v1'
+
+# Server cũ không hiểu các media type này vẫn trả JSON mặc định
+if msgpack is not None:
+    SEARCH_ACCEPT_HEADER = f'{MSGPACK_MEDIA_TYPE}, {COMPACT_JSON_MEDIA_TYPE};q=0.9, application/json;q=0.5'
+else:
+    SEARCH_ACCEPT_HEADER = f'{COMPACT_JSON_MEDIA_TYPE}, application/json;q=0.5'
+
+
+def expand_results(results: List[Dict[str, Any]], videos: List[str]) -> List[Any]:
+    """Đổi ``results`` dạng cột về định dạng lồng nhau của temporal_search."""
+    expanded = []
+    for item in results:
+        video = videos[item['v']]
+        if 's' not in item:
+            # Truy vấn một stage: cặp (path, score)
+            expanded.append([f"{video}/{item['f'][0]}.jpg", item['t']])
+            continue
+        total = item['t']
+        expanded.append([
+            [f"{video}/{frame}.jpg", [scores, total, peak >= 0, peak]]
+            for frame, scores, peak in zip(item['f'], item['s'], item['p'])
+        ])
+    return expanded
+
+
+def expand_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    if payload.get('encoding') != COMPACT_VERSION:
+        return payload
+    videos = payload.pop('videos', [])
+    payload.pop('encoding', None)
+    if 'responses' in payload:
+        for item in payload['responses']:
+            if 'results' in item:
+                item['results'] = expand_results(item['results'], videos)
+    elif 'results' in payload:
+        payload['results'] = expand_results(payload['results'], videos)
+    return payload
+
+
+def decode_search_response(response, expand: bool = True) -> Dict[str, Any]:
+    """Đọc body của một response (``httpx`` / ``requests``) từ search server theo Content-Type."""
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+    if content_type == MSGPACK_MEDIA_TYPE:
+        if msgpack is None:
+            raise ValueError('Search server trả msgpack nhưng backend chưa cài msgpack')
+        payload = msgpack.unpackb(response.content, raw=False)
+    elif content_type == COMPACT_JSON_MEDIA_TYPE:
+        payload = json.loads(response.content)
+    else:
+        payload = response.json()
+    return expand_payload(payload) if expand else payload
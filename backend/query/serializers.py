@@ -19,11 +19,11 @@ class QuerySerializer(serializers.ModelSerializer):
     class Meta:
         model = Query
         fields = [
-            'id', 'text', 'ocr', 'speech', 'image', 
+            'id', 'text', 'ocr', 'speech', 'image', 'image_hash',
             'time', 'background_sound', 'stage', 'session', 
             'created_at', 'updated_at', 
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'image_hash', 'created_at', 'updated_at']
     
     def get_image_url(self, obj):
         """Get the full URL for the image"""
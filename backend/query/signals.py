@@ -1,6 +1,8 @@
-from django.db.models.signals import pre_save, post_delete
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from .models import Query
+from . import search_cache
 import os
 
 
@@ -17,11 +19,10 @@ def delete_old_image_on_update(sender, instance, **kwargs):
         old_image = old_instance.image
         new_image = instance.image
         
-        # If image is being changed or removed
+        # If image is being changed or removed (after commit, so a rollback keeps the file)
         if old_image and old_image != new_image:
-            if os.path.isfile(old_image.path):
-                os.remove(old_image.path)
-                print(f"Deleted old image file: {old_image.path}")
+            old_path = old_image.path
+            transaction.on_commit(lambda: _remove_file(old_path))
     except Query.DoesNotExist:
         pass  # Old instance doesn't exist
     except Exception as e:
@@ -35,8 +36,26 @@ def delete_image_on_query_delete(sender, instance, **kwargs):
     """
     if instance.image:
         try:
-            if os.path.isfile(instance.image.path):
-                os.remove(instance.image.path)
-                print(f"Deleted image file on query delete: {instance.image.path}")
+            image_path = instance.image.path
         except Exception as e:
             print(f"Error deleting image file on query delete: {e}")
+            return
+        transaction.on_commit(lambda: _remove_file(image_path))
+
+
+@receiver([post_save, post_delete], sender=Query)
+def invalidate_search_cache(sender, instance, **kwargs):
+    """
+    Drop cached search results of the query's session (search_cache.py)
+    """
+    session_id = instance.session_id
+    transaction.on_commit(lambda: search_cache.invalidate_session(session_id))
+
+
+def _remove_file(path):
+    try:
+        if os.path.isfile(path):
+            os.remove(path)
+            print(f"Deleted image file: {path}")
+    except Exception as e:
+        print(f"Error deleting image file {path}: {e}")
@@ -1,6 +1,15 @@
-from django.test import TestCase
+import hashlib
+import tempfile
+
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from .models import Query
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from . import search_cache
+from .result_shaping import payload_chains, shape_frames
+from .models import Query, QuerySession
+from .views import QueryListCreateAPIView, load_session_queries
 
 class QueryModelTest(TestCase):
     def setUp(self):
@@ -19,3 +28,108 @@ class QueryModelTest(TestCase):
     def test_query_str_method(self):
         expected = f"Query {self.query.id} - Test query"
         self.assertEqual(str(self.query), expected)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_image_hash_computed_on_upload(self):
+        content = b"fake image bytes"
+        query = Query.objects.create(image=SimpleUploadedFile("hash.jpg", content, content_type="image/jpeg"))
+        self.assertEqual(query.image_hash, hashlib.sha256(content).hexdigest())
+        # File lưu đủ nội dung dù đã đọc để hash
+        with query.image.open('rb') as f:
+            self.assertEqual(f.read(), content)
+
+        query.image = None
+        query.save()
+        self.assertEqual(query.image_hash, '')
+
+
+class SessionSearchAssemblyTest(TestCase):
+    def setUp(self):
+        self.session = QuerySession.objects.create()
+        # Tạo lệch thứ tự stage để kiểm tra sắp xếp
+        for stage in (3, 1, 2):
+            Query.objects.create(
+                session=self.session,
+                text=f"stage {stage}",
+                stage=stage,
+                image=f"queries/stage{stage}.jpg"
+            )
+
+    def test_search_assembly_uses_single_query(self):
+        request = RequestFactory().get('/api/queries/', {'session': self.session.id})
+        with self.assertNumQueries(1):
+            stages = load_session_queries(self.session.id, request)
+            queries_structure, image_files = QueryListCreateAPIView()._build_queries_structure(stages)
+
+        self.assertEqual([item['text'] for item in queries_structure], ['stage 1', 'stage 2', 'stage 3'])
+        self.assertEqual([item['image_ref'] for item in queries_structure], ['stage1.jpg', 'stage2.jpg', 'stage3.jpg'])
+        self.assertEqual([name for name, _, _ in image_files], ['stage1.jpg', 'stage2.jpg', 'stage3.jpg'])
+
+
+class QuerySyncTest(TestCase):
+    def _sync(self, session, local_queries):
+        request = APIRequestFactory().post(
+            '/api/queries/', {'session': session.id, 'localQueries': local_queries}, format='json'
+        )
+        return QueryListCreateAPIView.as_view()(request)
+
+    def test_sync_query_count_does_not_grow_with_stages(self):
+        counts = []
+        for n in (2, 6):
+            session = QuerySession.objects.create()
+            existing = [Query.objects.create(session=session, text=f"old {i}", stage=i) for i in range(1, n + 1)]
+            # Sửa mọi stage trừ stage cuối (bị xoá), thêm n stage mới
+            local = [{'id': q.id, 'text': f"new {q.stage}", 'stage': q.stage} for q in existing[:-1]]
+            local += [{'text': f"added {i}", 'stage': n + i} for i in range(1, n + 1)]
+            with CaptureQueriesContext(connection) as ctx:
+                response = self._sync(session, local)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(ctx.captured_queries))
+
+            self.assertEqual([item['text'] for item in response.data['data']], [q['text'] for q in local])
+            self.assertEqual(Query.objects.filter(session=session, text__startswith='new').count(), n - 1)
+        self.assertEqual(counts[0], counts[1])
+
+
+class SearchCacheFingerprintTest(SimpleTestCase):
+    def test_fingerprint_tracks_search_inputs(self):
+        structure = [{'stage': 1, 'text': 'a dog'}]
+        payload = {'k': 10, 'temporal_time': 30}
+        base = search_cache.fingerprint(structure, {}, payload, 'gallery', ['http://a/', 'http://b'], 'http://x')
+
+        # Thứ tự / dấu '/' cuối của search URL không đổi kết quả
+        self.assertEqual(base, search_cache.fingerprint(structure, {}, payload, 'gallery', ['http://b', 'http://a'], 'http://x'))
+        self.assertNotEqual(base, search_cache.fingerprint(structure, {}, {**payload, 'k': 20}, 'gallery', ['http://a', 'http://b'], 'http://x'))
+        self.assertNotEqual(base, search_cache.fingerprint(structure, {'q.jpg': 'abc'}, payload, 'gallery', ['http://a', 'http://b'], 'http://x'))
+
+
+class ResultShapingTest(SimpleTestCase):
+    compact = {
+        'encoding': 'compact-v1',
+        'videos': ['L01_V001', 'L02_V002'],
+        'results': [
+            {'v': 1, 'f': [300, 100], 's': [[0.5], [0.1]], 't': 0.9, 'p': [0, -1]},
+            {'v': 0, 'f': [20], 's': [[0.4]], 't': 0.7, 'p': [0]},
+        ],
+    }
+
+    def test_compact_and_nested_shape_alike(self):
+        nested = {'results': [
+            [['L02_V002/300.jpg', [[0.5], 0.9, True, 0]], ['L02_V002/100.jpg', [[0.1], 0.9, False, -1]]],
+            [['L01_V001/20.jpg', [[0.4], 0.7, True, 0]]],
+        ]}
+        for viewmode in ('gallery', 'samevideo'):
+            self.assertEqual(
+                shape_frames(payload_chains(self.compact), 'http://h', viewmode),
+                shape_frames(payload_chains(nested), 'http://h', viewmode)
+            )
+
+    def test_layouts(self):
+        gallery = shape_frames(payload_chains(self.compact), 'http://h', 'gallery')
+        self.assertEqual([f['frame_index'] for f in gallery], [300, 100, 20])
+        self.assertEqual(gallery[0]['url'], 'http://h/media/cframes/L02_V002/300.webp')
+        self.assertTrue(gallery[0]['is_peak_frame'])
+
+        samevideo = shape_frames(payload_chains(self.compact), 'http://h', 'samevideo')
+        self.assertEqual([[f['frame_index'] for f in group] for group in samevideo], [[100, 300], [20]])
+
@@ -8,7 +8,7 @@ urlpatterns = [
     path('api/sessions/<int:session_id>/queries/', views.QuerySessionQueriesAPIView.as_view(), name='session-queries'),
     
     # Query endpoints
-    path('api/queries/', views.QueryListCreateAPIView.as_view(), name='query-list-create'),
+    path('api/queries/', views.query_list_create, name='query-list-create'),
     path('api/queries/<int:pk>/', views.QueryDetailAPIView.as_view(), name='query-detail'),
     path('api/queries/bulk-delete/', views.QueryBulkDeleteAPIView.as_view(), name='query-bulk-delete'),
 ]
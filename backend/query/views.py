@@ -2,25 +2,28 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from django.db import transaction
 from django.db.models import Q
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.views.decorators.csrf import csrf_exempt
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+from rest_framework.utils.encoders import JSONEncoder
+from asgiref.sync import async_to_sync, sync_to_async
+import asyncio
 import sys
 import os
 from pathlib import Path
 import time
 import logging
-import requests
 from io import BytesIO
+from functools import partial
 import json
-from typing import List, Tuple
-import urllib3
+from typing import Dict, List, Tuple
 
-# Disable SSL warnings for ngrok URLs
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # # Add search module to path
 # search_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'search')
@@ -31,12 +34,18 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 # from search.meili_search_service import meili_search_service as search_service
 # SEARCH_ENGINE = "Meilisearch"
 
-from .models import Query, QuerySession
+from .models import Query, QuerySession, delete_image_files
+from . import search_cache, search_client
+from .result_shaping import payload_chains, shape_frames
+from .search_codec import SEARCH_ACCEPT_HEADER, decode_search_response
 from .serializers import (
     QuerySerializer, QueryCreateSerializer, 
     QueryUpdateSerializer, QuerySessionSerializer
 )
 
+# Search server trả các status này cho request chỉ gửi hash ảnh: gửi lại kèm bytes ảnh
+IMAGE_RESEND_STATUS = (status.HTTP_409_CONFLICT, status.HTTP_400_BAD_REQUEST)
+
 @method_decorator(csrf_exempt, name='dispatch')
 class QueryListCreateAPIView(APIView):
     def _normalize_image_path(self, image_value):
@@ -69,30 +78,6 @@ class QueryListCreateAPIView(APIView):
     """
     parser_classes = [MultiPartParser, FormParser, JSONParser]
 
-    def _create_request_session(self, url: str) -> requests.Session:
-        """
-        Create a requests session with appropriate configuration for the URL
-        
-        Args:
-            url: The URL to make requests to
-            
-        Returns:
-            Configured requests session
-        """
-        session = requests.Session()
-        
-        # Special configuration for ngrok URLs
-        if 'ngrok' in url.lower():
-            # Disable SSL verification for ngrok URLs to avoid SSL errors
-            session.verify = False
-            # Add headers to bypass ngrok warning page and identify our client
-            session.headers.update({
-                'ngrok-skip-browser-warning': 'true',
-                'User-Agent': 'Backend-API-Client/1.0'
-            })
-        
-        return session
-
     @swagger_auto_schema(
         operation_summary="List all queries",
         operation_description="Get all queries with optional filtering",
@@ -133,244 +118,8 @@ class QueryListCreateAPIView(APIView):
     )
     def get(self, request):
         """Get all queries, execute temporal search, and return frames."""
-        # --- Phần 1: Lấy và lọc QuerySet ---
-        queryset = Query.objects.all()
-        session_id = request.query_params.get('session')
-        
-        if not session_id:
-            return Response({"error": "Session ID is required."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        queryset = queryset.filter(session_id=session_id)
-        serializer = QuerySerializer(queryset, many=True, context={'request': request})
-        if not queryset.exists():
-            return Response({
-                'message': 'Temporal search executed successfully',
-                'frames': [],
-                'data': serializer.data,
-            }, status=status.HTTP_200_OK)
-
-        # Parse search_url as comma-separated list
-        search_url_param = request.query_params.get('search_url', '')
-        search_urls = [url.strip() for url in search_url_param.split(',') if url.strip()]
-        
-        k_param = request.query_params.get('k', '10')
-        viewmode = request.query_params.get('viewmode', 'gallery')
-        temporal_time = request.query_params.get('temporal_time', '30')  # in seconds, default 30s
-        # Sắp xếp queries theo stage
-        sorted_queries = queryset.order_by('stage')
-        sorted_queries_serializer = QuerySerializer(sorted_queries, many=True, context={'request': request})        
-        # Nếu không có search_url, fallback về OCR search với query có stage lớn nhất
-        # if not search_url:
-        #     last_query = sorted_queries.last()
-        #     if last_query and last_query.ocr and last_query.ocr.strip() and last_query.ocr.lower() != 'null':
-        #         ocr_results = self._search_ocr(ocr_text=last_query.ocr, k=int(k_param))
-        #         raw_frames = self.adjust_response(request, ocr_results)
-        #         frames = self._process_frames_by_viewmode(raw_frames, viewmode)
-        #         return Response({
-        #             'message': 'OCR search executed successfully',
-        #             'frames': frames,
-        #             'data': serializer.data,
-        #         }, status=status.HTTP_200_OK)
-        #     else:
-        #         return Response({
-        #             'message': 'No valid ocr',
-        #             'frames': [],
-        #             'data': serializer.data,
-        #         }, status=status.HTTP_200_OK)
-        
-        # --- Phần 2: Chuẩn bị queries_structure và image_files ---
-        queries_structure = []
-        image_files_to_open = []
-        image_counter = 0
-        
-        for query_data in sorted_queries_serializer.data:
-            query_item = {}
-            # Thêm text nếu có và không rỗng
-            if query_data.get('text') and query_data['text'].strip():
-                query_item['text'] = query_data['text']
-            # Thêm ocr nếu có và không rỗng
-            if query_data.get('ocr') and query_data['ocr'].strip() and query_data['ocr'].lower() != 'null':
-                query_item['ocr'] = query_data['ocr']
-
-            # Thêm subtitle nếu có và không rỗng
-            if query_data.get('speech') and query_data['speech'].strip() and query_data['speech'].lower() != 'null':
-                query_item['subtitle'] = query_data['speech']
-
-            # Xử lý image nếu có
-            if query_data.get('image'):
-                # Luôn chuẩn hóa path ảnh
-                norm_image_path = self._normalize_image_path(query_data['image'])
-                # Tìm query object tương ứng để lấy file path
-                query_obj = sorted_queries.get(id=query_data['id'])
-                if query_obj.image and hasattr(query_obj.image, 'path'):
-                    image_path = query_obj.image.path
-                    image_name = os.path.basename(image_path)
-                    # Sử dụng tên file thực tế làm image_ref thay vì tạo reference
-                    query_item['image_ref'] = image_name
-                    image_files_to_open.append((image_name, image_path, image_name))
-                    image_counter += 1
-                # Ghi lại path đã chuẩn hóa (nếu cần debug hoặc trả về)
-                query_item['image'] = norm_image_path
-            # Chỉ thêm vào queries_structure nếu có ít nhất một field
-            if query_item:
-                queries_structure.append(query_item)
-        
-        if not queries_structure:
-            print("No valid queries with text, ocr, or image content found.")
-            return Response({
-                'message': 'No valid queries with text, ocr, or image content found.',
-                'frames': [],
-                'data': serializer.data,
-            }, status=status.HTTP_200_OK)
-
-        # Chuẩn bị payload
-        queries_structure_str = json.dumps(queries_structure)
-        
-        # Default weights - có thể được override bởi request params
-        default_weights = {'text': 0.3, 'ocr': 0.3, 'subtitle': 0.3, 'image': 0.1}
-        
-        # Cho phép client gửi custom weights qua query params
-        weights = {}
-        if request.query_params.get('text_weight'):
-            weights['text'] = float(request.query_params.get('text_weight'))
-        if request.query_params.get('ocr_weight'):
-            weights['ocr'] = float(request.query_params.get('ocr_weight'))
-        if request.query_params.get('subtitle_weight'):
-            weights['subtitle'] = float(request.query_params.get('subtitle_weight'))
-        if request.query_params.get('image_weight'):
-            weights['image'] = float(request.query_params.get('image_weight'))
-        
-        # default vector models config
-        vector_models_config = [
-            {
-                "model_name": "ViT-H-14-378-quickgelu",
-                "weight": 0.55  
-            },
-            {
-                "model_name": "ViT-gopt-16-SigLIP2-384",
-                "weight": 0.45
-            }
-        ]
-        # Sử dụng default weights nếu không có custom weights
-        final_weights = {**default_weights, **weights}
-        weights_str = json.dumps(final_weights)
-        
-        payload = {
-            'k': int(k_param),
-            'temporal_time': int(temporal_time),  # in seconds
-            'queries_structure': queries_structure_str,
-            'weights': weights_str,
-            'vector_models_config': json.dumps(vector_models_config),
-        }
-
-        # --- Phần 3: Gửi Request và Xử lý Lỗi với Multiple Search URLs ---
-        files_to_send = []
-        opened_files = []
-        
-        try:
-            # Mở các file ảnh cần thiết
-            for image_name, path, filename in image_files_to_open:
-                f = open(path, 'rb')
-                opened_files.append(f)
-                # Sử dụng filename thực tế để server có thể match với image_ref
-                files_to_send.append(('image_files', (filename, f, 'image/jpeg')))
-
-            # Kiểm tra có search URLs không
-            if not search_urls:
-                return Response({
-                    'message': 'No search URL provided',
-                    'frames': [],
-                    'data': sorted_queries_serializer.data,
-                }, status=status.HTTP_200_OK)
-            
-            # Try each search URL in order until one succeeds
-            last_error = None
-            search_timeout = 10  # seconds
-            
-            for idx, search_url in enumerate(search_urls):
-                try:
-                    search_endpoint = f"{search_url.rstrip('/')}/search"
-                    
-                    # Use helper method to create configured session
-                    session = self._create_request_session(search_url)
- 
-                    # Reset file pointers before each request attempt
-                    for f in opened_files:
-                        f.seek(0)
-                    
-                    response = session.post(search_endpoint, data=payload, files=files_to_send, timeout=search_timeout)
-                    response.raise_for_status()
-                    
-                    search_data = response.json()
-
-                    temporal_results = search_data.get('results', [])
-                    # Xử lý kết quả tương tự như trước
-                    results = self.adjust_faiss_response(request, temporal_results)
-                    frames = self._process_frames_by_viewmode(results, viewmode)
-                    
-                    return Response({
-                        'message': f'Temporal search executed successfully using server {idx + 1}',
-                        'frames': frames,
-                        'data': serializer.data,
-                        'search_server_response': search_data,
-                        'search_url_used': search_url
-                    }, status=status.HTTP_200_OK)
-                    
-                except requests.exceptions.Timeout as e:
-                    last_error = f"Timeout after {search_timeout}s"
-                    print(f"⚠️ Timeout on search server [{idx + 1}/{len(search_urls)}]: {search_url} - {last_error}")
-                    if idx < len(search_urls) - 1:
-                        print(f"Trying next search server...")
-                        continue
-                    
-                except requests.exceptions.RequestException as e:
-                    last_error = str(e)
-                    print(f"⚠️ Request failed on search server [{idx + 1}/{len(search_urls)}]: {search_url} - {last_error}")
-                    if idx < len(search_urls) - 1:
-                        print(f"Trying next search server...")
-                        continue
-                    
-                except Exception as e:
-                    last_error = str(e)
-                    print(f"⚠️ Error on search server [{idx + 1}/{len(search_urls)}]: {search_url} - {last_error}")
-                    if idx < len(search_urls) - 1:
-                        print(f"Trying next search server...")
-                        continue
-            
-            # All search URLs failed
-            # print(f"❌ All {len(search_urls)} search servers failed. Last error: {last_error}")
-            return Response({
-                'message': 'Queries retrieved successfully, but all search servers failed',
-                'data': serializer.data,
-                'frames': [],
-                'error': f'Failed to communicate with any search server. Last error: {last_error}',
-                'servers_tried': len(search_urls)
-            }, status=status.HTTP_200_OK)
-
-        except FileNotFoundError as e:
-            print(f"ERROR: Image file not found - {e}")
-            # Trả về data queries dù có lỗi file
-            return Response({
-                'message': 'Queries retrieved successfully, but image file not found', 
-                'data': serializer.data,
-                'frames': [],
-                'error': 'An image file required for the query was not found'
-            }, status=status.HTTP_200_OK)
-
-        except Exception as e:
-            print(f"ERROR: An unexpected error occurred - {e}")
-            # Trả về data queries dù có lỗi khác
-            return Response({
-                'message': 'Queries retrieved successfully, but search failed',
-                'data': serializer.data,
-                'frames': [],
-                'error': 'An unexpected error occurred during search'
-            }, status=status.HTTP_200_OK)
-
-        finally:
-            # Đảm bảo đóng tất cả các file đã mở
-            for f in opened_files:
-                f.close()    
+        # Route GET thực tế đi qua ``query_list_create`` (async); giữ method này cho docs và WSGI
+        return async_to_sync(search_session_queries)(request._request)
 
     @swagger_auto_schema(
         operation_summary="Synchronize local queries with server",
@@ -468,12 +217,16 @@ class QueryListCreateAPIView(APIView):
                 }, status=status.HTTP_404_NOT_FOUND)
             
             # Get all existing queries for this session
-            server_queries = Query.objects.filter(session=session).order_by('stage')
+            server_queries = list(Query.objects.filter(session=session).order_by('stage'))
             server_queries_dict = {q.id: q for q in server_queries}
             
-            # Track operations
+            # Track operations. Bước 1 chỉ tính thay đổi trong bộ nhớ (chưa ghi gì);
+            # bước 2 ghi tất cả bằng bulk_update / bulk_create trong một transaction.
             updated_queries = []
+            update_fields = set()
             created_queries = []
+            image_changed = []
+            old_images = []
             local_query_ids = set()
             
             # Process each local query
@@ -512,10 +265,15 @@ class QueryListCreateAPIView(APIView):
                         if local_value != server_value:
                             changes[field] = local_value
                     if changes:
+                        if 'image' in changes:
+                            # Ảnh cũ bị thay / gỡ: xoá file sau khi commit
+                            if server_query.image:
+                                old_images.append(server_query.image.name)
+                            image_changed.append(server_query)
                         # Update the query
                         for field, value in changes.items():
                             setattr(server_query, field, value)
-                        server_query.save()
+                        update_fields.update(changes)
                         updated_queries.append(server_query)
                 elif not query_id or query_id not in server_queries_dict:
                     # CREATE: New query (no ID or ID doesn't exist on server)
@@ -527,8 +285,8 @@ class QueryListCreateAPIView(APIView):
                         image_data = image_files[query_stage]
                         print(f"Using uploaded file for stage {query_stage}: {image_data.name}")
                     
+                    # Session gán trực tiếp: không để serializer tra session cho từng query
                     serializer = QueryCreateSerializer(data={
-                        'session': session_id,
                         'text': local_query_data.get('text'),
                         'ocr': local_query_data.get('ocr'), 
                         'speech': local_query_data.get('speech'),
@@ -536,8 +294,7 @@ class QueryListCreateAPIView(APIView):
                         'stage': query_stage,
                     })
                     if serializer.is_valid():
-                        new_query = serializer.save()
-                        created_queries.append(new_query)
+                        created_queries.append(Query(session=session, **serializer.validated_data))
                     else:
                         return Response({
                             'message': 'Failed to create query',
@@ -548,14 +305,53 @@ class QueryListCreateAPIView(APIView):
             server_query_ids_to_delete = set(server_queries_dict.keys()) - local_query_ids
             deleted_count = 0
             
-            if server_query_ids_to_delete:
-                deleted_count = Query.objects.filter(
-                    id__in=server_query_ids_to_delete,
-                    session=session
-                ).delete()[0]
+            stored_images = []
+            try:
+                with transaction.atomic():
+                    # bulk_update / bulk_create không gọi save(): tự lưu file upload và tính image_hash
+                    for query in image_changed + created_queries:
+                        if query.image and not query.image._committed:
+                            query.image_hash = query.compute_image_hash()
+                            query.image.save(query.image.name, query.image.file, save=False)
+                            stored_images.append(query.image.name)
+                        else:
+                            query.image_hash = query.compute_image_hash()
+                    
+                    if updated_queries:
+                        now = timezone.now()
+                        for query in updated_queries:
+                            query.updated_at = now
+                        update_fields.add('updated_at')
+                        if 'image' in update_fields:
+                            update_fields.add('image_hash')
+                        Query.objects.bulk_update(updated_queries, sorted(update_fields))
+                    if created_queries:
+                        created_queries = Query.objects.bulk_create(created_queries)
+                    if server_query_ids_to_delete:
+                        # File ảnh của query bị xoá được dọn sau commit (signal post_delete)
+                        deleted_count = Query.objects.filter(
+                            id__in=server_query_ids_to_delete,
+                            session=session
+                        ).delete()[0]
+                    
+                    # bulk_update / bulk_create không gửi signal: tự dọn ảnh cũ và cache search
+                    if old_images:
+                        transaction.on_commit(partial(delete_image_files, old_images))
+                    if updated_queries or created_queries:
+                        transaction.on_commit(partial(search_cache.invalidate_session, session.id))
+            except Exception:
+                # Rollback: file vừa ghi vào storage không còn query nào trỏ tới
+                delete_image_files(stored_images)
+                raise
             
-            # Get final state from database
-            final_queries = Query.objects.filter(session=session).order_by('stage')
+            # Final state: dựng từ bộ nhớ; MySQL không trả id cho bulk_create nên khi đó đọc lại
+            if any(query.pk is None for query in created_queries):
+                final_queries = list(Query.objects.filter(session=session).order_by('stage'))
+            else:
+                final_queries = sorted(
+                    [q for q in server_queries if q.id not in server_query_ids_to_delete] + created_queries,
+                    key=lambda q: (q.stage, q.id)
+                )
             response_serializer = QuerySerializer(final_queries, many=True, context={'request': request})
             
             return Response({
@@ -569,6 +365,48 @@ class QueryListCreateAPIView(APIView):
                 'errors': {'detail': [str(e)]}
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def _build_queries_structure(self, stages: List[Tuple[Query, dict]]) -> Tuple[list, list]:
+        """
+        Dựng ``queries_structure`` gửi search server từ (instance, dữ liệu serialize) theo stage.
+        Đường dẫn ảnh lấy từ instance đi kèm nên không cần query DB thêm.
+
+        Returns:
+            (queries_structure, image_files_to_open) với mỗi ảnh là (image_name, path, filename)
+        """
+        queries_structure = []
+        image_files_to_open = []
+
+        for query_obj, query_data in stages:
+            query_item = {}
+            # Thêm text nếu có và không rỗng
+            if query_data.get('text') and query_data['text'].strip():
+                query_item['text'] = query_data['text']
+            # Thêm ocr nếu có và không rỗng
+            if query_data.get('ocr') and query_data['ocr'].strip() and query_data['ocr'].lower() != 'null':
+                query_item['ocr'] = query_data['ocr']
+
+            # Thêm subtitle nếu có và không rỗng
+            if query_data.get('speech') and query_data['speech'].strip() and query_data['speech'].lower() != 'null':
+                query_item['subtitle'] = query_data['speech']
+
+            # Xử lý image nếu có
+            if query_data.get('image'):
+                # Luôn chuẩn hóa path ảnh
+                norm_image_path = self._normalize_image_path(query_data['image'])
+                if query_obj.image and hasattr(query_obj.image, 'path'):
+                    image_path = query_obj.image.path
+                    image_name = os.path.basename(image_path)
+                    # Sử dụng tên file thực tế làm image_ref thay vì tạo reference
+                    query_item['image_ref'] = image_name
+                    image_files_to_open.append((image_name, image_path, image_name))
+                # Ghi lại path đã chuẩn hóa (nếu cần debug hoặc trả về)
+                query_item['image'] = norm_image_path
+            # Chỉ thêm vào queries_structure nếu có ít nhất một field
+            if query_item:
+                queries_structure.append(query_item)
+
+        return queries_structure, image_files_to_open
+
     def _flatten_temporal_results(
         self, temporal_results: List[List[Tuple[str, float]]],
     ) -> List[Tuple[str, float]]:
@@ -648,222 +486,224 @@ class QueryListCreateAPIView(APIView):
         
         return frames
 
-    def adjust_faiss_response(self, request, results) -> list:
-        """
-        Adjust FAISS search results to create frames array with full URLs.
-        Handles both single list of tuples and list of lists of tuples.
-        
-        Args:
-            request: Django request object
-            results: Either:
-                - List of tuples: [('L06_V005/14497.jpg', 0.222), ...]
-                - List of lists of tuples: [[('L06_V005/14497.jpg', 0.222), ...], ...]
-            
-        Returns:
-            Same structure as input but with frame data dictionaries instead of tuples
-        """
-        if not results:
-            return []
-        
-        # Get SERVER_IP from environment, fallback to request host
-        # server_ip = os.environ.get('SERVER_IP')
-        server_ip = None
-        if server_ip:
-            base_url = f"http://{server_ip}"
-        else:
-            # Fallback to request host
-            host = request.get_host()
-            scheme = 'https' if request.is_secure() else 'http'
-            base_url = f"{scheme}://{host}"
-        
-        def convert_tuple_to_frame(result_tuple):
-            """Convert single tuple to frame data"""
-            # Check if result_tuple is actually a tuple/list and has length
-            if not isinstance(result_tuple, (tuple, list)) or len(result_tuple) < 2:
-                return None
-                
-            path = result_tuple[0]  # e.g., "L06_V005/14497.jpg"
-            score_info = result_tuple[1]  # Can be just score or (scores_tuple, total_score, is_peak, peak_stage)
-            
-            # Extract score and peak frame info
-            if isinstance(score_info, (tuple, list)) and len(score_info) >= 2:
-                # New format with peak frame information
-                scores_tuple = score_info[0] if len(score_info) > 0 else ()
-                score = score_info[1] if len(score_info) > 1 else 0
-                is_peak_frame = score_info[2] if len(score_info) > 2 else False
-                peak_stage = score_info[3] if len(score_info) > 3 else -1
-            else:
-                # Old format: just a score value
-                score = score_info
-                is_peak_frame = False
-                peak_stage = -1
-            
-            # Parse video_name and frame_index from path
-            if '/' in path:
-                video_name, filename = path.rsplit('/', 1)
-                frame_index = filename.replace('.jpg', '')
-                
-                # Build frame URL
-                frame_url = f"{base_url}/media/cframes/{video_name}/{frame_index}.webp"
-                
-                frame_data = {
-                    'url': frame_url,
-                    'video_name': video_name,
-                    'frame_index': int(frame_index),
-                    'score': score,
-                    'is_peak_frame': is_peak_frame,
-                    'peak_stage': peak_stage
-                }
-                return frame_data
-            return None
-        
-        # Check if results is a list of lists (2D) or just a list of tuples (1D)
-        if results and len(results) > 0 and isinstance(results[0], list):
-            # Check if it's 2D (list of lists of tuples) or 1D (list of tuples as lists)
-            first_element = results[0]
-            if len(first_element) > 0 and isinstance(first_element[0], list) and len(first_element[0]) == 2:
-                # 2D format: [[['path1', score1], ['path2', score2]], [...]]
-                processed_results = []
-                for result_list in results:
-                    if isinstance(result_list, list):
-                        processed_sublist = []
-                        for result_tuple in result_list:
-                            frame_data = convert_tuple_to_frame(result_tuple)
-                            if frame_data:
-                                processed_sublist.append(frame_data)
-                        processed_results.append(processed_sublist)
-                return processed_results
-            elif len(first_element) == 2 and isinstance(first_element[0], str):
-                # 1D format: [['path1', score1], ['path2', score2], ...]
-                processed_results = []
-                for result_tuple in results:
-                    frame_data = convert_tuple_to_frame(result_tuple)
-                    if frame_data:
-                        processed_results.append(frame_data)
-                return processed_results
-            else:
-                # Unknown format, treating as 1D
-                processed_results = []
-                for result_tuple in results:
-                    frame_data = convert_tuple_to_frame(result_tuple)
-                    if frame_data:
-                        processed_results.append(frame_data)
-                return processed_results
-        else:
-            # Check if it's a flat array with path and score pairs
-            # Format: ['L08_V023/16268.jpg', 0.199, 'L08_V024/16269.jpg', 0.188, ...]
-            if len(results) >= 2 and isinstance(results[0], str) and isinstance(results[1], (int, float)):
-                frames = []
-                # Process pairs of (path, score)
-                for i in range(0, len(results), 2):
-                    if i + 1 < len(results):
-                        path = results[i]
-                        score = results[i + 1]
-                        frame_data = convert_tuple_to_frame((path, score))
-                        if frame_data:
-                            frames.append(frame_data)
-                return frames
-            else:
-                # Single list of tuples
-                frames = []
-                for result_tuple in results:
-                    frame_data = convert_tuple_to_frame(result_tuple)
-                    if frame_data:
-                        frames.append(frame_data)
-                return frames
-
-    def flatten_frames(self, frames):
-        """
-        Flatten frames array if it's a list of lists, otherwise return as is.
-        
-        Args:
-            frames: Either flat list of frames or list of lists of frames
-            
-        Returns:
-            Flat list of frames
-        """
-        if not frames:
-            return []
-        
-        # Check if it's a list of lists by examining the first element
-        if frames and len(frames) > 0 and isinstance(frames[0], list):
-            # It's a list of lists, flatten it
-            flattened = []
-            for frame_list in frames:
-                if isinstance(frame_list, list):
-                    flattened.extend(frame_list)
-            return flattened
-        else:
-            # It's already flat, return as is
-            return frames
 
-    def _process_frames_by_viewmode(self, results, view_mode):
-        """
-        Process frames based on view mode requirements.
-        
-        Args:
-            results: Results from adjust_faiss_response
-            view_mode: Either 'gallery' or 'samevideo'
-            
-        Returns:
-            Processed frames according to view mode
-        """
-        if not results:
-            return []
-        
-        if view_mode == 'gallery':
-            # Gallery mode needs flat array
-            if results and len(results) > 0 and isinstance(results[0], list):
-                # It's a list of lists, flatten it
-                return self.flatten_frames(results)
-            else:
-                # Already flat, return as is
-                return results
-                
-        elif view_mode == 'samevideo':
-            # Same video mode needs list of lists grouped by video
-            if results and len(results) > 0 and isinstance(results[0], list):
-                # Already list of lists, sort each sublist by frame_index
-                sorted_results = []
-                for sublist in results:
-                    if isinstance(sublist, list):
-                        # Sort each sublist by frame_index ascending
-                        sorted_sublist = sorted(sublist, key=lambda x: x.get('frame_index', 0) if isinstance(x, dict) else 0)
-                        sorted_results.append(sorted_sublist)
-                    else:
-                        sorted_results.append(sublist)
-                return sorted_results
-            else:
-                # Flat array, need to group by video while preserving rank
-                if not results:
-                    return []
-                
-                # Group frames by video_name while preserving original order
-                video_groups = {}
-                video_order = []
-                
-                for i, frame in enumerate(results):
-                    if isinstance(frame, dict):  # Make sure frame is a dictionary
-                        video_name = frame.get('video_name')
-                        if video_name not in video_groups:
-                            video_groups[video_name] = []
-                            video_order.append((video_name, i))  # Store video name with first occurrence index
-                        video_groups[video_name].append(frame)
-                
-                # Sort by first occurrence index to maintain rank order
-                video_order.sort(key=lambda x: x[1])
-                # Build result as list of lists, with each sublist sorted by frame_index
-                grouped_results = []
-                for video_name, _ in video_order:
-                    # Sort frames within each video group by frame_index ascending
-                    sorted_group = sorted(video_groups[video_name], key=lambda x: x.get('frame_index', 0) if isinstance(x, dict) else 0)
-                    grouped_results.append(sorted_group)
-                
-                return grouped_results
-        
-        # Default: return as is
-        return results
-    
+def load_session_queries(session_id, request) -> List[Tuple[Query, dict]]:
+    """Các query của session theo stage, mỗi phần tử là (instance, dữ liệu đã serialize)."""
+    queries = list(Query.objects.filter(session_id=session_id).order_by('stage'))
+    data = QuerySerializer(queries, many=True, context={'request': request}).data
+    return list(zip(queries, data))
+
+
+async def search_session_queries(request):
+    """
+    GET /api/queries/?session=...: temporal search cho các query của một session.
+
+    Chạy async (ASGI): truy vấn DB chạy một lượt qua ``sync_to_async``, request tới search
+    server qua ``search_client`` (httpx), nên worker không bị giữ trong lúc chờ search server.
+    """
+    view = QueryListCreateAPIView()
+    # --- Phần 1: Lấy và lọc QuerySet ---
+    session_id = request.GET.get('session')
+
+    if not session_id:
+        return JsonResponse({"error": "Session ID is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Một query DB (sắp theo stage) + serialize một lần, trong một lượt sang thread đồng bộ
+    stages = await sync_to_async(load_session_queries)(session_id, request)
+    # 'data' trả về giữ thứ tự mặc định của Query (mới nhất trước)
+    serializer_data = [data for _, data in sorted(stages, key=lambda stage: stage[0].created_at, reverse=True)]
+    sorted_queries_data = [data for _, data in stages]
+    if not stages:
+        return JsonResponse({
+            'message': 'Temporal search executed successfully',
+            'frames': [],
+            'data': serializer_data,
+        }, encoder=JSONEncoder, status=status.HTTP_200_OK)
+
+    # Parse search_url as comma-separated list
+    search_url_param = request.GET.get('search_url', '')
+    search_urls = [url.strip() for url in search_url_param.split(',') if url.strip()]
+
+    k_param = request.GET.get('k', '10')
+    viewmode = request.GET.get('viewmode', 'gallery')
+    temporal_time = request.GET.get('temporal_time', '30')  # in seconds, default 30s
+
+    # --- Phần 2: Chuẩn bị queries_structure và image_files ---
+    queries_structure, image_files_to_open = view._build_queries_structure(stages)
+
+    if not queries_structure:
+        print("No valid queries with text, ocr, or image content found.")
+        return JsonResponse({
+            'message': 'No valid queries with text, ocr, or image content found.',
+            'frames': [],
+            'data': serializer_data,
+        }, encoder=JSONEncoder, status=status.HTTP_200_OK)
+
+    # Chuẩn bị payload
+    queries_structure_str = json.dumps(queries_structure)
+
+    # Default weights - có thể được override bởi request params
+    default_weights = {'text': 0.3, 'ocr': 0.3, 'subtitle': 0.3, 'image': 0.1}
+
+    # Cho phép client gửi custom weights qua query params
+    weights = {}
+    if request.GET.get('text_weight'):
+        weights['text'] = float(request.GET.get('text_weight'))
+    if request.GET.get('ocr_weight'):
+        weights['ocr'] = float(request.GET.get('ocr_weight'))
+    if request.GET.get('subtitle_weight'):
+        weights['subtitle'] = float(request.GET.get('subtitle_weight'))
+    if request.GET.get('image_weight'):
+        weights['image'] = float(request.GET.get('image_weight'))
+
+    # default vector models config
+    vector_models_config = [
+        {
+            "model_name": "ViT-H-14-378-quickgelu",
+            "weight": 0.55
+        },
+        {
+            "model_name": "ViT-gopt-16-SigLIP2-384",
+            "weight": 0.45
+        }
+    ]
+    # Sử dụng default weights nếu không có custom weights
+    final_weights = {**default_weights, **weights}
+    weights_str = json.dumps(final_weights)
+
+    payload = {
+        'k': int(k_param),
+        'temporal_time': int(temporal_time),  # in seconds
+        'queries_structure': queries_structure_str,
+        'weights': weights_str,
+        'vector_models_config': json.dumps(vector_models_config),
+    }
+
+    # --- Phần 3: Gửi Request và Xử lý Lỗi với Multiple Search URLs ---
+    try:
+        # Ảnh đã có hash (tính lúc upload) chỉ gửi hash; search server cache ảnh theo hash.
+        # Ảnh cũ chưa có hash thì đọc vào bộ nhớ và gửi bytes như trước.
+        known_hashes = _stage_image_hashes(stages)
+        files_to_send = await asyncio.to_thread(
+            _read_image_files, [entry for entry in image_files_to_open if entry[2] not in known_hashes]
+        )
+
+        # Kiểm tra có search URLs không
+        if not search_urls:
+            return JsonResponse({
+                'message': 'No search URL provided',
+                'frames': [],
+                'data': sorted_queries_data,
+            }, encoder=JSONEncoder, status=status.HTTP_200_OK)
+
+        # Poll lặp lại cùng stage / tham số: trả kết quả đã cache
+        base_url = f"{'https' if request.is_secure() else 'http'}://{request.get_host()}"
+        image_hashes = {
+            **known_hashes,
+            **{filename: search_cache.content_hash(content) for _, (filename, content, _) in files_to_send}
+        }
+        digest = search_cache.fingerprint(queries_structure, image_hashes, payload, viewmode, search_urls, base_url)
+        cached = await search_cache.lookup(session_id, digest)
+        if cached is not None:
+            return JsonResponse({**cached, 'data': serializer_data, 'cached': True}, encoder=JSONEncoder, status=status.HTTP_200_OK)
+
+        # Server khỏe/nhanh được thử trước; server chậm hơn p95 thì gửi thêm tới server kế tiếp
+        try:
+            # Xin encoding gọn (msgpack / JSON dạng cột); server cũ vẫn trả JSON mặc định
+            response, search_url = await search_client.post(
+                search_urls, '/search', data={**payload, 'image_hashes': json.dumps(known_hashes)},
+                files=files_to_send, headers={'Accept': SEARCH_ACCEPT_HEADER},
+                passthrough_status=IMAGE_RESEND_STATUS if known_hashes else ()
+            )
+            if response.status_code in IMAGE_RESEND_STATUS:
+                # 409: server chưa có ảnh của hash nào đó (mới khởi động / bị evict);
+                # 400: server cũ không hiểu image_hashes. Gửi lại kèm mọi ảnh.
+                files_to_send = await asyncio.to_thread(_read_image_files, image_files_to_open)
+                response, search_url = await search_client.post(
+                    search_urls, '/search', data=payload, files=files_to_send,
+                    headers={'Accept': SEARCH_ACCEPT_HEADER}
+                )
+        except search_client.SearchServerError as e:
+            return JsonResponse({
+                'message': 'Queries retrieved successfully, but all search servers failed',
+                'data': serializer_data,
+                'frames': [],
+                'error': f'Failed to communicate with any search server. Last error: {e}',
+                'servers_tried': len(e.errors)
+            }, encoder=JSONEncoder, status=status.HTTP_200_OK)
+
+        # Giữ dạng cột của response gọn: frames được dựng thẳng trong một lượt
+        search_data = decode_search_response(response, expand=False)
+        frames = shape_frames(payload_chains(search_data), base_url, viewmode)
+        server_number = [url.rstrip('/') for url in search_urls].index(search_url) + 1
+
+        result = {
+            'message': f'Temporal search executed successfully using server {server_number}',
+            'frames': frames,
+            # Chỉ trả metadata của search server, kết quả đã nằm trong 'frames'
+            'search_server_response': {
+                key: value for key, value in search_data.items() if key not in ('results', 'videos', 'encoding')
+            },
+            'search_url_used': search_url
+        }
+        await search_cache.store(session_id, digest, result)
+        return JsonResponse({**result, 'data': serializer_data}, encoder=JSONEncoder, status=status.HTTP_200_OK)
+
+    except FileNotFoundError as e:
+        print(f"ERROR: Image file not found - {e}")
+        # Trả về data queries dù có lỗi file
+        return JsonResponse({
+            'message': 'Queries retrieved successfully, but image file not found',
+            'data': serializer_data,
+            'frames': [],
+            'error': 'An image file required for the query was not found'
+        }, encoder=JSONEncoder, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        print(f"ERROR: An unexpected error occurred - {e}")
+        # Trả về data queries dù có lỗi khác
+        return JsonResponse({
+            'message': 'Queries retrieved successfully, but search failed',
+            'data': serializer_data,
+            'frames': [],
+            'error': 'An unexpected error occurred during search'
+        }, encoder=JSONEncoder, status=status.HTTP_200_OK)
+
+
+def _stage_image_hashes(stages: List[Tuple[Query, dict]]) -> Dict[str, str]:
+    """image_ref -> SHA-256 cho các ảnh đã được hash lúc upload (``Query.image_hash``)."""
+    return {
+        os.path.basename(query_obj.image.name): query_obj.image_hash
+        for query_obj, query_data in stages
+        if query_data.get('image') and query_obj.image and query_obj.image_hash
+    }
+
+
+def _read_image_files(image_files_to_open: List[Tuple[str, str, str]]) -> List[Tuple[str, Tuple[str, bytes, str]]]:
+    files_to_send = []
+    for image_name, path, filename in image_files_to_open:
+        with open(path, 'rb') as f:
+            # Sử dụng filename thực tế để server có thể match với image_ref
+            files_to_send.append(('image_files', (filename, f.read(), 'image/jpeg')))
+    return files_to_send
+
+
+_query_list_create_view = QueryListCreateAPIView.as_view()
+
+
+@csrf_exempt
+async def query_list_create(request, *args, **kwargs):
+    """/api/queries/: GET (search) chạy async, các method khác đi qua DRF view đồng bộ."""
+    if request.method == 'GET':
+        return await search_session_queries(request)
+    return await sync_to_async(_query_list_create_view)(request, *args, **kwargs)
+
+
+# drf_yasg sinh docs từ view class gắn trên callback
+query_list_create.cls = QueryListCreateAPIView
+query_list_create.initkwargs = {}
+
+
 class QueryDetailAPIView(APIView):
     """
     API endpoint for retrieving, updating and deleting a specific query
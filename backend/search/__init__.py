@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# Shared Meilisearch helpers (meili_common) live at the repository root,
+# mounted at /meili_common next to /backend inside the container.
+_REPO_ROOT = str(Path(__file__).resolve().parent.parent.parent)
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
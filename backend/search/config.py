@@ -10,6 +10,12 @@ MEILISEARCH_HOST = os.getenv('MEILISEARCH_HOST', 'localhost')
 MEILISEARCH_PORT = int(os.getenv('MEILISEARCH_PORT', '7700'))
 MEILISEARCH_API_KEY = os.getenv('MEILISEARCH_API_KEY', 'masterKey')
 
+# Checkpoint directory for the bulk indexer (meili_common.indexer)
+MEILISEARCH_STATE_DIR = os.getenv(
+    'MEILISEARCH_STATE_DIR',
+    os.path.join(os.getenv('CONTAINER_INDEX_DIR', '/backend/index'), 'meili-state')
+)
+
 def get_dynamic_datasets():
     """
     Dynamically discover OCR datasets from CONTAINER_INDEX_DIR environment variable.
@@ -1,10 +1,6 @@
 import os
-import json
-import glob
 import time
-from pathlib import Path
 from django.core.management.base import BaseCommand
-from django.conf import settings
 
 
 class Command(BaseCommand):
@@ -14,7 +10,7 @@ class Command(BaseCommand):
         parser.add_argument(
             '--reset',
             action='store_true',
-            help='Reset indices before indexing',
+            help='Reset indices before indexing (default: only re-index files whose content changed)',
         )
         parser.add_argument(
             '--dataset',
@@ -26,6 +22,24 @@ class Command(BaseCommand):
             action='store_true',
             help='Skip cache warmup step',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Number of processes used to parse JSON files (default: CPU count)',
+        )
+        parser.add_argument(
+            '--batch-mb',
+            type=float,
+            default=8,
+            help='Maximum NDJSON batch size in MB (default: 8)',
+        )
+        parser.add_argument(
+            '--max-in-flight',
+            type=int,
+            default=4,
+            help='Maximum number of pending Meilisearch tasks (default: 4)',
+        )
 
     def handle(self, *args, **options):
         """Main entry point for the command"""
@@ -55,10 +69,10 @@ class Command(BaseCommand):
             # Step 2: Index datasets
             if options['dataset']:
                 # Index specific dataset
-                self._index_specific_dataset(service, options['dataset'])
+                self._index_specific_dataset(service, options['dataset'], options)
             else:
                 # Index all datasets
-                self._index_all_datasets(service, options['reset'])
+                self._index_all_datasets(service, options)
             
             # Step 4: Pre-warm cache
             if not options.get('skip_warmup', False):
@@ -70,56 +84,56 @@ class Command(BaseCommand):
             self.stderr.write(f"Setup failed: {e}")
             raise
 
-    def _index_all_datasets(self, service, reset=False):
-        """Index all datasets with minimal logging"""
+    def _build_indexer(self, service, options):
+        """Create the shared bulk indexer configured from command options"""
+        from meili_common.indexer import BulkIndexer
+        from search.config import MEILISEARCH_STATE_DIR
+
+        return BulkIndexer(
+            service.client,
+            workers=options.get('workers'),
+            batch_bytes=int(options.get('batch_mb', 8) * 1024 * 1024),
+            max_in_flight=options.get('max_in_flight', 4),
+            state_dir=MEILISEARCH_STATE_DIR,
+            log=self.stdout.write,
+        )
+
+    def _index_all_datasets(self, service, options, datasets=None):
+        """Index datasets with the parallel bulk indexer"""
         try:
             from search.config import LIST_DATASET
-            
+
+            indexer = self._build_indexer(service, options)
+            reset = options.get('reset', False)
+
             total_start = time.time()
             overall_success = 0
             overall_failed = 0
-            
-            for data_path, index_name in LIST_DATASET:
+            overall_docs = 0
+
+            for data_path, index_name in (datasets if datasets is not None else LIST_DATASET):
                 if not os.path.exists(data_path):
                     self.stdout.write(f"Skipping {index_name}: Directory {data_path} does not exist")
                     continue
-                
+
                 self.stdout.write(f"Indexing {index_name}...")
-                start_time = time.time()
-                
-                successful = 0
-                failed = 0
-                
-                # Get all JSON files
-                json_files = list(Path(data_path).rglob('*.json'))
-                
-                if not json_files:
-                    self.stdout.write(f"No JSON files found in {data_path}")
-                    continue
-                
-                # Process files without progress bar
-                for json_file in json_files:
-                    try:
-                        # Use the correct service method
-                        service.index_ocr_data(json_file, index_name)
-                        successful += 1
-                                
-                    except Exception as e:
-                        failed += 1
-                
-                elapsed = time.time() - start_time
-                self.stdout.write(f"  ✓ {index_name}: OK: {successful}, FAILED: {failed} ({elapsed:.1f}s)")
-                
-                overall_success += successful
-                overall_failed += failed
-            
+                report = indexer.index_dataset(data_path, index_name, reset=reset)
+                self.stdout.write(f"  ✓ {report.summary()}")
+
+                overall_success += report.files_ok
+                overall_failed += report.files_failed
+                overall_docs += report.documents
+
             total_elapsed = time.time() - total_start
-            self.stdout.write(f"✓ All datasets indexed: OK: {overall_success}, FAILED: {overall_failed} ({total_elapsed:.1f}s)")
-            
+            self.stdout.write(
+                f"✓ All datasets indexed: OK: {overall_success}, FAILED: {overall_failed}, "
+                f"docs: {overall_docs:,} ({total_elapsed:.1f}s)"
+            )
+
         except Exception as e:
             self.stderr.write(f"Indexing failed: {e}")
 
-    def _index_specific_dataset(self, service, dataset_name):
+    def _index_specific_dataset(self, service, dataset_name, options):
         """Index specific dataset"""
         try:
             from search.config import LIST_DATASET
@@ -135,7 +149,7 @@ class Command(BaseCommand):
                 self.stderr.write(f"Dataset '{dataset_name}' not found in configuration")
                 return
             
-            self._index_all_datasets(service, False)  # Will process only existing datasets
+            self._index_all_datasets(service, options, datasets=[target_config])
             
         except Exception as e:
             self.stderr.write(f"Specific dataset indexing failed: {e}")
@@ -0,0 +1,17 @@
+"""
+Shared Meilisearch helpers used by both the search server (``server/``) and
+the Django backend (``backend/search``).
+
+The package lives at the repository root and is mounted read-only at
+``/meili_common`` inside the containers, next to ``/app`` and ``/backend``.
+"""
+
+from .indexer import BulkIndexer, IndexReport
+from .scoring import HitScorer, FuzzyScorer, MatchQualityScorer, deduplicate_hits
+from .text import remove_vietnamese_accents, expansion_query
+
+__all__ = [
+    'BulkIndexer', 'IndexReport',
+    'HitScorer', 'FuzzyScorer', 'MatchQualityScorer', 'deduplicate_hits',
+    'remove_vietnamese_accents', 'expansion_query',
+]
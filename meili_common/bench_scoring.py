@@ -0,0 +1,194 @@
+"""
+Benchmark re-ranking của backend (MatchQualityScorer) trên các dòng OCR tổng hợp.
+
+So sánh cách cũ (LCS liệt kê mọi substring O(n^3), chấm điểm mọi hit rồi dedup) với
+``rank_hits`` (DP LCS có cắt sớm + pre-filter top-size), đồng thời kiểm tra kết quả
+giống hệt nhau (thứ tự, key và điểm).
+
+Chạy:
+    python -m meili_common.bench_scoring --queries 200 --size 100 --indexes 2
+"""
+
+import argparse
+import random
+import statistics
+import time
+from typing import Any, Dict, List
+
+from .scoring import MatchQualityScorer, calculate_match_quality, rank_hits
+from . import scoring
+
+
+# Từ vựng kiểu OCR tin tức (đã bỏ dấu, như dữ liệu đã index)
+_WORDS = (
+    "viet nam ha noi thanh pho ho chi minh tin tuc thoi su ban tin chinh phu quoc hoi "
+    "kinh te xa hoi giao thong cong an nguoi dan bao lu mien trung vet cay canh sat "
+    "benh vien truong hoc hoc sinh giao duc the thao bong da doi tuyen world cup "
+    "thoi tiet nhiet do mua lon sat lo dat khan cap cuu ho chien si bo doi dien bien "
+    "nong nghiep lua gao xuat khau doanh nghiep dau tu ngan hang chung khoan gia vang "
+    "htv vtv1 vtv24 60 giay truc tiep phong su dac biet le hoi van hoa du lich"
+).split()
+
+
+def _noisy_word(rng: random.Random, word: str) -> str:
+    r = rng.random()
+    if r < 0.05 and len(word) > 2:
+        i = rng.randrange(len(word))
+        return word[:i] + word[i + 1:]  # mất ký tự
+    if r < 0.08:
+        i = rng.randrange(len(word))
+        return word[:i] + rng.choice('abcdeghiklmnopqrstuvxy') + word[i + 1:]  # nhận sai ký tự
+    return word
+
+
+def make_line(rng: random.Random) -> str:
+    words = [_noisy_word(rng, rng.choice(_WORDS)) for _ in range(rng.randint(3, 18))]
+    # OCR hay dính chữ
+    out = [words[0]]
+    for w in words[1:]:
+        if rng.random() < 0.15:
+            out[-1] += w
+        else:
+            out.append(w)
+    return ' '.join(out)
+
+
+def make_query(rng: random.Random) -> str:
+    return ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(1, 4)))
+
+
+def make_hits(rng: random.Random, n_indexes: int, per_index: int, n_videos: int = 50) -> List[Dict[str, Any]]:
+    hits = []
+    for _ in range(n_indexes):
+        scores = sorted((rng.random() for _ in range(per_index)), reverse=True)
+        for s in scores:
+            hits.append({
+                'video_name': f"L{rng.randint(1, 30):02d}_V{rng.randint(1, n_videos):03d}",
+                'frame_index': rng.randint(0, 400) * 25,
+                'text': make_line(rng),
+                '_rankingScore': s,
+            })
+    return hits
+
+
+def make_tied_hits(rng: random.Random, n_indexes: int, per_index: int, n_videos: int = 10) -> List[Dict[str, Any]]:
+    """Hits có điểm bằng nhau nhiều: ít dòng text, _rankingScore rời rạc, key trùng nhiều."""
+    texts = [make_line(rng) for _ in range(5)]
+    hits = []
+    for _ in range(n_indexes):
+        scores = sorted((rng.choice((0.25, 0.5, 0.75, 1.0)) for _ in range(per_index)), reverse=True)
+        for s in scores:
+            hits.append({
+                'video_name': f"L01_V{rng.randint(1, n_videos):03d}",
+                'frame_index': rng.randint(0, 20) * 25,
+                'text': rng.choice(texts),
+                '_rankingScore': s,
+            })
+    return hits
+
+
+# --- Cách cũ, giữ nguyên để đối chiếu ---
+
+def _reference_substring_similarity(query_concat: str, text_word: str, min_ratio: float = 0.0) -> float:
+    if not query_concat or not text_word:
+        return 0.0
+    longer = query_concat if len(query_concat) > len(text_word) else text_word
+    shorter = text_word if longer == query_concat else query_concat
+    if shorter in longer:
+        return len(shorter) / len(longer)
+    max_length = 0
+    for i in range(len(shorter)):
+        for j in range(i + 1, len(shorter) + 1):
+            substr = shorter[i:j]
+            if substr in longer and len(substr) > max_length:
+                max_length = len(substr)
+    return max_length / len(longer) if max_length > 0 else 0.0
+
+
+def reference_rank(hits: List[Dict[str, Any]], query: str, size: int) -> List[Dict[str, Any]]:
+    all_results = []
+    query_lower = query.lower().strip()
+    for hit in hits:
+        text = hit.get('text', '').lower().strip()
+        meili_score = hit.get('_rankingScore', 0.5)
+        custom_score = calculate_match_quality(text, query_lower)
+        all_results.append({
+            'video_name': hit.get('video_name', ''),
+            'frame_index': hit.get('frame_index', 0),
+            '_rankingScore': (custom_score + meili_score) / 2.0,
+        })
+    all_results.sort(key=lambda x: x['_rankingScore'], reverse=True)
+    unique = {}
+    for result in all_results:
+        key = f"{result['video_name']}_{result['frame_index']}"
+        if key not in unique or result['_rankingScore'] > unique[key]['_rankingScore']:
+            unique[key] = result
+    deduplicated = list(unique.values())
+    deduplicated.sort(key=lambda x: x['_rankingScore'], reverse=True)
+    return deduplicated[:size]
+
+
+def _percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def _same_ranking(hits: List[Dict[str, Any]], scorer: MatchQualityScorer, query: str, size: int) -> bool:
+    expected = reference_rank([dict(h) for h in hits], query, size)
+    got = rank_hits([dict(h) for h in hits], scorer, query, size)
+    return (
+        [(h['video_name'], h['frame_index'], h['_rankingScore']) for h in got]
+        == [(h['video_name'], h['frame_index'], h['_rankingScore']) for h in expected]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--size', type=int, default=100)
+    parser.add_argument('--indexes', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=13)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    scorer = MatchQualityScorer()
+    per_index = args.size * 2  # giống search_ocr: limit = size * 2 mỗi index
+    workload = [(make_query(rng), make_hits(rng, args.indexes, per_index)) for _ in range(args.queries)]
+
+    old_times, new_times = [], []
+    for query, hits in workload:
+        # Cách cũ dùng LCS O(n^3)
+        scoring.substring_similarity, fast = _reference_substring_similarity, scoring.substring_similarity
+        try:
+            start = time.perf_counter()
+            expected = reference_rank([dict(h) for h in hits], query, args.size)
+            old_times.append(time.perf_counter() - start)
+        finally:
+            scoring.substring_similarity = fast
+
+        start = time.perf_counter()
+        got = rank_hits([dict(h) for h in hits], scorer, query, args.size)
+        new_times.append(time.perf_counter() - start)
+
+        got = [(h['video_name'], h['frame_index'], h['_rankingScore']) for h in got]
+        expected = [(h['video_name'], h['frame_index'], h['_rankingScore']) for h in expected]
+        if got != expected:
+            raise SystemExit(f"Kết quả khác nhau với query {query!r}")
+
+    # Điểm float ngẫu nhiên gần như không bao giờ bằng nhau: kiểm tra riêng thứ tự khi bằng điểm
+    for _ in range(args.queries):
+        query, hits = make_query(rng), make_tied_hits(rng, args.indexes, per_index)
+        if not _same_ranking(hits, scorer, query, rng.randint(1, args.size)):
+            raise SystemExit(f"Kết quả khác nhau khi bằng điểm với query {query!r}")
+
+    print(f"{args.queries} queries, {args.indexes * per_index} hits/query, size={args.size}: "
+          f"kết quả giống hệt (kể cả {args.queries} workload bằng điểm)")
+    for name, times in (('old', old_times), ('new', new_times)):
+        ms = [t * 1000 for t in times]
+        print(f"  {name}: mean {statistics.mean(ms):.2f} ms  p50 {_percentile(ms, 50):.2f} ms  "
+              f"p95 {_percentile(ms, 95):.2f} ms  p99 {_percentile(ms, 99):.2f} ms")
+    print(f"  speedup (mean): {statistics.mean(old_times) / statistics.mean(new_times):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+HTTP client dùng chung cho phần search: một ``requests.Session`` có connection pool,
+mỗi truy vấn gửi đúng một request ``POST /multi-search`` cho tất cả index / query mở rộng.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .scoring import HitScorer, rank_hits
+
+
+class MeiliHttpClient:
+    """
+    Client mỏng gọi thẳng REST API của Meilisearch qua session giữ kết nối (keep-alive).
+    Session của requests dùng được từ nhiều thread; pool_size nên >= số thread gọi đồng thời.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        api_key: Optional[str] = None,
+        pool_size: int = 32,
+        timeout: float = 10.0
+    ):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+        if api_key:
+            self.session.headers.update({'Authorization': f'Bearer {api_key}'})
+
+    def multi_search(self, queries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        response = self.session.post(
+            f"{self.url}/multi-search",
+            json={'queries': queries},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        self.session.close()
+
+
+class MeiliSearcher:
+    """
+    Search + re-rank + dedup trên nhiều index bằng một lần multi_search.
+    """
+
+    def __init__(self, http: MeiliHttpClient, scorer: HitScorer):
+        self.http = http
+        self.scorer = scorer
+
+    def build_queries(
+        self,
+        index_names: Sequence[str],
+        queries: Sequence[str],
+        limit: int,
+        attributes: Optional[List[str]] = None,
+        matching_strategy: str = 'last'
+    ) -> List[Dict[str, Any]]:
+        body = []
+        for index_name in index_names:
+            for q in queries:
+                body.append({
+                    'indexUid': index_name,
+                    'q': q,
+                    'limit': limit,
+                    'attributesToRetrieve': attributes or ['*'],
+                    'showRankingScore': self.scorer.uses_ranking_score,
+                    'matchingStrategy': matching_strategy,
+                })
+        return body
+
+    def search(
+        self,
+        index_names: Sequence[str],
+        queries: Sequence[str],
+        size: int,
+        limit: int,
+        score_query: Optional[str] = None,
+        attributes: Optional[List[str]] = None,
+        matching_strategy: str = 'last'
+    ) -> List[Dict[str, Any]]:
+        """
+        Args:
+            index_names: Các index cần search
+            queries: Các query (đã chuẩn hoá) gửi cho mỗi index
+            size: Số kết quả trả về sau khi dedup
+            limit: Số hits tối đa Meilisearch trả về cho mỗi (index, query)
+            score_query: Query dùng để chấm điểm (mặc định là queries[0])
+        """
+        if not index_names or not queries:
+            return []
+        score_query = queries[0] if score_query is None else score_query
+
+        response = self.http.multi_search(
+            self.build_queries(index_names, queries, limit, attributes, matching_strategy)
+        )
+
+        hits = [hit for result in response['results'] for hit in result['hits']]
+        return rank_hits(hits, self.scorer, score_query, size)
@@ -0,0 +1,427 @@
+"""
+Parallel, pipelined bulk indexer for OCR / subtitle JSON datasets.
+
+Each dataset is a directory of ``<video_name>.json`` files mapping
+``frame_index`` to the frame text (either a plain string or ``{"text": ...}``).
+OCR datasets get one document per frame; subtitle datasets can be indexed as
+spans of consecutive frames sharing the same line (``spans=True``).
+
+Pipeline:
+1. Files are parsed into NDJSON lines inside a process pool, with a bounded
+   window of pending files so memory does not grow with the dataset size.
+2. Lines are packed into batches capped by size in bytes and sent with
+   ``add_documents_ndjson``.
+3. At most ``max_in_flight`` Meilisearch tasks are pending at any time. Every
+   task is awaited and its status verified.
+4. A file is written to the manifest only once the task carrying its
+   documents succeeded, so a restarted run skips everything already indexed.
+
+The manifest stores a SHA-1 of every indexed file. Re-runs compare it with the
+files on disk and only delete and re-add documents of videos whose JSON
+changed (or was removed), instead of re-indexing the whole dataset.
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+
+def file_sha1(path: str) -> str:
+    """SHA-1 of a file's content."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _frame_text(frame_data: Any) -> Optional[str]:
+    text = frame_data.get('text') if isinstance(frame_data, dict) else frame_data
+    if not isinstance(text, str) or not text.strip():
+        return None
+    return text.strip()
+
+
+def parse_dataset_file(json_file: str, index_name: str, spans: bool = False) -> Tuple[str, bytes, int, str]:
+    """
+    Parse one dataset file into NDJSON bytes (runs inside a worker process).
+
+    With ``spans`` (subtitle datasets), consecutive frames carrying the same
+    text are merged into one document ``{start_frame, end_frame, text}`` whose
+    ``frame_index`` is the first frame of the span, instead of one document
+    per frame.
+
+    Returns:
+        (json_file, ndjson_bytes, document_count, sha1_of_file)
+    """
+    with open(json_file, 'rb') as f:
+        raw = f.read()
+    data = json.loads(raw.decode('utf-8'))
+
+    video_name = Path(json_file).stem
+    lines = []
+    if spans:
+        frames = sorted((int(frame_index), _frame_text(frame_data)) for frame_index, frame_data in data.items())
+        span = None  # [start_frame, end_frame, text]
+        for frame_index, text in frames + [(None, None)]:
+            if span is not None and text == span[2]:
+                span[1] = frame_index
+                continue
+            if span is not None:
+                doc = {
+                    "id": f"{index_name}_{video_name}_{span[0]}",
+                    "video_name": video_name,
+                    "frame_index": span[0],
+                    "start_frame": span[0],
+                    "end_frame": span[1],
+                    "text": span[2],
+                    "dataset_type": index_name
+                }
+                lines.append(json.dumps(doc, ensure_ascii=False))
+            # Frame không có text cắt span hiện tại
+            span = [frame_index, frame_index, text] if text is not None else None
+    else:
+        for frame_index, frame_data in data.items():
+            text = _frame_text(frame_data)
+            if text is None:
+                continue
+            doc = {
+                "id": f"{index_name}_{video_name}_{frame_index}",
+                "video_name": video_name,
+                "frame_index": int(frame_index),
+                "text": text,
+                "dataset_type": index_name
+            }
+            lines.append(json.dumps(doc, ensure_ascii=False))
+
+    payload = ("\n".join(lines) + "\n").encode('utf-8') if lines else b""
+    return json_file, payload, len(lines), hashlib.sha1(raw).hexdigest()
+
+
+def _task_field(task: Any, name: str, default: Any = None) -> Any:
+    """Read a field from a Meilisearch task (model object or plain dict)."""
+    if isinstance(task, dict):
+        return task.get(name, default)
+    return getattr(task, name, default)
+
+
+@dataclass
+class IndexReport:
+    """Kết quả index của một dataset."""
+    index_name: str
+    files_ok: int = 0
+    files_failed: int = 0
+    files_skipped: int = 0
+    files_changed: int = 0
+    files_removed: int = 0
+    documents: int = 0
+    tasks: int = 0
+    elapsed: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def docs_per_sec(self) -> float:
+        return self.documents / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.index_name}: OK: {self.files_ok}, FAILED: {self.files_failed}, "
+            f"UNCHANGED: {self.files_skipped}, CHANGED: {self.files_changed}, "
+            f"REMOVED: {self.files_removed}, docs: {self.documents:,} "
+            f"({self.elapsed:.1f}s, {self.docs_per_sec:,.0f} docs/s)"
+        )
+
+
+class IndexManifest:
+    """
+    Per-index manifest of indexed files, stored next to the index state::
+
+        {relative_json_path: {"sha1", "size", "mtime", "video_name", "documents", "layout"}}
+
+    Written atomically (tmp file + rename) after every verified task.
+    """
+
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self.files: Dict[str, Dict[str, Any]] = {}
+        if path is not None and path.exists():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.files = json.load(f).get('files', {})
+            except (OSError, ValueError):
+                self.files = {}
+
+    def mark_done(self, entries: List[Tuple[str, Dict[str, Any]]]):
+        for rel_path, entry in entries:
+            self.files[rel_path] = entry
+        self.save()
+
+    def forget(self, rel_paths: List[str]):
+        for rel_path in rel_paths:
+            self.files.pop(rel_path, None)
+        self.save()
+
+    def clear(self):
+        self.files = {}
+        if self.path is not None and self.path.exists():
+            self.path.unlink()
+
+    def save(self):
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'files': self.files}, f)
+        os.replace(tmp_path, self.path)
+
+
+@dataclass
+class _PendingBatch:
+    task_uid: int
+    files: List[Tuple[str, Dict[str, Any]]]
+    documents: int
+
+
+class BulkIndexer:
+    """
+    Index OCR / subtitle datasets into Meilisearch using a process pool for
+    parsing and a bounded window of in-flight indexing tasks.
+    """
+
+    def __init__(
+        self,
+        client,
+        workers: Optional[int] = None,
+        batch_bytes: int = 8 * 1024 * 1024,
+        max_in_flight: int = 4,
+        state_dir: Optional[str] = None,
+        task_timeout_ms: int = 10 * 60 * 1000,
+        log: Callable[[str], None] = print
+    ):
+        """
+        Args:
+            client: ``meilisearch.Client``
+            workers: Số process parse JSON (mặc định: số CPU)
+            batch_bytes: Kích thước tối đa (bytes) của một batch NDJSON
+            max_in_flight: Số task Meilisearch tối đa đang chờ xử lý
+            state_dir: Thư mục lưu manifest; ``None`` để tắt manifest (luôn index lại)
+            task_timeout_ms: Thời gian chờ tối đa cho mỗi task
+            log: Hàm ghi log (print, self.stdout.write, ...)
+        """
+        self.client = client
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_bytes = batch_bytes
+        self.max_in_flight = max(1, max_in_flight)
+        self.state_dir = Path(state_dir) if state_dir else None
+        self.task_timeout_ms = task_timeout_ms
+        self.log = log
+
+    def _manifest_path(self, index_name: str) -> Optional[Path]:
+        if self.state_dir is None:
+            return None
+        return self.state_dir / f"{index_name}.manifest.json"
+
+    def _wait_task(self, task_uid: int) -> Optional[str]:
+        """Wait for a task and return an error message, or ``None`` on success."""
+        try:
+            task = self.client.wait_for_task(task_uid, timeout_in_ms=self.task_timeout_ms, interval_in_ms=200)
+        except Exception as e:
+            return f"task {task_uid}: {e}"
+        task_status = _task_field(task, 'status')
+        if task_status != 'succeeded':
+            return f"task {task_uid} {task_status}: {_task_field(task, 'error')}"
+        return None
+
+    def _drain_one(self, in_flight: Deque[_PendingBatch], manifest: IndexManifest, report: IndexReport):
+        batch = in_flight.popleft()
+        error = self._wait_task(batch.task_uid)
+        if error:
+            report.files_failed += len(batch.files)
+            report.errors.append(error)
+            self.log(f"  ✗ {error}")
+            return
+        report.files_ok += len(batch.files)
+        report.documents += batch.documents
+        manifest.mark_done(batch.files)
+
+    def reset_index(self, index_name: str):
+        """Delete all documents of an index and forget its manifest."""
+        index = self.client.index(index_name)
+        error = self._wait_task(_task_field(index.delete_all_documents(), 'task_uid'))
+        if error:
+            raise RuntimeError(f"Failed to reset {index_name}: {error}")
+        IndexManifest(self._manifest_path(index_name)).clear()
+
+    def _delete_videos(self, index, video_names: List[str]):
+        """Delete every document of the given videos (chunks of 500 names)."""
+        for i in range(0, len(video_names), 500):
+            names = ", ".join(json.dumps(name) for name in video_names[i:i + 500])
+            task = index.delete_documents(filter=f"video_name IN [{names}]")
+            error = self._wait_task(_task_field(task, 'task_uid'))
+            if error:
+                raise RuntimeError(f"Failed to delete stale documents: {error}")
+
+    def _plan(self, root: Path, manifest: IndexManifest, report: IndexReport, layout: str = 'frame'):
+        """
+        Compare files on disk with the manifest. Files indexed with another
+        document layout (per-frame vs span) count as changed.
+
+        Returns:
+            (files_to_index, stale_video_names, removed_rel_paths)
+        """
+        to_index = []
+        stale_videos = []
+        on_disk = set()
+        for json_file in sorted(root.rglob('*.json')):
+            rel_path = json_file.relative_to(root).as_posix()
+            on_disk.add(rel_path)
+            entry = manifest.files.get(rel_path)
+            if entry is None:
+                to_index.append((str(json_file), rel_path))
+                continue
+            stat = json_file.stat()
+            if entry.get('layout', 'frame') != layout:
+                report.files_changed += 1
+                stale_videos.append(entry.get('video_name', json_file.stem))
+                to_index.append((str(json_file), rel_path))
+                continue
+            if entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime:
+                report.files_skipped += 1
+                continue
+            # Size/mtime đổi: so sánh nội dung thật bằng hash
+            if entry.get('sha1') == file_sha1(str(json_file)):
+                manifest.files[rel_path] = {**entry, 'size': stat.st_size, 'mtime': stat.st_mtime}
+                report.files_skipped += 1
+                continue
+            report.files_changed += 1
+            stale_videos.append(entry.get('video_name', json_file.stem))
+            to_index.append((str(json_file), rel_path))
+
+        removed = [rel_path for rel_path in manifest.files if rel_path not in on_disk]
+        for rel_path in removed:
+            stale_videos.append(manifest.files[rel_path].get('video_name', Path(rel_path).stem))
+        report.files_removed = len(removed)
+        return to_index, stale_videos, removed
+
+    def index_dataset(self, data_path: str, index_name: str, reset: bool = False, spans: bool = False) -> IndexReport:
+        """
+        Index every ``*.json`` file under ``data_path`` into ``index_name``.
+        ``spans`` merges consecutive frames with identical text (subtitles).
+
+        Unless ``reset``, only new files and files whose content hash differs
+        from the manifest are (re-)indexed; documents of changed or removed
+        videos are deleted first.
+        """
+        report = IndexReport(index_name=index_name)
+        start_time = time.time()
+
+        if reset:
+            self.reset_index(index_name)
+
+        manifest = IndexManifest(self._manifest_path(index_name))
+        root = Path(data_path)
+        index = self.client.index(index_name)
+        layout = 'span' if spans else 'frame'
+        pending_files, stale_videos, removed = self._plan(root, manifest, report, layout)
+
+        if stale_videos:
+            self.log(f"  ↻ {index_name}: xóa documents của {len(stale_videos)} video đã thay đổi/bị xóa")
+            self._delete_videos(index, stale_videos)
+        # Luôn lưu lại manifest (có thể đã cập nhật mtime của file không đổi)
+        manifest.forget(removed)
+
+        if not pending_files:
+            report.elapsed = time.time() - start_time
+            return report
+
+        in_flight: Deque[_PendingBatch] = deque()
+        buffer: List[bytes] = []
+        buffer_size = 0
+        buffer_files: List[Tuple[str, Dict[str, Any]]] = []
+        buffer_docs = 0
+        last_log = start_time
+
+        def flush():
+            nonlocal buffer, buffer_size, buffer_files, buffer_docs
+            if not buffer_files:
+                return
+            if buffer_docs == 0:
+                # Chỉ toàn file rỗng: không cần gửi task, đánh dấu xong luôn
+                report.files_ok += len(buffer_files)
+                manifest.mark_done(buffer_files)
+            else:
+                while len(in_flight) >= self.max_in_flight:
+                    self._drain_one(in_flight, manifest, report)
+                try:
+                    task = index.add_documents_ndjson(b"".join(buffer), primary_key='id')
+                    in_flight.append(_PendingBatch(_task_field(task, 'task_uid'), buffer_files, buffer_docs))
+                    report.tasks += 1
+                except Exception as e:
+                    report.files_failed += len(buffer_files)
+                    report.errors.append(str(e))
+                    self.log(f"  ✗ Lỗi khi gửi batch {len(buffer_files)} file: {e}")
+            buffer, buffer_size, buffer_files, buffer_docs = [], 0, [], 0
+
+        rel_by_path = dict(pending_files)
+        window = self.workers * 4
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = deque()
+            file_iter = iter(pending_files)
+            exhausted = False
+            while futures or not exhausted:
+                while not exhausted and len(futures) < window:
+                    try:
+                        json_file, _ = next(file_iter)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    futures.append((json_file, executor.submit(parse_dataset_file, json_file, index_name, spans)))
+                if not futures:
+                    break
+
+                json_file, future = futures.popleft()
+                try:
+                    _, payload, doc_count, sha1 = future.result()
+                    stat = os.stat(json_file)
+                except Exception as e:
+                    report.files_failed += 1
+                    report.errors.append(f"{json_file}: {e}")
+                    self.log(f"  ✗ Lỗi khi đọc hoặc xử lý file {json_file}: {e}")
+                    continue
+
+                buffer.append(payload)
+                buffer_size += len(payload)
+                buffer_files.append((rel_by_path[json_file], {
+                    'sha1': sha1,
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime,
+                    'video_name': Path(json_file).stem,
+                    'documents': doc_count,
+                    'layout': layout
+                }))
+                buffer_docs += doc_count
+                if buffer_size >= self.batch_bytes:
+                    flush()
+
+                now = time.time()
+                if now - last_log >= 10:
+                    done_docs = report.documents
+                    self.log(
+                        f"  … {index_name}: {report.files_ok + report.files_failed}/{len(pending_files)} files, "
+                        f"{done_docs:,} docs ({done_docs / (now - start_time):,.0f} docs/s)"
+                    )
+                    last_log = now
+
+        flush()
+        while in_flight:
+            self._drain_one(in_flight, manifest, report)
+
+        report.elapsed = time.time() - start_time
+        return report
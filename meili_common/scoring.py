@@ -0,0 +1,383 @@
+"""
+Scorer dùng để re-rank hits trả về từ Meilisearch.
+
+Mỗi scorer tách làm hai bước:
+- ``text_score(text, query)``: chỉ phụ thuộc vào text, nên có thể cache theo text
+  (cùng một dòng OCR thường xuất hiện ở nhiều index / nhiều query mở rộng).
+- ``combine(text_score, hit)``: trộn với thông tin riêng của hit (vd. ``_rankingScore``).
+"""
+
+import heapq
+from typing import Any, Dict, List, Tuple
+
+try:
+    from rapidfuzz import fuzz
+except ImportError:
+    fuzz = None
+
+
+class HitScorer:
+    """
+    Interface cho scorer. Subclass override ``text_score`` và, nếu cần, ``combine``.
+    """
+    # Scorer cần Meilisearch trả về _rankingScore hay không
+    uses_ranking_score = False
+
+    def text_score(self, text: str, query: str) -> float:
+        raise NotImplementedError
+
+    def combine(self, text_score: float, hit: Dict[str, Any]) -> float:
+        return text_score
+
+    def score(self, text: str, query: str, hit: Dict[str, Any]) -> float:
+        return self.combine(self.text_score(text, query), hit)
+
+    def upper_bound(self, hit: Dict[str, Any]) -> float:
+        """
+        Điểm cao nhất hit có thể đạt (text_score tối đa là 1.0), dùng để bỏ qua
+        các hit không thể lọt vào top-size. ``combine`` phải đơn điệu theo text_score.
+        """
+        return self.combine(1.0, hit)
+
+
+class Score2Text:
+    def __init__(self, w_partial=1, w_ngrams=1, w_token=1):
+        if fuzz is None:
+            raise ImportError("rapidfuzz not installed. Run: pip install rapidfuzz")
+        self.w_partial = w_partial
+        self.w_ngrams = w_ngrams
+        self.w_token = w_token
+
+    def custom_partial_ratio(self, q_no_space, d_no_space):
+        len_q = len(q_no_space)
+        len_d = len(d_no_space)
+        if len_q == 0:
+            return 0
+        if len_q >= len_d:
+            return fuzz.ratio(q_no_space, d_no_space)/100
+        else:
+            return fuzz.partial_ratio(q_no_space, d_no_space)/100
+
+    @staticmethod
+    def generate_ngrams(tokens, n_values=(1,)):
+        results = {}
+        for n in n_values:
+            ngrams = [" ".join(tokens[i:i+n]) for i in range(len(tokens)-n+1)]
+            results[n] = ngrams
+        return results
+
+    def custom_ngrams_ratio(self, q_split, d_split):
+        len_q = len(q_split)
+        q = ' '.join(q_split)
+        if len_q == 0:
+            return 0
+        if len_q > 1:
+            n_values = (len_q - 1, len_q)
+        else:
+            n_values = (len_q, )
+        ngrams = self.generate_ngrams(d_split, n_values)
+        best = 0
+        for ngram in ngrams.values():
+            for text in ngram:
+                score = fuzz.ratio(q, text)
+                best = max(best, score)
+        return best/100
+
+    def custom_token_ratio(self, q, d):
+        return fuzz.token_set_ratio(q, d)/100
+
+    def w_score(self, q, d):
+        q_split = q.split()
+        d_split = d.split()
+        q_no_space = ''.join(q_split)
+        d_no_space = ''.join(d_split)
+        partial = self.custom_partial_ratio(q_no_space, d_no_space)
+        ngrams = self.custom_ngrams_ratio(q_split, d_split)
+        token = self.custom_token_ratio(q, d)
+        return (self.w_partial*partial + self.w_ngrams*ngrams + self.w_token*token)/(self.w_partial + self.w_ngrams + self.w_token)
+
+
+class FuzzyScorer(HitScorer):
+    """
+    Scorer của search server: khớp nguyên cụm = 1.0, còn lại dùng Score2Text (rapidfuzz).
+    """
+
+    def __init__(self, w_partial=1, w_ngrams=1, w_token=1):
+        self.scoring = Score2Text(w_partial, w_ngrams, w_token)
+
+    def text_score(self, text: str, query: str) -> float:
+        text_norm = ' '.join(text.lower().split())
+        if not query or not text_norm:
+            return 0.0
+        if query in text_norm:
+            return 1.0
+        return self.scoring.w_score(q=query, d=text_norm)
+
+
+class MatchQualityScorer(HitScorer):
+    """
+    Scorer của backend: điểm phân tầng theo chất lượng khớp (0-1),
+    lấy trung bình với _rankingScore của Meilisearch.
+    """
+    uses_ranking_score = True
+
+    def text_score(self, text: str, query: str) -> float:
+        return calculate_match_quality(text.lower().strip(), query.lower().strip())
+
+    def combine(self, text_score: float, hit: Dict[str, Any]) -> float:
+        # Meilisearch base score (0-1)
+        meili_score = hit.get('_rankingScore', 0.5)
+        # Final score: Average of custom score and Meilisearch score
+        return (text_score + meili_score) / 2.0
+
+
+def check_word_order(text: str, words: list) -> bool:
+    """
+    Fast check if words appear in the same order in text as in query
+    """
+    if not words:
+        return True
+
+    last_pos = -1
+    for word in words:
+        pos = text.find(word, last_pos + 1)
+        if pos == -1:
+            return False
+        last_pos = pos
+    return True
+
+
+def calculate_match_quality(text: str, query: str) -> float:
+    """
+    Calculate match quality with hierarchical scoring (normalized to 0-1):
+    1. Exact phrase match (1.0) - highest priority
+    2. All words present, correct order (0.8)
+    3. All words present, wrong order (0.6)
+    4. Substring/partial word matches (0.4-0.6)
+    5. Partial word match (0.2-0.4)
+    6. Poor match (0.0-0.2)
+    """
+    # Normalize whitespace
+    text = ' '.join(text.split())
+    query = ' '.join(query.split())
+
+    if not query or not text:
+        return 0.0
+
+    # 1. EXACT PHRASE MATCH (highest priority)
+    if query in text:
+        return 1.0
+
+    # Split into words for detailed analysis
+    query_words = query.split()
+    text_words = text.split()
+
+    if len(query_words) == 1:
+        # Single word query
+        single_word = query_words[0]
+        if single_word in text_words:
+            return 0.8  # Exact word match
+        elif any(single_word in word for word in text_words):
+            return 0.6  # Substring match in some word
+        else:
+            return 0.0  # Not found
+
+    # Multi-word query analysis
+    exact_words_found = []
+    substring_matches = []
+
+    for query_word in query_words:
+        # Check exact word match
+        if query_word in text_words:
+            exact_words_found.append(query_word)
+        else:
+            # Check substring matches
+            for text_word in text_words:
+                if query_word in text_word:
+                    substring_matches.append((query_word, text_word))
+                    break
+
+    exact_count = len(exact_words_found)
+    substring_count = len(substring_matches)
+    total_words = len(query_words)
+    total_found = exact_count + substring_count
+
+    # 2. ALL WORDS FOUND (exact or substring)
+    if total_found == total_words:
+        if exact_count == total_words:
+            # All exact matches - check order
+            if check_word_order(text, query_words):
+                return 0.8  # All words exact, correct order
+            else:
+                return 0.6  # All words exact, wrong order
+        else:
+            # Mix of exact and substring matches
+            exact_ratio = exact_count / total_words
+            if exact_ratio >= 0.5:  # Majority are exact matches
+                return 0.5 + (exact_ratio * 0.1)  # 0.55 to 0.6
+            else:
+                return 0.4 + (exact_ratio * 0.1)  # 0.4 to 0.45
+
+    # 3. PARTIAL MATCHES
+    elif total_found > 0:
+        match_ratio = total_found / total_words
+        exact_ratio = exact_count / total_words if total_words > 0 else 0
+
+        # Bonus for exact word matches
+        base_score = match_ratio * 0.4  # Base: 0-0.4 based on coverage
+        exact_bonus = exact_ratio * 0.1  # Extra 0-0.1 for exact matches
+
+        return min(0.5, base_score + exact_bonus)
+
+    # 4. CHECK FOR CONCATENATED MATCHES
+    # Handle "vet cay" → "vetcay" case
+    concatenated_query = ''.join(query_words)
+    for text_word in text_words:
+        if concatenated_query in text_word:
+            return 0.7  # High score for concatenated match
+        elif len(concatenated_query) > 3:  # Only for longer queries
+            # Check partial concatenated match
+            similarity = substring_similarity(concatenated_query, text_word, min_ratio=0.7)
+            if similarity > 0.7:  # 70% similarity threshold
+                return 0.3 + (similarity * 0.1)  # 0.37 to 0.4
+
+    # 5. NO SIGNIFICANT MATCHES
+    return 0.0
+
+
+def substring_similarity(query_concat: str, text_word: str, min_ratio: float = 0.0) -> float:
+    """
+    Calculate similarity between concatenated query and text word
+    Handles cases like "vetcay" vs "vetca" (missing chars)
+
+    Longest common substring bằng DP O(n*m) với hai hàng rolling. Nếu truyền
+    ``min_ratio`` thì dừng sớm khi chắc chắn không vượt được ngưỡng đó
+    (giá trị trả về khi ấy <= min_ratio, không nhất thiết chính xác).
+    """
+    if not query_concat or not text_word:
+        return 0.0
+
+    # Simple similarity: longest common substring ratio
+    longer = query_concat if len(query_concat) > len(text_word) else text_word
+    shorter = text_word if longer == query_concat else query_concat
+    len_longer = len(longer)
+    len_shorter = len(shorter)
+
+    if shorter in longer:
+        return len_shorter / len_longer
+
+    # Độ dài chuỗi con chung cần đạt để ratio > min_ratio
+    # (tính đúng như phép so sánh float của caller: needed / len_longer > min_ratio)
+    needed = max(1, int(min_ratio * len_longer))
+    while needed > 1 and (needed - 1) / len_longer > min_ratio:
+        needed -= 1
+    while needed / len_longer <= min_ratio:
+        needed += 1
+    if len_shorter < needed:
+        return 0.0
+
+    # Find longest common substring
+    max_length = 0
+    prev = [0] * (len_longer + 1)
+    for i, ch in enumerate(shorter):
+        cur = [0] * (len_longer + 1)
+        row_best = 0
+        for j, other in enumerate(longer, 1):
+            if ch == other:
+                run = prev[j - 1] + 1
+                cur[j] = run
+                if run > row_best:
+                    row_best = run
+        if row_best > max_length:
+            max_length = row_best
+        # Run dài nhất còn có thể đạt <= run dài nhất ở hàng này + số hàng còn lại
+        if max_length < needed and row_best + (len_shorter - i - 1) < needed:
+            return max_length / len_longer
+        prev = cur
+
+    return max_length / len_longer if max_length > 0 else 0.0
+
+
+def deduplicate_hits(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Gộp hits trùng (video_name, frame_index) giữa các index / query, giữ hit có
+    _rankingScore cao nhất (bằng điểm thì giữ hit xuất hiện trước), rồi sort giảm dần.
+    """
+    unique = {}
+    for hit in hits:
+        key = (hit.get('video_name', ''), hit.get('frame_index', 0))
+        existing = unique.get(key)
+        if existing is None or hit.get('_rankingScore', 0) > existing.get('_rankingScore', 0):
+            unique[key] = hit
+
+    deduplicated = list(unique.values())
+    deduplicated.sort(key=lambda x: x.get('_rankingScore', 0), reverse=True)
+    return deduplicated
+
+
+def rank_hits(
+    hits: List[Dict[str, Any]],
+    scorer: HitScorer,
+    query: str,
+    size: int
+) -> List[Dict[str, Any]]:
+    """
+    Chấm điểm, dedup và lấy top-size. Kết quả giống hệt việc chấm điểm tất cả hits
+    rồi ``deduplicate_hits(hits)[:size]``, nhưng duyệt hits theo upper_bound giảm dần
+    và dừng khi upper_bound < điểm thứ size hiện tại (hit đó không thể lọt vào top).
+    """
+    if size <= 0 or not hits:
+        return []
+
+    keys = [(hit.get('video_name', ''), hit.get('frame_index', 0)) for hit in hits]
+
+    bounds = [scorer.upper_bound(hit) for hit in hits]
+    order = sorted(range(len(hits)), key=bounds.__getitem__, reverse=True)
+
+    text_scores: Dict[str, float] = {}
+    best: Dict[Tuple[Any, Any], Tuple[float, int, Dict[str, Any]]] = {}
+    # Min-heap điểm tốt nhất của tối đa `size` key; entry cũ bị bỏ qua lười (lazy)
+    heap: List[Tuple[float, Tuple[Any, Any]]] = []
+    in_top: Dict[Tuple[Any, Any], bool] = {}
+    n_top = 0
+
+    def clean_top():
+        while heap and (not in_top.get(heap[0][1]) or best[heap[0][1]][0] != heap[0][0]):
+            heapq.heappop(heap)
+
+    for pos in order:
+        if n_top == size:
+            clean_top()
+            if bounds[pos] < heap[0][0]:
+                break
+
+        hit = hits[pos]
+        text = hit.get('text', '').strip()
+        text_score = text_scores.get(text)
+        if text_score is None:
+            text_score = scorer.text_score(text, query)
+            text_scores[text] = text_score
+        score = scorer.combine(text_score, hit)
+        hit['_rankingScore'] = score
+
+        key = keys[pos]
+        current = best.get(key)
+        if current is not None and (score < current[0] or (score == current[0] and pos > current[1])):
+            continue
+        best[key] = (score, pos, hit)
+        if current is not None and score == current[0]:
+            continue
+
+        heapq.heappush(heap, (score, key))
+        if not in_top.get(key):
+            in_top[key] = True
+            n_top += 1
+            if n_top > size:
+                clean_top()
+                _, evicted = heapq.heappop(heap)
+                in_top[evicted] = False
+                n_top -= 1
+
+    # Bằng điểm: hit tốt nhất của key xuất hiện trước thì đứng trước (như sort ổn định của cách cũ)
+    ranked = sorted(best.values(), key=lambda item: (-item[0], item[1]))
+    return [hit for _, _, hit in ranked[:size]]
@@ -0,0 +1,101 @@
+"""
+Micro-batching cho các lời gọi đồng thời (encode + FAISS search).
+
+Các thread gọi ``MicroBatcher.submit(items)`` trong cùng một cửa sổ ngắn (vài ms) được gom
+lại thành một lần gọi ``fn(all_items)``; kết quả được chia lại cho từng caller theo đúng
+thứ tự. Caller đầu tiên của batch là "leader": chờ hết cửa sổ (hoặc tới khi batch đầy)
+rồi tự chạy ``fn`` trên thread của mình, các caller khác chỉ chờ kết quả. Không cần
+thread nền, và span của ``fn`` nằm trong trace của leader.
+"""
+
+import threading
+from typing import Any, Callable, List, Optional
+
+from tracing import span
+
+
+class _Batch:
+    __slots__ = ('items', 'full', 'done', 'results', 'error')
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results: Optional[List[Any]] = None
+        self.error: Optional[BaseException] = None
+
+
+class MicroBatcher:
+    """
+    Args:
+        fn: Hàm xử lý cả batch, nhận list items và trả về list kết quả cùng độ dài.
+        window_ms: Thời gian tối đa leader chờ thêm caller. <= 0 thì gọi thẳng ``fn``.
+        max_batch_size: Batch đủ số item này thì chạy ngay, không chờ hết cửa sổ.
+        name: Tiền tố tên span (``<name>.window``, ``<name>.wait``).
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], List[Any]],
+        window_ms: float = 2.0,
+        max_batch_size: int = 32,
+        name: str = 'microbatch'
+    ):
+        self.fn = fn
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.name = name
+        self._lock = threading.Lock()
+        self._pending: Optional[_Batch] = None
+        # Thống kê đơn giản cho /health và benchmark
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, items: List[Any]) -> List[Any]:
+        if self.window <= 0 or not items:
+            return self.fn(items)
+
+        with self._lock:
+            batch = self._pending
+            if batch is not None and len(batch.items) + len(items) > self.max_batch_size:
+                # Không đủ chỗ: đóng batch hiện tại cho leader chạy ngay, mở batch mới
+                batch.full.set()
+                self._pending = batch = None
+            is_leader = batch is None
+            if is_leader:
+                batch = self._pending = _Batch()
+            offset = len(batch.items)
+            batch.items.extend(items)
+            if len(batch.items) >= self.max_batch_size:
+                batch.full.set()
+                self._pending = None
+
+        if is_leader:
+            with span(f"{self.name}.window"):
+                batch.full.wait(self.window)
+            with self._lock:
+                if self._pending is batch:
+                    self._pending = None
+                self.batches += 1
+                self.items += len(batch.items)
+            try:
+                batch.results = self.fn(batch.items)
+            except BaseException as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        else:
+            with span(f"{self.name}.wait"):
+                batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[offset:offset + len(items)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+            }
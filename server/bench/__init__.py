@@ -0,0 +1,10 @@
+"""
+Benchmark harness cho search server, chạy được trên máy chỉ có CPU, không cần Meilisearch.
+
+- ``bench.corpus``: sinh corpus tổng hợp (embeddings, segment JSON, OCR/subtitle JSON, query log)
+- ``bench.stubs``: embedder giả (vector ngẫu nhiên chuẩn hoá) và Meilisearch giả trong bộ nhớ
+- ``bench.run``: đo FAISS search, Reranker, fusion và temporal_search
+
+Chạy từ thư mục ``server/``:
+    python -m bench.run --videos 200 --frames 300 --queries 200 --concurrency 4
+"""
@@ -0,0 +1,120 @@
+"""
+Sinh corpus tổng hợp cho benchmark:
+
+    <out>/embeddings_<model>.pkl      {'paths', 'embeddings', 'length'} như file embedding thật
+    <out>/segments/segments_<video>.json
+    <out>/ocr/<video>.json            {frame_index: text}
+    <out>/subtitle/<video>.json       {frame_index: text} (các frame liền nhau chung một câu)
+    <out>/queries.jsonl               query log: {"stages": [...], "k", "temporal_time"}
+"""
+
+import json
+import pickle
+import random
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+
+FRAME_STEP = 25  # keyframe mỗi ~1s ở 25-30 FPS
+
+_WORDS = (
+    "viet nam ha noi thanh pho ho chi minh tin tuc thoi su chinh phu quoc hoi kinh te "
+    "giao thong cong an nguoi dan bao lu mien trung canh sat benh vien truong hoc the thao "
+    "bong da thoi tiet mua lon sat lo cuu ho nong nghiep xuat khau doanh nghiep ngan hang "
+    "gia vang truc tiep phong su le hoi van hoa du lich"
+).split()
+
+_SCENES = (
+    "a man talking in a news studio", "a crowd of people on the street", "a flooded road",
+    "a football match in a stadium", "a firefighter spraying water", "a map with weather forecast",
+    "a woman holding a microphone", "cars in a traffic jam", "a farmer in a rice field",
+    "a boat on the river", "a building on fire", "children in a classroom",
+)
+
+
+def video_names(n_videos: int) -> List[str]:
+    return [f"K{(i // 30) + 1:02d}_V{(i % 30) + 1:03d}" for i in range(n_videos)]
+
+
+def random_text(rng: random.Random, low: int = 3, high: int = 12) -> str:
+    return ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(low, high)))
+
+
+def generate_corpus(
+    out_dir: str,
+    n_videos: int = 100,
+    n_frames: int = 300,
+    model_dims: Dict[str, int] = None,
+    n_queries: int = 200,
+    max_stages: int = 3,
+    seed: int = 0
+) -> Path:
+    """
+    Args:
+        n_videos: Số video
+        n_frames: Số keyframe mỗi video
+        model_dims: {model_name: embedding_dim}
+        n_queries: Số query trong query log
+    """
+    model_dims = model_dims or {'bench-model-a': 512}
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    out = Path(out_dir)
+    (out / 'segments').mkdir(parents=True, exist_ok=True)
+    (out / 'ocr').mkdir(parents=True, exist_ok=True)
+    (out / 'subtitle').mkdir(parents=True, exist_ok=True)
+
+    videos = video_names(n_videos)
+    paths = []
+    for video in videos:
+        frames = [i * FRAME_STEP for i in range(n_frames)]
+        paths.extend(f"{video}/{frame}.jpg" for frame in frames)
+        last_frame = frames[-1] + FRAME_STEP - 1
+
+        # Segment (shot) dài 2-10 giây
+        segments = []
+        start = 0
+        while start <= last_frame:
+            end = min(last_frame, start + rng.randint(50, 250))
+            segments.append({'start': start, 'end': end})
+            start = end + 1
+        with open(out / 'segments' / f"segments_{video}.json", 'w') as f:
+            json.dump(segments, f)
+
+        # OCR: khoảng 60% frame có chữ
+        ocr = {str(frame): random_text(rng) for frame in frames if rng.random() < 0.6}
+        with open(out / 'ocr' / f"{video}.json", 'w', encoding='utf-8') as f:
+            json.dump(ocr, f, ensure_ascii=False)
+
+        # Subtitle: mỗi câu kéo dài 2-6 keyframe
+        subtitle = {}
+        i = 0
+        while i < len(frames):
+            line, span = random_text(rng, 5, 15), rng.randint(2, 6)
+            for frame in frames[i:i + span]:
+                subtitle[str(frame)] = line
+            i += span + rng.randint(0, 3)
+        with open(out / 'subtitle' / f"{video}.json", 'w', encoding='utf-8') as f:
+            json.dump(subtitle, f, ensure_ascii=False)
+
+    for model_name, dim in model_dims.items():
+        embeddings = np_rng.standard_normal((len(paths), dim), dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        with open(out / f"embeddings_{model_name}.pkl", 'wb') as f:
+            pickle.dump({'paths': paths, 'embeddings': embeddings, 'length': len(paths)}, f, protocol=4)
+
+    with open(out / 'queries.jsonl', 'w', encoding='utf-8') as f:
+        for _ in range(n_queries):
+            stages = []
+            for _ in range(rng.randint(1, max_stages)):
+                stage = {'text': rng.choice(_SCENES)}
+                if rng.random() < 0.4:
+                    stage['ocr'] = random_text(rng, 1, 3)
+                if rng.random() < 0.2:
+                    stage['subtitle'] = random_text(rng, 2, 4)
+                stages.append(stage)
+            f.write(json.dumps({'stages': stages, 'k': 100, 'temporal_time': 10}, ensure_ascii=False) + "\n")
+
+    return out
@@ -0,0 +1,276 @@
+"""
+Replay query log của /search (xem query_log.py) lên một build/cấu hình ứng viên và so sánh
+với kết quả đã ghi trong log, hoặc với một server baseline đang chạy song song.
+
+So sánh theo từng query:
+- latency (ms) phía server (header ``Server-Timing: app;dur=...`` của /search, cùng cách đo với
+  ``latency_ms`` trong log) của candidate so với baseline; round trip phía client (gồm upload
+  multipart + mạng) chỉ so khi có ``--baseline-url`` (log không có số này),
+- Jaccard@k trên id chain (``video/frame_đầu-frame_cuối``) và trên tập frame trả về,
+- tương quan thứ hạng (Spearman, Kendall tau) trên các chain có ở cả hai bên.
+
+Chạy từ thư mục ``server/``:
+    python -m bench.replay --log /app/outputs/query-log/queries.jsonl --url http://candidate:8000
+    python -m bench.replay --log queries.jsonl --url http://candidate:8000 --baseline-url http://prod:8000 \\
+        --weights '{"text": 0.4, "ocr": 0.3, "image": 0.1, "subtitle": 0.2}' --json-out replay.json
+"""
+
+import argparse
+import json
+import statistics
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from query_log import iter_log, load_image, result_frames, result_ids
+
+from bench.run import percentile
+
+
+def jaccard(a: List[str], b: List[str]) -> float:
+    set_a, set_b = set(a), set(b)
+    if not set_a and not set_b:
+        return 1.0
+    return len(set_a & set_b) / len(set_a | set_b)
+
+
+def _common_ranks(a: List[str], b: List[str]) -> Tuple[List[int], List[int]]:
+    rank_b = {}
+    for i, item in enumerate(b):
+        rank_b.setdefault(item, i)
+    seen = set()
+    ranks_a, ranks_b = [], []
+    for i, item in enumerate(a):
+        if item in rank_b and item not in seen:
+            seen.add(item)
+            ranks_a.append(i)
+            ranks_b.append(rank_b[item])
+    return ranks_a, ranks_b
+
+
+def _rerank(values: List[int]) -> List[int]:
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ranks = [0] * len(values)
+    for r, i in enumerate(order):
+        ranks[i] = r
+    return ranks
+
+
+def spearman(a: List[str], b: List[str]) -> Optional[float]:
+    """Spearman rho trên các phần tử chung (xếp hạng lại trong tập chung). None nếu < 2 phần tử."""
+    ranks_a, ranks_b = _common_ranks(a, b)
+    n = len(ranks_a)
+    if n < 2:
+        return None
+    ranks_a, ranks_b = _rerank(ranks_a), _rerank(ranks_b)
+    d2 = sum((x - y) ** 2 for x, y in zip(ranks_a, ranks_b))
+    return 1.0 - 6.0 * d2 / (n * (n * n - 1))
+
+
+def kendall_tau(a: List[str], b: List[str]) -> Optional[float]:
+    """Kendall tau-a trên các phần tử chung (không có hạng trùng). None nếu < 2 phần tử."""
+    ranks_a, ranks_b = _common_ranks(a, b)
+    n = len(ranks_a)
+    if n < 2:
+        return None
+    concordant = discordant = 0
+    for i in range(n):
+        for j in range(i + 1, n):
+            s = (ranks_a[i] - ranks_a[j]) * (ranks_b[i] - ranks_b[j])
+            if s > 0:
+                concordant += 1
+            elif s < 0:
+                discordant += 1
+    return (concordant - discordant) / (n * (n - 1) / 2)
+
+
+def build_request(
+    entry: Dict[str, Any],
+    log_path: str,
+    weights: Optional[Dict[str, float]] = None,
+    vector_models_config: Optional[List[Dict[str, Any]]] = None,
+    k: Optional[int] = None
+) -> Optional[Tuple[Dict[str, str], List[Tuple[str, Tuple[str, bytes, str]]]]]:
+    """Dựng lại form-data của /search từ một dòng log. None nếu thiếu ảnh đã lưu."""
+    structure, files = [], []
+    for i, stage in enumerate(entry['stages']):
+        stage_data = {key: value for key, value in stage.items() if key not in ('image_sha256', 'image_sha1')}
+        # image_sha1: log ghi trước khi dùng chung SHA-256 với image cache
+        digest = stage.get('image_sha256') or stage.get('image_sha1')
+        if digest:
+            data = load_image(log_path, digest)
+            if data is None:
+                return None
+            filename = f"{digest}.jpg"
+            stage_data['image_ref'] = filename
+            files.append(('image_files', (filename, data, 'application/octet-stream')))
+        structure.append(stage_data)
+
+    form = {
+        'queries_structure': json.dumps(structure, ensure_ascii=False),
+        'k': str(k or entry.get('k', 10)),
+        'temporal_time': str(entry.get('temporal_time', 10)),
+    }
+    weights = weights if weights is not None else entry.get('weights')
+    models = vector_models_config if vector_models_config is not None else entry.get('vector_models_config')
+    if weights:
+        form['weights'] = json.dumps(weights)
+    if models:
+        form['vector_models_config'] = json.dumps(models)
+    return form, files
+
+
+def server_timing_ms(header: Optional[str], metric: str = 'app') -> Optional[float]:
+    """``dur`` của ``metric`` trong header Server-Timing (None nếu server không gửi)."""
+    for entry in (header or '').split(','):
+        name, *params = [part.strip() for part in entry.split(';')]
+        if name != metric:
+            continue
+        for param in params:
+            key, _, value = param.partition('=')
+            if key == 'dur':
+                try:
+                    return float(value)
+                except ValueError:
+                    return None
+    return None
+
+
+def issue(session: requests.Session, url: str, form, files, timeout: float) -> Dict[str, Any]:
+    start = time.perf_counter()
+    response = session.post(f"{url.rstrip('/')}/search", data=form, files=files or None, timeout=timeout)
+    latency_ms = (time.perf_counter() - start) * 1000
+    response.raise_for_status()
+    results = response.json().get('results', [])
+    return {
+        'latency_ms': latency_ms,
+        'server_ms': server_timing_ms(response.headers.get('Server-Timing')),
+        'result_ids': result_ids(results),
+        'result_frames': result_frames(results),
+    }
+
+
+def logged_baseline(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Baseline từ một dòng log: ``latency_ms`` trong log là thời gian xử lý phía server."""
+    return {
+        'latency_ms': None,
+        'server_ms': entry.get('latency_ms'),
+        'result_ids': entry.get('result_ids', []),
+        'result_frames': entry.get('result_frames', []),
+    }
+
+
+def _delta(candidate: Optional[float], baseline: Optional[float]) -> Optional[float]:
+    if candidate is None or baseline is None:
+        return None
+    return candidate - baseline
+
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any], k: int) -> Dict[str, Any]:
+    base_ids, cand_ids = baseline['result_ids'][:k], candidate['result_ids'][:k]
+    return {
+        # Round trip phía client (None với baseline từ log)
+        'baseline_ms': baseline.get('latency_ms'),
+        'candidate_ms': candidate.get('latency_ms'),
+        'baseline_server_ms': baseline.get('server_ms'),
+        'candidate_server_ms': candidate.get('server_ms'),
+        'jaccard_at_k': jaccard(base_ids, cand_ids),
+        'frame_jaccard': jaccard(baseline.get('result_frames', []), candidate.get('result_frames', [])),
+        'spearman': spearman(base_ids, cand_ids),
+        'kendall_tau': kendall_tau(base_ids, cand_ids),
+    }
+
+
+def _summary(values: List[Optional[float]]) -> Dict[str, Optional[float]]:
+    values = [v for v in values if v is not None]
+    if not values:
+        return {'n': 0, 'mean': None, 'p50': None, 'p95': None, 'p99': None}
+    return {
+        'n': len(values),
+        'mean': statistics.mean(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--log', required=True, help='Đường dẫn query log (QUERY_LOG_PATH)')
+    parser.add_argument('--url', required=True, help='Server ứng viên, ví dụ http://localhost:8000')
+    parser.add_argument('--baseline-url', default=None,
+                        help='Server baseline; mặc định so với kết quả + latency phía server đã ghi trong log')
+    parser.add_argument('--limit', type=int, default=None, help='Số query tối đa')
+    parser.add_argument('--k', type=int, default=None, help='Ghi đè k của request (mặc định lấy từ log)')
+    parser.add_argument('--weights', default=None, help='Ghi đè weights (JSON) cho server ứng viên')
+    parser.add_argument('--vector-models-config', default=None,
+                        help='Ghi đè vector_models_config (JSON) cho server ứng viên')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--json-out', default=None, help='Ghi kết quả từng query và tổng hợp ra file JSON')
+    args = parser.parse_args()
+
+    weights = json.loads(args.weights) if args.weights else None
+    models = json.loads(args.vector_models_config) if args.vector_models_config else None
+    session = requests.Session()
+    rows, skipped, failed = [], 0, 0
+
+    for n, entry in enumerate(iter_log(args.log)):
+        if args.limit and n >= args.limit:
+            break
+        baseline_req = build_request(entry, args.log, k=args.k)
+        candidate_req = build_request(entry, args.log, weights, models, args.k)
+        if candidate_req is None:
+            skipped += 1  # log không lưu ảnh (QUERY_LOG_STORE_IMAGES=false)
+            continue
+        k = args.k or entry.get('k', 10)
+        try:
+            if args.baseline_url:
+                baseline = issue(session, args.baseline_url, *baseline_req, timeout=args.timeout)
+            else:
+                baseline = logged_baseline(entry)
+            candidate = issue(session, args.url, *candidate_req, timeout=args.timeout)
+        except requests.RequestException as e:
+            failed += 1
+            print(f"⚠️ Query {n} lỗi: {e}")
+            continue
+        row = compare(baseline, candidate, k)
+        row['index'] = n
+        rows.append(row)
+
+    report = {
+        'queries': len(rows),
+        'skipped_missing_images': skipped,
+        'failed': failed,
+        'baseline_ms': _summary([r['baseline_ms'] for r in rows]),
+        'candidate_ms': _summary([r['candidate_ms'] for r in rows]),
+        'latency_delta_ms': _summary([_delta(r['candidate_ms'], r['baseline_ms']) for r in rows]),
+        'baseline_server_ms': _summary([r['baseline_server_ms'] for r in rows]),
+        'candidate_server_ms': _summary([r['candidate_server_ms'] for r in rows]),
+        'server_delta_ms': _summary([_delta(r['candidate_server_ms'], r['baseline_server_ms']) for r in rows]),
+        'jaccard_at_k': _summary([r['jaccard_at_k'] for r in rows]),
+        'frame_jaccard': _summary([r['frame_jaccard'] for r in rows]),
+        'spearman': _summary([r['spearman'] for r in rows]),
+        'kendall_tau': _summary([r['kendall_tau'] for r in rows]),
+    }
+
+    print(f"{report['queries']} queries replayed ({skipped} skipped: thiếu ảnh, {failed} lỗi)")
+    if rows and not report['server_delta_ms']['n']:
+        print("  ⚠️ Không so được latency phía server (server không gửi header Server-Timing)")
+    for name in ('baseline_server_ms', 'candidate_server_ms', 'server_delta_ms',
+                 'baseline_ms', 'candidate_ms', 'latency_delta_ms'):
+        s = report[name]
+        if s['n']:
+            print(f"  {name:<19} mean {s['mean']:.2f}  p50 {s['p50']:.2f}  p95 {s['p95']:.2f}  p99 {s['p99']:.2f}")
+    for name in ('jaccard_at_k', 'frame_jaccard', 'spearman', 'kendall_tau'):
+        s = report[name]
+        if s['n']:
+            print(f"  {name:<19} mean {s['mean']:.3f}  p50 {s['p50']:.3f}  (n={s['n']})")
+
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'summary': report, 'queries': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
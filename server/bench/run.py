@@ -0,0 +1,244 @@
+"""
+Benchmark FAISSSearchEngine, Reranker, _fuse_and_rerank_candidates và temporal_search
+trên corpus tổng hợp, với embedder giả và Meilisearch giả (CPU-only).
+
+Chạy từ thư mục ``server/``:
+    python -m bench.run --videos 200 --frames 300 --queries 200 --concurrency 4
+    python -m bench.run --models 2 --dim 1024 --index-type IVF --encode-ms 8 --tracemalloc
+"""
+
+import argparse
+import json
+import resource
+import statistics
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from faiss_engine import FAISSSearchEngine
+from search_engine import SearchEngine
+from tracing import METRICS
+
+from bench.corpus import generate_corpus
+from bench.stubs import StubEmbedder, StubMeiliService
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def max_rss_mb() -> float:
+    # Linux: ru_maxrss tính bằng KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_phase(
+    name: str,
+    fn: Callable[[Any], Any],
+    items: List[Any],
+    concurrency: int = 1,
+    use_tracemalloc: bool = False
+) -> Dict[str, Any]:
+    """Chạy ``fn`` trên từng item với ``concurrency`` thread, trả về thống kê latency/bộ nhớ."""
+    latencies = []
+
+    def timed(item):
+        start = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - start)
+
+    if use_tracemalloc:
+        tracemalloc.start()
+    wall_start = time.perf_counter()
+    if concurrency <= 1:
+        for item in items:
+            timed(item)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(timed, items))
+    wall = time.perf_counter() - wall_start
+    peak_alloc = None
+    if use_tracemalloc:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_alloc = peak / (1024 * 1024)
+
+    ms = [t * 1000 for t in latencies]
+    stats = {
+        'phase': name,
+        'n': len(ms),
+        'concurrency': concurrency,
+        'mean_ms': statistics.mean(ms) if ms else 0.0,
+        'p50_ms': percentile(ms, 50),
+        'p95_ms': percentile(ms, 95),
+        'p99_ms': percentile(ms, 99),
+        'qps': len(ms) / wall if wall > 0 else 0.0,
+        'max_rss_mb': max_rss_mb(),
+        'peak_alloc_mb': peak_alloc,
+    }
+    alloc = f"  peak alloc {peak_alloc:.1f} MB" if peak_alloc is not None else ""
+    print(f"[{name}] n={stats['n']} c={concurrency}  mean {stats['mean_ms']:.2f} ms  p50 {stats['p50_ms']:.2f}  "
+          f"p95 {stats['p95_ms']:.2f}  p99 {stats['p99_ms']:.2f}  {stats['qps']:.1f} q/s  "
+          f"max RSS {stats['max_rss_mb']:.0f} MB{alloc}")
+    return stats
+
+
+def load_query_log(path: Path, limit: int = None) -> List[Dict[str, Any]]:
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+            if limit and len(entries) >= limit:
+                break
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # Mặc định nằm ngoài working tree (corpus khá lớn), vẫn dùng lại giữa các lần chạy
+    parser.add_argument('--out', default=str(Path(tempfile.gettempdir()) / 'bench-corpus'),
+                        help='Thư mục corpus tổng hợp (mặc định <tmp>/bench-corpus)')
+    parser.add_argument('--regen', action='store_true', help='Sinh lại corpus dù đã tồn tại')
+    parser.add_argument('--videos', type=int, default=100)
+    parser.add_argument('--frames', type=int, default=300, help='Số keyframe mỗi video')
+    parser.add_argument('--models', type=int, default=2, help='Số model vector')
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--index-type', choices=['Flat', 'IVF'], default='Flat')
+    parser.add_argument('--nlist', type=int, default=256)
+    parser.add_argument('--nprobe', type=int, default=16)
+    parser.add_argument('--encode-ms', type=float, default=0.0, help='Giả lập thời gian encoder mỗi batch')
+    parser.add_argument('--queries', type=int, default=100, help='Số query sinh ra trong query log')
+    parser.add_argument('--query-log', default=None, help='Replay query log JSONL có sẵn thay vì log tổng hợp')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--microbatch-ms', type=float, default=0.0,
+                        help='Cửa sổ micro-batching encode + FAISS (0 = tắt), nên dùng với --concurrency > 1')
+    parser.add_argument('--microbatch-size', type=int, default=32)
+    parser.add_argument('--mmap', action='store_true',
+                        help='Lưu index + path table rồi load lại bằng mmap (INDEX_MMAP) như khi chạy nhiều worker')
+    parser.add_argument('--k', type=int, default=100)
+    parser.add_argument('--initial-k', type=int, default=2048, help='initial_search_k của temporal_search')
+    parser.add_argument('--phases', default='faiss,rerank,fusion,temporal')
+    parser.add_argument('--tracemalloc', action='store_true', help='Đo peak allocation (chậm hơn)')
+    parser.add_argument('--json-out', default=None, help='Ghi kết quả ra file JSON')
+    parser.add_argument('--metrics-out', default=None, help='Ghi histogram span (Prometheus text) ra file')
+    args = parser.parse_args()
+
+    model_dims = {f"bench-model-{chr(ord('a') + i)}": args.dim for i in range(args.models)}
+    out = Path(args.out)
+    if args.regen or not (out / 'queries.jsonl').exists():
+        print(f"🔄 Generating corpus: {args.videos} videos x {args.frames} frames, {args.models} model(s) d={args.dim}")
+        start = time.perf_counter()
+        generate_corpus(str(out), args.videos, args.frames, model_dims, n_queries=args.queries)
+        print(f"✅ Corpus ready in {time.perf_counter() - start:.1f}s at {out}")
+
+    configs = [{
+        'model_name': model_name,
+        'embedder': StubEmbedder(dim, model_name, encode_ms=args.encode_ms),
+        'embedding_path': str(out / f"embeddings_{model_name}.pkl"),
+        'index_type': args.index_type,
+        'nlist': args.nlist,
+        'nprobe': args.nprobe,
+        'use_gpu': False,
+        'input_index_path': str(out / f"index_{model_name}_{args.index_type}"),
+        'output_index_path': str(out / f"index_{model_name}_{args.index_type}"),
+    } for model_name, dim in model_dims.items()]
+
+    start = time.perf_counter()
+    vector_engine = FAISSSearchEngine(
+        list_faiss_configs=configs,
+        microbatch_window_ms=args.microbatch_ms,
+        microbatch_max_size=args.microbatch_size,
+        mmap=args.mmap
+    )
+    if args.mmap:
+        if args.regen or not all((Path(cfg['input_index_path']) / 'faiss_index.bin').exists() for cfg in configs):
+            vector_engine.build_all_indexes()
+            vector_engine.save_all_indexes()
+            vector_engine = FAISSSearchEngine(
+                list_faiss_configs=configs,
+                microbatch_window_ms=args.microbatch_ms,
+                microbatch_max_size=args.microbatch_size,
+                mmap=True
+            )
+        vector_engine.load_all_indexes()
+    else:
+        vector_engine.build_all_indexes()
+    meili = StubMeiliService(str(out / 'ocr'), str(out / 'subtitle'))
+    engine = SearchEngine(vector_engine=vector_engine, ocr_engine=meili, segments_dir=str(out / 'segments'))
+    engine.preload_all_segments()
+    print(f"✅ Engines ready in {time.perf_counter() - start:.1f}s (max RSS {max_rss_mb():.0f} MB)")
+
+    log = load_query_log(Path(args.query_log) if args.query_log else out / 'queries.jsonl', args.queries)
+    models_config = [{'model_name': name, 'weight': 1.0 / len(model_dims)} for name in model_dims]
+    first_texts = [entry['stages'][0].get('text') or 'placeholder' for entry in log]
+    phases = set(args.phases.split(','))
+    results = []
+
+    if 'faiss' in phases:
+        results.append(run_phase(
+            'faiss.search', lambda text: vector_engine.search([text], models_config, args.initial_k),
+            first_texts, args.concurrency, args.tracemalloc
+        ))
+
+    if 'rerank' in phases:
+        per_query = [
+            [vector_engine._search_single_model(name, [text], args.initial_k) for name in model_dims]
+            for text in first_texts
+        ]
+        results.append(run_phase(
+            'reranker', lambda batch: vector_engine.reranker(list_batch_result=batch, top_k=args.initial_k),
+            per_query, 1, args.tracemalloc
+        ))
+
+    if 'fusion' in phases:
+        weights = {'text': 0.3, 'ocr': 0.3, 'image': 0.1, 'subtitle': 0.3}
+        raw = []
+        for entry in log:
+            stage = entry['stages'][0]
+            raw.append((
+                vector_engine.search([stage.get('text') or 'placeholder'], models_config, args.initial_k)[0],
+                meili.search_ocr(stage['ocr'], 1024) if stage.get('ocr') else [],
+                meili.search_subscript(stage['subtitle'], 1024) if stage.get('subtitle') else [],
+            ))
+        results.append(run_phase(
+            'fusion', lambda r: engine._fuse_and_rerank_candidates(r[0], [], r[1], r[2], weights),
+            raw, 1, args.tracemalloc
+        ))
+
+    if 'temporal' in phases:
+        results.append(run_phase(
+            'temporal_search',
+            lambda entry: engine.temporal_search(
+                queries=entry['stages'],
+                k=entry.get('k', args.k),
+                time_distance=entry.get('temporal_time', 10),
+                initial_search_k=args.initial_k,
+                weights=entry.get('weights'),
+                vector_models_config=entry.get('vector_models_config') or models_config,
+                format='shot'
+            ),
+            log, args.concurrency, args.tracemalloc
+        ))
+
+    if args.microbatch_ms > 0:
+        for key, stats in vector_engine.microbatch_stats().items():
+            print(f"[microbatch {key}] {stats['batches']} batches, mean size {stats['mean_batch_size']:.2f}")
+
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results, 'microbatch': vector_engine.microbatch_stats()}, f, indent=2)
+    if args.metrics_out:
+        with open(args.metrics_out, 'w', encoding='utf-8') as f:
+            f.write(METRICS.render_prometheus())
+
+
+if __name__ == '__main__':
+    main()
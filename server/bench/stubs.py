@@ -0,0 +1,109 @@
+"""
+Stub thay cho CLIPEmbedder và MeiliSearchService khi benchmark trên CPU.
+"""
+
+import json
+import sys
+import threading
+import time
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# meili_common nằm ở thư mục gốc của repo
+_REPO_ROOT = str(Path(__file__).resolve().parent.parent.parent)
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
+
+from meili_common.scoring import MatchQualityScorer, rank_hits
+from meili_common.text import expansion_query, remove_vietnamese_accents
+
+
+class StubEmbedder:
+    """
+    Cùng interface với CLIPEmbedder.encode_batch: trả về vector chuẩn hoá, xác định
+    theo nội dung query (cùng query -> cùng vector). ``encode_ms`` giả lập thời gian
+    forward của encoder cho mỗi batch; các forward chạy tuần tự như trên một GPU.
+    """
+
+    def __init__(self, dim: int = 512, model_name: str = 'bench-model', encode_ms: float = 0.0):
+        self.dim = dim
+        self.model_name = model_name
+        self.encode_ms = encode_ms
+        # faiss_engine chỉ đọc device.type / device.index
+        self.device = SimpleNamespace(type='cpu', index=None)
+        self._device_lock = threading.Lock()
+
+    def _seed(self, query: Any) -> int:
+        if isinstance(query, str):
+            data = query.encode('utf-8')
+        elif hasattr(query, 'tobytes'):
+            data = query.tobytes()
+        else:
+            data = repr(query).encode('utf-8')
+        return zlib.crc32(data) ^ zlib.crc32(self.model_name.encode('utf-8'))
+
+    def encode_batch(self, queries: List[Any]) -> np.ndarray:
+        if self.encode_ms > 0:
+            with self._device_lock:
+                time.sleep(self.encode_ms / 1000.0)
+        result = np.empty((len(queries), self.dim), dtype=np.float32)
+        for i, query in enumerate(queries):
+            vector = np.random.default_rng(self._seed(query)).standard_normal(self.dim).astype(np.float32)
+            result[i] = vector / np.linalg.norm(vector)
+        return result
+
+
+class StubMeiliService:
+    """
+    Meilisearch giả trong bộ nhớ: inverted index theo từ, điểm "meili" = tỉ lệ từ của
+    query có trong text, sau đó re-rank + dedup bằng code dùng chung (meili_common).
+    Trả về hits cùng dạng với MeiliSearchService.search_ocr / search_subscript.
+    """
+
+    def __init__(self, ocr_dir: str, subtitle_dir: str = None, limit_search: int = 500):
+        self.limit_search = limit_search
+        self.scorer = MatchQualityScorer()
+        self.ocr_docs, self.ocr_postings = self._load(ocr_dir)
+        self.subtitle_docs, self.subtitle_postings = self._load(subtitle_dir) if subtitle_dir else ([], {})
+
+    @staticmethod
+    def _load(data_dir: str) -> Tuple[List[Dict[str, Any]], Dict[str, List[int]]]:
+        docs = []
+        postings = defaultdict(list)
+        for json_file in sorted(Path(data_dir).glob('*.json')):
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for frame_index, text in data.items():
+                doc_id = len(docs)
+                docs.append({'video_name': json_file.stem, 'frame_index': int(frame_index), 'text': text})
+                for word in set(text.lower().split()):
+                    postings[word].append(doc_id)
+        return docs, dict(postings)
+
+    def _search(self, docs, postings, queries: List[str], size: int) -> List[Dict[str, Any]]:
+        hits = []
+        for q in queries:
+            words = q.split()
+            if not words:
+                continue
+            matched = defaultdict(int)
+            for word in set(words):
+                for doc_id in postings.get(word, ()):
+                    matched[doc_id] += 1
+            top = sorted(matched.items(), key=lambda item: item[1], reverse=True)[:self.limit_search]
+            for doc_id, count in top:
+                hits.append({**docs[doc_id], '_rankingScore': count / len(set(words))})
+        return rank_hits(hits, self.scorer, queries[0], size) if hits else []
+
+    def search_ocr(self, query: str, size: int = 1000) -> List[Dict[str, Any]]:
+        queries = [remove_vietnamese_accents(q).lower() for q in expansion_query(query)]
+        return self._search(self.ocr_docs, self.ocr_postings, queries, size)
+
+    def search_subscript(self, query: str, size: int = 1000) -> List[Dict[str, Any]]:
+        queries = [q.lower() for q in expansion_query(query)]
+        return self._search(self.subtitle_docs, self.subtitle_postings, queries, size)
@@ -12,6 +12,7 @@ class Settings(BaseSettings):
     meilisearch_port: str = Field(default="7700", env="MEILISEARCH_PORT")
     meilisearch_api_key: str = Field(default="meilisearch-api-key", env="MEILISEARCH_API_KEY")
     meilisearch_limit_search: int = Field(default=500, env="MEILISEARCH_LIMIT_SEARCH")
+    meilisearch_state_dir: str = Field(default="/app/outputs/meili-state", env="MEILISEARCH_STATE_DIR")
     
     # Dataset Paths
     ocr_datasets: str = Field(default="", env="OCR_DATASETS")
@@ -49,11 +50,34 @@ class Settings(BaseSettings):
     api_host: str = Field(default="0.0.0.0", env="API_HOST")
     api_port: int = Field(default=8000, env="API_PORT")
     api_workers: int = Field(default=1, env="API_WORKERS")
+
+    # Multi-worker: map index + path table từ file để các worker dùng chung page cache,
+    # và (tuỳ chọn) encoder chạy ở một process riêng (encoder_server.py)
+    index_mmap: bool = Field(default=False, env="INDEX_MMAP")
+    encoder_url: str = Field(default="", env="ENCODER_URL")
+    encoder_timeout: float = Field(default=30.0, env="ENCODER_TIMEOUT")
+
+    # Hot reload index + segment caches (POST /admin/reload). ADMIN_TOKEN rỗng = tắt mọi endpoint /admin
+    admin_token: str = Field(default="", env="ADMIN_TOKEN")
+    # POST /admin/ingest chỉ đọc embedding pickle nằm trong thư mục này (rỗng = tắt ingest)
+    ingest_dir: str = Field(default="", env="INGEST_DIR")
+    reload_drain_timeout: float = Field(default=120.0, env="RELOAD_DRAIN_TIMEOUT")
+    reload_signal_path: str = Field(default="/app/outputs/reload/signal.json", env="RELOAD_SIGNAL_PATH")
+    reload_poll_seconds: float = Field(default=5.0, env="RELOAD_POLL_SECONDS")
     
     # Search Default Parameters
     default_top_k: int = Field(default=10, env="DEFAULT_TOP_K")
     default_temporal_time: int = Field(default=30, env="DEFAULT_TEMPORAL_TIME")
     default_initial_search_k: int = Field(default=2048, env="DEFAULT_INITIAL_SEARCH_K")
+    search_batch_max_size: int = Field(default=64, env="SEARCH_BATCH_MAX_SIZE")
+
+    # Micro-batching encode + FAISS search cho các request đồng thời (0 = tắt)
+    microbatch_window_ms: float = Field(default=3.0, env="MICROBATCH_WINDOW_MS")
+    microbatch_max_size: int = Field(default=32, env="MICROBATCH_MAX_SIZE")
+
+    # Cache ảnh truy vấn theo SHA-256 (image_cache.py): bytes ảnh (MB) + embedding theo (model, hash)
+    image_cache_max_mb: int = Field(default=256, env="IMAGE_CACHE_MAX_MB")
+    image_cache_max_embeddings: int = Field(default=4096, env="IMAGE_CACHE_MAX_EMBEDDINGS")
     
     # Fusion Weights
     weight_text: float = Field(default=0.3, env="WEIGHT_TEXT")
@@ -63,6 +87,13 @@ class Settings(BaseSettings):
     
     # segment path
     segment_path: str = Field(default="/app/segments", env="SEGMENT_PATH")
+
+    # Query log (JSONL xoay vòng) để replay/đánh giá cấu hình
+    query_log_enabled: bool = Field(default=False, env="QUERY_LOG_ENABLED")
+    query_log_path: str = Field(default="/app/outputs/query-log/queries.jsonl", env="QUERY_LOG_PATH")
+    query_log_max_mb: int = Field(default=64, env="QUERY_LOG_MAX_MB")
+    query_log_backup_count: int = Field(default=10, env="QUERY_LOG_BACKUP_COUNT")
+    query_log_store_images: bool = Field(default=False, env="QUERY_LOG_STORE_IMAGES")
     class Config:
         env_file = ".env"
         case_sensitive = False
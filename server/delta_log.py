@@ -0,0 +1,226 @@
+"""
+Thêm vector mới (video mới) vào index FAISS mà không build lại từ đầu.
+
+``_build_single_index`` luôn build lại từ toàn bộ embedding pickle (IVF còn phải train lại).
+Với vài trăm keyframe mới thì thay vào đó:
+
+- ``DeltaLog``: mỗi lần ingest ghi thêm một file ``deltas/<seq>.pkl`` cạnh ``faiss_index.bin``,
+  cùng định dạng với embedding pickle (``{'paths': [...], 'embeddings': (n, d) float32}``).
+  Khi load index, các delta được đọc lại (bỏ path đã có trong index chính).
+- ``DeltaSegment``: vector của delta nằm trong một ``IndexFlatIP`` nhỏ, tìm cùng lúc với index
+  chính rồi gộp theo điểm. Index chính giữ nguyên (mmap, chỉ đọc, dùng chung giữa các worker);
+  mỗi lần ingest tạo DeltaSegment mới (copy-on-write) và swap như hot reload.
+- ``compact``: gộp delta vào index chính (``index.add`` trên index đã train, IVF không train lại),
+  ghi lại file index + path table bằng ``os.replace`` rồi xoá các delta đã gộp.
+
+Compaction định kỳ (ví dụ cron), sau đó ``POST /admin/reload`` (``reload_segments=false``)
+để các worker load index đã gộp; hoặc gộp luôn trong lần reload với ``compact=true``:
+    python delta_log.py /lucifer_data/faiss-index/clip-index
+"""
+
+import os
+import pickle
+import shutil
+import sys
+import uuid
+from pathlib import Path
+from typing import Any, List, Optional, Tuple, Union
+
+import faiss
+import numpy as np
+
+from path_table import PathTable
+
+DELTA_DIR = "deltas"
+INDEX_FILE = "faiss_index.bin"
+METADATA_FILE = "metadata.pkl"
+
+
+def read_embedding_file(path: Union[str, Path]) -> Tuple[List[str], np.ndarray]:
+    """Đọc embedding pickle ``{'paths', 'embeddings'}``. ValueError nếu dữ liệu không hợp lệ."""
+    path = Path(path)
+    if not path.is_file() or path.suffix != '.pkl':
+        raise ValueError(f"không phải file pickle hợp lệ: {path}")
+    with open(path, 'rb') as f:
+        data = pickle.load(f)
+
+    paths = list(data['paths'])
+    raw_embs = data['embeddings']
+    if isinstance(raw_embs, list):
+        try:
+            embeddings = np.vstack([np.asarray(v, dtype=np.float32) for v in raw_embs])
+        except ValueError as e:
+            raise ValueError(f"Embeddings có chiều không đồng nhất: {e}")
+    else:
+        embeddings = np.asarray(raw_embs, dtype=np.float32)
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(1, -1)
+
+    if embeddings.ndim != 2:
+        raise ValueError(f"Embeddings phải là mảng 2D (n, d), hiện là {embeddings.shape}")
+    if len(paths) != embeddings.shape[0]:
+        raise ValueError(f"Data mismatch: len(paths)={len(paths)} != num_vectors={embeddings.shape[0]}")
+    if 'length' in data and data['length'] != embeddings.shape[0]:
+        print(f"⚠️ length trong pickle={data['length']} != thực tế={embeddings.shape[0]}; dùng thực tế.")
+    return paths, np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+def write_index_dir(directory: Union[str, Path], cpu_index: faiss.Index, paths: List[str]):
+    """Ghi ``faiss_index.bin`` + ``metadata.pkl`` + path table vào ``directory``."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    faiss.write_index(cpu_index, str(directory / INDEX_FILE))
+    metadata = {
+        'id_to_path': dict(enumerate(paths)),
+        'path_to_id': {p: i for i, p in enumerate(paths)},
+        'embedding_dim': cpu_index.d,
+        'total_vectors': cpu_index.ntotal
+    }
+    with open(directory / METADATA_FILE, 'wb') as f:
+        pickle.dump(metadata, f)
+    # Path table cho chế độ mmap (xem path_table.py)
+    PathTable.from_paths(paths).save(directory)
+
+
+class DeltaSegment:
+    """Vector đã ingest nhưng chưa gộp vào index chính (tìm chính xác, dùng như một index phụ)."""
+
+    def __init__(self, paths: List[str], embeddings: np.ndarray):
+        self.paths = list(paths)
+        self._path_set = set(self.paths)
+        self.index = faiss.IndexFlatIP(embeddings.shape[1])
+        self.index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __contains__(self, path: Any) -> bool:
+        return path in self._path_set
+
+    @property
+    def d(self) -> int:
+        return self.index.d
+
+    def extended(self, paths: List[str], embeddings: np.ndarray) -> "DeltaSegment":
+        """DeltaSegment mới gồm cả vector cũ lẫn mới; bản hiện tại không đổi (query đang chạy vẫn đọc được)."""
+        existing = self.index.reconstruct_n(0, self.index.ntotal)
+        return DeltaSegment(self.paths + list(paths), np.vstack([existing, embeddings]))
+
+    def search(self, query_array: np.ndarray, k: int) -> List[List[Tuple[str, float]]]:
+        scores_batch, indices_batch = self.index.search(query_array, min(k, len(self)))
+        return [
+            [(self.paths[idx], score) for idx, score in zip(indices.tolist(), scores.tolist()) if idx != -1]
+            for scores, indices in zip(scores_batch, indices_batch)
+        ]
+
+
+class DeltaLog:
+    """Các file delta của một thư mục index, theo thứ tự ingest."""
+
+    def __init__(self, index_dir: Union[str, Path]):
+        self.directory = Path(index_dir) / DELTA_DIR
+
+    def entries(self) -> List[Path]:
+        if not self.directory.is_dir():
+            return []
+        return sorted(self.directory.glob("*.pkl"))
+
+    def append(self, paths: List[str], embeddings: np.ndarray) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.directory / f".append-{os.getpid()}-{uuid.uuid4().hex}.tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump({'paths': list(paths), 'embeddings': np.asarray(embeddings, dtype=np.float32)}, f)
+        try:
+            # Nhiều worker có thể ingest cùng lúc: os.link không ghi đè, seq đã bị worker khác
+            # lấy thì FileExistsError và thử seq kế tiếp (file đích luôn đầy đủ nội dung)
+            while True:
+                entries = self.entries()
+                seq = int(entries[-1].stem) + 1 if entries else 1
+                target = self.directory / f"{seq:06d}.pkl"
+                try:
+                    os.link(tmp, target)
+                    return target
+                except FileExistsError:
+                    continue
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def read(self, entries: Optional[List[Path]] = None) -> Tuple[List[str], Optional[np.ndarray]]:
+        """Gộp mọi entry (path trùng giữ lần ingest đầu tiên). Embeddings None nếu log rỗng."""
+        paths, chunks, seen = [], [], set()
+        for entry in self.entries() if entries is None else entries:
+            entry_paths, embeddings = read_embedding_file(entry)
+            keep = [i for i, p in enumerate(entry_paths) if p not in seen]
+            seen.update(entry_paths)
+            paths.extend(entry_paths[i] for i in keep)
+            chunks.append(embeddings[keep])
+        if not paths:
+            return [], None
+        return paths, np.vstack(chunks)
+
+    def remove(self, entries: List[Path]):
+        for entry in entries:
+            entry.unlink(missing_ok=True)
+
+
+def replay(index_dir: Union[str, Path], dim: int, known_paths: Any) -> Optional[DeltaSegment]:
+    """Dựng DeltaSegment từ delta log, bỏ path đã có trong index chính (``known_paths``)."""
+    paths, embeddings = DeltaLog(index_dir).read()
+    if embeddings is None:
+        return None
+    if embeddings.shape[1] != dim:
+        raise ValueError(f"delta log có dim {embeddings.shape[1]}, index có dim {dim}")
+    # Path đã có trong index chính: compaction đã gộp nhưng chưa kịp xoá delta
+    keep = [i for i, p in enumerate(paths) if p not in known_paths]
+    if not keep:
+        return None
+    return DeltaSegment([paths[i] for i in keep], embeddings[keep])
+
+
+def compact(index_dir: Union[str, Path]) -> int:
+    """Gộp delta log vào index chính của ``index_dir``. Trả về số vector đã gộp."""
+    index_dir = Path(index_dir)
+    log = DeltaLog(index_dir)
+    entries = log.entries()
+    if not entries:
+        return 0
+
+    index = faiss.read_index(str(index_dir / INDEX_FILE))
+    if not index.is_trained:
+        raise ValueError(f"index trong {index_dir} chưa được train")
+    if PathTable.exists(index_dir):
+        table = PathTable.load(index_dir, mmap=False)
+        paths = [path for _, path in table.items()]
+    else:
+        with open(index_dir / METADATA_FILE, 'rb') as f:
+            id_to_path = pickle.load(f)['id_to_path']
+        paths = [id_to_path[i] for i in range(len(id_to_path))]
+    if len(paths) != index.ntotal:
+        raise ValueError(f"{len(paths)} paths nhưng index có {index.ntotal} vectors")
+
+    delta_paths, embeddings = log.read(entries)
+    known = set(paths)
+    keep = [i for i, p in enumerate(delta_paths) if p not in known]
+    if keep:
+        if embeddings.shape[1] != index.d:
+            raise ValueError(f"delta log có dim {embeddings.shape[1]}, index có dim {index.d}")
+        # IVF: add dùng quantizer đã train, không train lại
+        index.add(np.ascontiguousarray(embeddings[keep]))
+        paths.extend(delta_paths[i] for i in keep)
+
+        # Ghi ra thư mục tạm rồi os.replace từng file: worker đang mmap file cũ vẫn đọc inode cũ
+        staging = index_dir / ".compact"
+        shutil.rmtree(staging, ignore_errors=True)
+        write_index_dir(staging, index, paths)
+        for item in staging.iterdir():
+            os.replace(item, index_dir / item.name)
+        staging.rmdir()
+
+    log.remove(entries)
+    return len(keep)
+
+
+if __name__ == '__main__':
+    for directory in sys.argv[1:]:
+        merged = compact(directory)
+        print(f"✅ {directory}: {merged} vectors from delta log merged")
@@ -3,6 +3,8 @@ import open_clip
 import torch
 from typing import List, Any
 
+from tracing import span
+
 
 class CLIPEmbedder:
     """
@@ -79,22 +81,27 @@ class CLIPEmbedder:
         
         if text_queries:
             indices, texts = zip(*text_queries)
-            text_tokens = self.tokenizer(list(texts)).to(self.device)
-            with torch.amp.autocast(self.device.type, enabled=self.device.type == 'cuda'):
-                with torch.no_grad():
-                    text_embeds = self.model.encode_text(text_tokens)
-                    text_embeds = torch.nn.functional.normalize(text_embeds, p=2, dim=-1)
-            for i, idx in enumerate(indices):
-                final_embeddings[idx] = text_embeds[i].cpu().numpy()
+            with span("encode.tokenize"):
+                text_tokens = self.tokenizer(list(texts)).to(self.device)
+            # Forward chạy bất đồng bộ trên GPU; .cpu() bên trong span là điểm đồng bộ
+            with span("encode.text_forward"):
+                with torch.amp.autocast(self.device.type, enabled=self.device.type == 'cuda'):
+                    with torch.no_grad():
+                        text_embeds = self.model.encode_text(text_tokens)
+                        text_embeds = torch.nn.functional.normalize(text_embeds, p=2, dim=-1)
+                for i, idx in enumerate(indices):
+                    final_embeddings[idx] = text_embeds[i].cpu().numpy()
 
         if image_queries:
             indices, images = zip(*image_queries)
-            image_tensors = torch.stack([self.preprocess(img) for img in images]).to(self.device)
-            with torch.amp.autocast(self.device.type, enabled=self.device.type == 'cuda'):
-                with torch.no_grad():
-                    image_embeds = self.model.encode_image(image_tensors)
-                    image_embeds = torch.nn.functional.normalize(image_embeds, p=2, dim=-1)
-            for i, idx in enumerate(indices):
-                final_embeddings[idx] = image_embeds[i].cpu().numpy()
+            with span("encode.image_preprocess"):
+                image_tensors = torch.stack([self.preprocess(img) for img in images]).to(self.device)
+            with span("encode.image_forward"):
+                with torch.amp.autocast(self.device.type, enabled=self.device.type == 'cuda'):
+                    with torch.no_grad():
+                        image_embeds = self.model.encode_image(image_tensors)
+                        image_embeds = torch.nn.functional.normalize(image_embeds, p=2, dim=-1)
+                for i, idx in enumerate(indices):
+                    final_embeddings[idx] = image_embeds[i].cpu().numpy()
 
         return np.array(final_embeddings, dtype=np.float32)
@@ -0,0 +1,106 @@
+"""
+Process riêng giữ các CLIP encoder, dùng chung cho nhiều worker của search API.
+
+Khi chạy search API với ``API_WORKERS > 1``, mỗi worker tự load encoder sẽ nhân bản model
+trên GPU. Thay vào đó chạy một encoder process:
+    uvicorn encoder_server:app --host 0.0.0.0 --port 8001
+và đặt ``ENCODER_URL=http://localhost:8001`` cho search API; các worker dùng
+``RemoteEmbedder`` (remote_embedder.py) với cùng interface ``encode_batch``.
+Request encode từ các worker được gom micro-batch ở đây (MICROBATCH_WINDOW_MS).
+
+Giao thức ``POST /encode`` (multipart):
+- ``model_name``: tên model
+- ``queries``: JSON list, mỗi phần tử ``{"text": "..."}`` hoặc ``{"image": i, "width": w, "height": h}``
+- ``images``: bytes RGB thô của ảnh thứ i
+Response: float32 little-endian, header ``X-Embedding-Shape: n,d``.
+"""
+
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import Response
+from PIL import Image
+from starlette.concurrency import run_in_threadpool
+
+from batcher import MicroBatcher
+from config import settings
+from embedder import CLIPEmbedder
+
+app = FastAPI(title="Lucifer AIC 2025 Encoder", version="1.0.0")
+
+embedders: Dict[str, CLIPEmbedder] = {}
+batchers: Dict[str, MicroBatcher] = {}
+
+
+@app.on_event("startup")
+async def startup_event():
+    if torch.cuda.is_available():
+        device_0, device_1 = torch.device(settings.device_0), torch.device(settings.device_1)
+    else:
+        device_0 = device_1 = torch.device("cpu")
+
+    # Cùng điều kiện với main.py: chỉ load model có index
+    models = [
+        (settings.model_1_name, settings.model_1_pretrained, device_0, settings.model_1_input_index_path),
+        (settings.model_2_name, settings.model_2_pretrained, device_1, settings.model_2_input_index_path),
+    ]
+    for model_name, pretrained, device, index_path in models:
+        if not index_path:
+            continue
+        embedder = CLIPEmbedder(device=device, model_name=model_name, pretrained=pretrained)
+        embedders[model_name] = embedder
+        batchers[model_name] = MicroBatcher(
+            embedder.encode_batch,
+            window_ms=settings.microbatch_window_ms,
+            max_batch_size=settings.microbatch_max_size,
+            name=f"encoder.microbatch:{model_name}"
+        )
+        print(f"✅ Encoder loaded: {model_name} on {device}")
+
+
+@app.get("/health")
+async def health_check():
+    return {
+        "status": "healthy",
+        "models": {
+            name: {"device": str(embedder.device), **batchers[name].stats()}
+            for name, embedder in embedders.items()
+        },
+    }
+
+
+@app.post("/encode")
+async def encode(
+    model_name: str = Form(...),
+    queries: str = Form(...),
+    images: Optional[List[UploadFile]] = File(None)
+):
+    if model_name not in embedders:
+        raise HTTPException(status_code=404, detail=f"Model '{model_name}' chưa được load.")
+    try:
+        parsed = json.loads(queries)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Lỗi phân tích 'queries': {e}")
+
+    image_bytes = [await f.read() for f in images or []]
+    batch = []
+    for item in parsed:
+        if 'text' in item:
+            batch.append(item['text'])
+            continue
+        try:
+            data = image_bytes[item['image']]
+            batch.append(Image.frombytes('RGB', (item['width'], item['height']), data))
+        except (KeyError, IndexError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"Ảnh không hợp lệ trong 'queries': {e}")
+
+    embeddings = await run_in_threadpool(batchers[model_name].submit, batch)
+    embeddings = np.ascontiguousarray(np.asarray(embeddings, dtype='<f4'))
+    return Response(
+        content=embeddings.tobytes(),
+        media_type="application/octet-stream",
+        headers={"X-Embedding-Shape": f"{embeddings.shape[0]},{embeddings.shape[1] if embeddings.ndim == 2 else 0}"}
+    )
@@ -0,0 +1,173 @@
+"""
+Encoding gọn cho kết quả /search và /search/batch, chọn theo header ``Accept``.
+
+Mặc định (không gửi Accept đặc biệt) response vẫn là JSON lồng nhau như cũ:
+``[[path, [scores_tuple, total, is_peak, peak_stage]], ...]`` cho mỗi chain.
+
+Với ``Accept: application/vnd.lucifer.compact+json`` (orjson) hoặc
+``Accept: application/x-msgpack`` (msgpack), ``results`` được đổi sang dạng cột:
+
+    {
+      "encoding": "compact-v1",
+      "videos": ["L01_V001", ...],            # bảng video dùng chung cho cả response
+      "results": [
+        {"v": 0,                              # index trong "videos"
+         "f": [120, 128, ...],                # frame index
+         "s": [[0.31, 0.0], [0.0, 0.0], ...], # điểm từng stage của mỗi frame
+         "t": 0.52,                           # điểm tổng của chain
+         "p": [0, -1, ...]},                  # peak_stage của mỗi frame (-1: không phải peak)
+        ...
+      ]
+    }
+
+Truy vấn một stage trả về cặp ``(path, score)`` thay vì chain; khi đó phần tử chỉ có
+``v``, ``f`` (một frame) và ``t``. Phía backend giải mã lại bằng ``query/search_codec.py``.
+
+Encoding gọn là lossless: nếu kết quả có path không theo dạng ``<video>/<frame>.jpg``
+hoặc không biểu diễn được ở dạng cột, response được trả về JSON mặc định.
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+COMPACT_JSON_MEDIA_TYPE = "application/vnd.lucifer.compact+json"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+COMPACT_VERSION = "compact-v1"
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """Trả về media type gọn mà client chấp nhận (ưu tiên msgpack), None nếu dùng JSON mặc định."""
+    if not accept:
+        return None
+    accepted = {part.split(';')[0].strip().lower() for part in accept.split(',')}
+    if msgpack is not None and (MSGPACK_MEDIA_TYPE in accepted or "application/msgpack" in accepted):
+        return MSGPACK_MEDIA_TYPE
+    if COMPACT_JSON_MEDIA_TYPE in accepted:
+        return COMPACT_JSON_MEDIA_TYPE
+    return None
+
+
+def _split_path(path: Any):
+    if not isinstance(path, str) or '/' not in path:
+        return None
+    video, filename = path.rsplit('/', 1)
+    stem, dot, ext = filename.rpartition('.')
+    if not dot or ext != 'jpg' or not stem.isdigit() or str(int(stem)) != stem:
+        return None
+    return video, int(stem)
+
+
+def _video_id(videos: Dict[str, int], video: str) -> int:
+    if video not in videos:
+        videos[video] = len(videos)
+    return videos[video]
+
+
+def _compact_chain(chain: Any, videos: Dict[str, int]) -> Optional[Dict[str, Any]]:
+    # Một stage: cặp (path, score)
+    if len(chain) == 2 and isinstance(chain[0], str) and isinstance(chain[1], (int, float)):
+        parsed = _split_path(chain[0])
+        if parsed is None:
+            return None
+        return {"v": _video_id(videos, parsed[0]), "f": [parsed[1]], "t": chain[1]}
+
+    video_id, total = None, None
+    frames, scores, peaks = [], [], []
+    for item in chain:
+        if len(item) != 2 or len(item[1]) != 4:
+            return None
+        path, (stage_scores, chain_score, is_peak, peak_stage) = item
+        parsed = _split_path(path)
+        if parsed is None or bool(is_peak) != (peak_stage >= 0):
+            return None
+        vid = _video_id(videos, parsed[0])
+        if video_id is None:
+            video_id, total = vid, chain_score
+        elif vid != video_id or chain_score != total:
+            return None
+        frames.append(parsed[1])
+        scores.append(list(stage_scores))
+        peaks.append(peak_stage)
+    if video_id is None:
+        return None
+    return {"v": video_id, "f": frames, "s": scores, "t": total, "p": peaks}
+
+
+def compact_results(results: List[Any], videos: Dict[str, int]) -> Optional[List[Dict[str, Any]]]:
+    """Đổi ``results`` của temporal_search sang dạng cột, cập nhật bảng ``videos``. None nếu không đổi được."""
+    compacted = []
+    for chain in results:
+        try:
+            item = _compact_chain(chain, videos)
+        except (TypeError, ValueError):
+            return None
+        if item is None:
+            return None
+        compacted.append(item)
+    return compacted
+
+
+def compact_payload(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Bản gọn của response /search (có ``results``) hoặc /search/batch (có ``responses``),
+    dùng chung một bảng ``videos``. None nếu có kết quả không biểu diễn được.
+    """
+    videos: Dict[str, int] = {}
+    compacted = dict(payload)
+    if 'responses' in payload:
+        responses = []
+        for item in payload['responses']:
+            if 'results' in item:
+                results = compact_results(item['results'], videos)
+                if results is None:
+                    return None
+                item = {**item, 'results': results}
+            responses.append(item)
+        compacted['responses'] = responses
+    elif 'results' in payload:
+        results = compact_results(payload['results'], videos)
+        if results is None:
+            return None
+        compacted['results'] = results
+    compacted['encoding'] = COMPACT_VERSION
+    compacted['videos'] = list(videos)
+    return compacted
+
+
+def _dumps_json(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY, default=float)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=float).encode('utf-8')
+
+
+def _numpy_default(obj: Any) -> Any:
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return float(obj)
+
+
+def encode_response(payload: Dict[str, Any], accept: Optional[str]) -> Response:
+    """Response cho /search và /search/batch theo header Accept của client."""
+    media_type = negotiate(accept)
+    compacted = compact_payload(payload) if media_type else None
+    if compacted is None:
+        return JSONResponse(jsonable_encoder(payload), headers={"Vary": "Accept"})
+    if media_type == MSGPACK_MEDIA_TYPE:
+        body = msgpack.packb(compacted, use_bin_type=True, default=_numpy_default)
+    else:
+        body = _dumps_json(compacted)
+    return Response(content=body, media_type=media_type, headers={"Vary": "Accept"})
@@ -8,28 +8,100 @@ from tqdm.auto import tqdm
 import torch
 from collections import defaultdict
 import concurrent.futures
+import threading
 
+from batcher import MicroBatcher
+from delta_log import DeltaLog, DeltaSegment, read_embedding_file, replay, write_index_dir
+from generations import Generation, GenerationSlot
+from image_cache import ImageCache, ImageQuery
+from path_table import PathTable
 from reranker import Reranker
+from tracing import span, submit
+
+
+class IndexSet:
+    """Index + path table của mọi model trong một thế hệ (thay thế cùng lúc khi hot reload)."""
+
+    def __init__(self):
+        self.indexes: Dict[str, faiss.Index] = {}
+        self.id_to_path_maps: Dict[str, Dict[int, str]] = {}
+        self.path_to_id_maps: Dict[str, Dict[str, int]] = {}
+        self.total_vectors: Dict[str, int] = {}
+        self.embedding_dims: Dict[str, int] = {}
+        # Vector ingest sau khi build index chính (xem delta_log.py)
+        self.deltas: Dict[str, DeltaSegment] = {}
+
+    def copy(self) -> "IndexSet":
+        """Bản sao nông: dùng chung index / path table, dict riêng để thay từng model."""
+        other = IndexSet()
+        for name, value in vars(self).items():
+            setattr(other, name, dict(value))
+        return other
 
 
 class FAISSSearchEngine:
     """
     FAISS Search Engine quản lý nhiều chỉ mục và phân chia chúng lên các GPU khác nhau.
     """
-    def __init__(self, list_faiss_configs: List[Dict[str, Any]], reranker: Reranker = None):
+    def __init__(
+        self,
+        list_faiss_configs: List[Dict[str, Any]],
+        reranker: Reranker = None,
+        microbatch_window_ms: float = 0.0,
+        microbatch_max_size: int = 32,
+        mmap: bool = False,
+        image_cache: Optional[ImageCache] = None
+    ):
         self.configs = {cfg['model_name']: cfg for cfg in list_faiss_configs}
         self.embedders: Dict[str, Any] = {cfg['model_name']: cfg['embedder'] for cfg in list_faiss_configs}
-        self.indexes: Dict[str, faiss.Index] = {}
+        # Index + path table nằm trong một thế hệ (IndexSet) để hot reload thay cả bộ một lúc;
+        # self.indexes, self.id_to_path_maps, ... là property trỏ vào thế hệ query đang dùng
+        self.generations = GenerationSlot("faiss", IndexSet())
         # Quản lý tài nguyên cho từng GPU riêng biệt
         self.gpu_resources_map: Dict[int, faiss.StandardGpuResources] = {}
         
-        self.id_to_path_maps: Dict[str, Dict[int, str]] = {}
-        self.path_to_id_maps: Dict[str, Dict[str, int]] = {}
-        self.total_vectors: Dict[str, int] = {}
-        self.embedding_dims: Dict[str, int] = {}
         self.reranker = reranker if reranker else Reranker()
 
-    def _get_gpu_resource(self, gpu_id: int) -> Optional[faiss.StandardGpuResources]:
+        # Micro-batching: các request đồng thời cùng (model, k) dùng chung một lần
+        # encode_batch + index.search. window <= 0 là tắt.
+        self.microbatch_window_ms = microbatch_window_ms
+        self.microbatch_max_size = microbatch_max_size
+        self._batchers: Dict[Tuple[int, str, int], MicroBatcher] = {}
+        self._batchers_lock = threading.Lock()
+        self._ingest_lock = threading.Lock()
+
+        # mmap: index và path table được map từ file (chỉ đọc, trên CPU) nên nhiều worker
+        # uvicorn dùng chung page cache thay vì mỗi process giữ một bản trong RAM
+        self.mmap = mmap
+
+        # Embedding ảnh truy vấn theo (model, SHA-256): ảnh gửi lại không encode lại
+        self.image_cache = image_cache
+
+    @property
+    def indexes(self) -> Dict[str, faiss.Index]:
+        return self.generations.get().data.indexes
+
+    @property
+    def id_to_path_maps(self) -> Dict[str, Dict[int, str]]:
+        return self.generations.get().data.id_to_path_maps
+
+    @property
+    def path_to_id_maps(self) -> Dict[str, Dict[str, int]]:
+        return self.generations.get().data.path_to_id_maps
+
+    @property
+    def total_vectors(self) -> Dict[str, int]:
+        return self.generations.get().data.total_vectors
+
+    @property
+    def embedding_dims(self) -> Dict[str, int]:
+        return self.generations.get().data.embedding_dims
+
+    @property
+    def deltas(self) -> Dict[str, DeltaSegment]:
+        return self.generations.get().data.deltas
+
+    def _get_gpu_resource(self, gpu_id: int) -> Optional["faiss.StandardGpuResources"]:
         """Khởi tạo và trả về resource cho một GPU ID cụ thể."""
         if gpu_id not in self.gpu_resources_map:
             try:
@@ -43,42 +115,14 @@ class FAISSSearchEngine:
     def _build_single_index(self, model_name: str):
         print(f"\n--- Building index for model: '{model_name}' ---")
         config = self.configs[model_name]
-        embedding_file_path = Path(config['embedding_path'])
-
-        if not embedding_file_path.is_file() or embedding_file_path.suffix != '.pkl':
-            print(f"❌ Embedding path for '{model_name}' is not a valid pickle file: {embedding_file_path}")
+        try:
+            paths, embeddings_array = read_embedding_file(config['embedding_path'])
+        except ValueError as e:
+            print(f"❌ Invalid embedding file for '{model_name}': {e}")
             return
 
-        with open(embedding_file_path, 'rb') as f:
-            data = pickle.load(f)
-        
-        paths = data['paths']
-        raw_embs = data['embeddings']
-        
-        if isinstance(raw_embs, list):
-            try:
-                embeddings_array = np.vstack([np.asarray(v, dtype=np.float32) for v in raw_embs])
-            except ValueError as e:
-                print(f"❌ Embeddings có chiều không đồng nhất: {e}")
-                return
-        else:
-            embeddings_array = np.asarray(raw_embs, dtype=np.float32)
-            if embeddings_array.ndim == 1:
-                embeddings_array = embeddings_array.reshape(1, -1)
-        
-        if embeddings_array.ndim != 2:
-            print(f"❌ Embeddings phải là mảng 2D (n, d), hiện là {embeddings_array.shape}")
-            return
-        embeddings_array = np.ascontiguousarray(embeddings_array, dtype=np.float32)
-        
         num_vectors = embeddings_array.shape[0]
         d = embeddings_array.shape[1]
-        if len(paths) != num_vectors:
-            print(f"❌ Data mismatch: len(paths)={len(paths)} != num_vectors={num_vectors}")
-            return
-        if 'length' in data and data['length'] != num_vectors:
-            print(f"⚠️ length trong pickle={data['length']} != thực tế={num_vectors}; dùng thực tế.")
-        
         self.embedding_dims[model_name] = d
         self.total_vectors[model_name] = num_vectors
         self.id_to_path_maps[model_name] = {i: p for i, p in enumerate(paths)}
@@ -137,15 +181,8 @@ class FAISSSearchEngine:
             print(f"--- Saving index for model: '{model_name}' to {save_path} ---")
             try:
                 cpu_index = faiss.index_gpu_to_cpu(index) if 'gpu' in str(type(index)).lower() else index
-                faiss.write_index(cpu_index, str(save_path / "faiss_index.bin"))
-                metadata = {
-                    'id_to_path': self.id_to_path_maps[model_name],
-                    'path_to_id': self.path_to_id_maps[model_name],
-                    'embedding_dim': self.embedding_dims[model_name],
-                    'total_vectors': self.total_vectors[model_name]
-                }
-                with open(save_path / "metadata.pkl", 'wb') as f:
-                    pickle.dump(metadata, f)
+                id_to_path = self.id_to_path_maps[model_name]
+                write_index_dir(save_path, cpu_index, [id_to_path[i] for i in range(len(id_to_path))])
                 print(f"✅ Saved '{model_name}' successfully.")
             except Exception as e:
                 print(f"❌ Error saving index for '{model_name}': {e}")
@@ -159,21 +196,41 @@ class FAISSSearchEngine:
             load_path = Path(load_path_str)
             print(f"\n--- Loading index for model: '{model_name}' from {load_path} ---")
             index_file, metadata_file = load_path / "faiss_index.bin", load_path / "metadata.pkl"
-            if not index_file.exists() or not metadata_file.exists():
+            use_path_table = self.mmap and PathTable.exists(load_path)
+            if not index_file.exists() or not (metadata_file.exists() or use_path_table):
                 print(f"⚠️ Skipping '{model_name}': missing index or metadata file in {load_path}.")
                 continue
             try:
-                cpu_index = faiss.read_index(str(index_file))
-                with open(metadata_file, 'rb') as f: 
-                    metadata = pickle.load(f)
-                self.id_to_path_maps[model_name] = metadata['id_to_path']
-                self.path_to_id_maps[model_name] = metadata['path_to_id']
-                self.embedding_dims[model_name] = metadata['embedding_dim']
-                self.total_vectors[model_name] = metadata['total_vectors']
+                if self.mmap:
+                    cpu_index = faiss.read_index(str(index_file), self._mmap_io_flags())
+                else:
+                    cpu_index = faiss.read_index(str(index_file))
+                if use_path_table:
+                    table = PathTable.load(load_path, mmap=True)
+                    if len(table) != cpu_index.ntotal:
+                        raise ValueError(f"path table có {len(table)} paths, index có {cpu_index.ntotal} vectors")
+                    self.id_to_path_maps[model_name] = table
+                    self.path_to_id_maps[model_name] = table.reverse()
+                    self.embedding_dims[model_name] = cpu_index.d
+                    self.total_vectors[model_name] = cpu_index.ntotal
+                else:
+                    if self.mmap:
+                        print(f"⚠️ No path table in {load_path}, loading metadata.pkl into memory "
+                              f"(run `python path_table.py {load_path}` to share it between workers).")
+                    with open(metadata_file, 'rb') as f: 
+                        metadata = pickle.load(f)
+                    self.id_to_path_maps[model_name] = metadata['id_to_path']
+                    self.path_to_id_maps[model_name] = metadata['path_to_id']
+                    self.embedding_dims[model_name] = metadata['embedding_dim']
+                    self.total_vectors[model_name] = metadata['total_vectors']
                 
                 current_config = self.configs[model_name]
                 embedder_device = self.embedders[model_name].device
-                if current_config.get('use_gpu', False) and embedder_device.type == 'cuda':
+                if self.mmap:
+                    # Index map từ file phải ở CPU; chuyển lên GPU sẽ tạo bản sao riêng mỗi worker
+                    self.indexes[model_name] = cpu_index
+                    print(f"✅ Index for '{model_name}' memory-mapped on CPU.")
+                elif current_config.get('use_gpu', False) and embedder_device.type == 'cuda':
                     gpu_id = embedder_device.index
                     res = self._get_gpu_resource(gpu_id)
                     if res:
@@ -186,26 +243,250 @@ class FAISSSearchEngine:
                     print(f"✅ Index for '{model_name}' loaded on CPU.")
                 if current_config.get("index_type") == "IVF":
                     self.indexes[model_name].nprobe = current_config.get("nprobe", 64)
+
+                delta = replay(load_path, self.embedding_dims[model_name], self.path_to_id_maps[model_name])
+                if delta is not None:
+                    self.deltas[model_name] = delta
+                    print(f"📥 Replayed {len(delta)} vectors from delta log for '{model_name}'.")
             except Exception as e:
                 print(f"❌ Error loading index for '{model_name}': {e}")
 
+    @staticmethod
+    def _mmap_io_flags() -> int:
+        # IO_FLAG_MMAP_IFC (faiss >= 1.10) map cả codes của IndexFlat lẫn inverted lists của IVF;
+        # faiss cũ chỉ có IO_FLAG_MMAP (chỉ map được inverted lists của IVF)
+        return getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+    def load_index_set(self, index_paths: Optional[Dict[str, str]] = None, build: bool = False) -> Tuple[IndexSet, Dict[str, Dict[str, Any]]]:
+        """
+        Load (hoặc build từ embedding_path nếu ``build``) một thế hệ index mới mà không đụng
+        tới thế hệ đang phục vụ. ``index_paths`` ghi đè input_index_path theo model.
+        Trả về (IndexSet, configs tương ứng) để validate rồi ``swap_index_set``.
+        """
+        configs = []
+        for model_name, config in self.configs.items():
+            config = dict(config)
+            if index_paths and model_name in index_paths:
+                config['input_index_path'] = index_paths[model_name]
+            configs.append(config)
+        staging = FAISSSearchEngine(configs, reranker=self.reranker, mmap=self.mmap)
+        staging.gpu_resources_map = self.gpu_resources_map  # dùng chung GPU resources
+        if build:
+            staging.build_all_indexes()
+        else:
+            staging.load_all_indexes()
+        return staging.generations.current.data, staging.configs
+
+    def validate_index_set(self, index_set: IndexSet, probe_query: str = "a photo", k: int = 10) -> List[str]:
+        """Kiểm tra thế hệ mới trước khi swap. Trả về danh sách lỗi (rỗng = hợp lệ)."""
+        errors = []
+        current = self.generations.current.data
+        for model_name in self.configs:
+            if model_name not in index_set.indexes:
+                if model_name in current.indexes:
+                    errors.append(f"'{model_name}': không load được index mới")
+                continue
+            index = index_set.indexes[model_name]
+            id_to_path = index_set.id_to_path_maps.get(model_name) or {}
+            if len(id_to_path) != index.ntotal:
+                errors.append(f"'{model_name}': {len(id_to_path)} paths nhưng index có {index.ntotal} vectors")
+                continue
+            if model_name in current.embedding_dims and index.d != current.embedding_dims[model_name]:
+                errors.append(f"'{model_name}': dim {index.d} khác thế hệ hiện tại ({current.embedding_dims[model_name]})")
+                continue
+            try:
+                probe = Generation(-1, index_set)
+                results = self._encode_and_search(model_name, [probe_query], k, probe)[0]
+                if index.ntotal and not results:
+                    errors.append(f"'{model_name}': truy vấn thử không trả kết quả")
+            except Exception as e:
+                errors.append(f"'{model_name}': truy vấn thử lỗi: {e}")
+        return errors
+
+    def swap_index_set(self, index_set: IndexSet, configs: Optional[Dict[str, Dict[str, Any]]] = None) -> Generation:
+        """Đổi sang thế hệ index mới (query mới dùng ngay), trả về thế hệ cũ để drain."""
+        old = self.generations.swap(index_set)
+        if configs:
+            self.configs = configs
+        with self._batchers_lock:
+            for key in [key for key in self._batchers if key[0] == old.number]:
+                del self._batchers[key]
+        print(f"🔁 FAISS indexes swapped: generation {old.number} -> {self.generations.current.number}")
+        return old
+
+    def release_index_set(self, generation: Generation, timeout: Optional[float] = None) -> bool:
+        """Chờ các query đang dùng thế hệ cũ kết thúc rồi giải phóng index (kể cả bản trên GPU)."""
+        drained = generation.wait_drained(timeout)
+        if not drained:
+            print(f"⚠️ Generation {generation.number} still has {generation.refs} in-flight queries; leaving it to GC")
+            return False
+        on_gpu = any('gpu' in str(type(index)).lower() for index in generation.data.indexes.values())
+        generation.data.indexes.clear()
+        generation.data.id_to_path_maps.clear()
+        generation.data.path_to_id_maps.clear()
+        generation.data.deltas.clear()
+        if on_gpu and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        print(f"🧹 FAISS generation {generation.number} released")
+        return True
+
+    def add_vectors(self, model_name: str, paths: List[str], embeddings: np.ndarray, persist: bool = True) -> int:
+        """
+        Thêm vector mới mà không build lại index: ghi vào delta log của ``input_index_path``
+        (nếu ``persist``) rồi swap sang thế hệ có DeltaSegment mở rộng. Path đã có bị bỏ qua.
+        Trả về số vector thực sự được thêm.
+        """
+        with self._ingest_lock:
+            data = self.generations.current.data
+            if model_name not in data.indexes:
+                raise ValueError(f"Model '{model_name}' chưa có index")
+            embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+            if embeddings.ndim != 2 or embeddings.shape[1] != data.embedding_dims[model_name]:
+                raise ValueError(
+                    f"embeddings {embeddings.shape} không khớp dim {data.embedding_dims[model_name]} của '{model_name}'"
+                )
+            if len(paths) != embeddings.shape[0]:
+                raise ValueError(f"len(paths)={len(paths)} != num_vectors={embeddings.shape[0]}")
+
+            known, delta = data.path_to_id_maps[model_name], data.deltas.get(model_name)
+            keep, seen = [], set()
+            for i, path in enumerate(paths):
+                if path in seen or path in known or (delta is not None and path in delta):
+                    continue
+                seen.add(path)
+                keep.append(i)
+            if not keep:
+                return 0
+            new_paths, new_embeddings = [paths[i] for i in keep], embeddings[keep]
+
+            index_dir = self.configs[model_name].get("input_index_path")
+            if persist and index_dir:
+                DeltaLog(index_dir).append(new_paths, new_embeddings)
+            elif persist:
+                print(f"⚠️ '{model_name}' has no input_index_path; ingested vectors are kept in memory only.")
+
+            index_set = data.copy()
+            index_set.deltas[model_name] = (
+                delta.extended(new_paths, new_embeddings) if delta is not None else DeltaSegment(new_paths, new_embeddings)
+            )
+            # Thế hệ cũ dùng chung index chính với thế hệ mới nên không release, chỉ để GC thu hồi
+            self.swap_index_set(index_set)
+            return len(keep)
+
+    def _get_batcher(self, generation: Generation, model_name: str, k: int) -> MicroBatcher:
+        # Mỗi thế hệ index một batcher riêng: query của thế hệ cũ và mới không bị gom chung
+        key = (generation.number, model_name, k)
+        batcher = self._batchers.get(key)
+        if batcher is None:
+            with self._batchers_lock:
+                batcher = self._batchers.get(key)
+                if batcher is None:
+                    batcher = self._batchers[key] = MicroBatcher(
+                        lambda queries: self._encode_and_search(model_name, queries, k, generation),
+                        window_ms=self.microbatch_window_ms,
+                        max_batch_size=self.microbatch_max_size,
+                        name=f"faiss.microbatch:{model_name}"
+                    )
+        return batcher
+
+    def microbatch_stats(self) -> Dict[str, Dict[str, float]]:
+        current = self.generations.current.number
+        return {
+            f"{model_name}@{k}": batcher.stats()
+            for (number, model_name, k), batcher in list(self._batchers.items()) if number == current
+        }
+
     def _search_single_model(self, model_name: str, queries: List[Any], k: int) -> List[List[Tuple[str, float]]]:
-        index = self.indexes.get(model_name)
-        embedder = self.embedders.get(model_name)
-        id_to_path = self.id_to_path_maps.get(model_name)
-        if not all([index, embedder, id_to_path]):
+        if not all([self.indexes.get(model_name), self.embedders.get(model_name), self.id_to_path_maps.get(model_name)]):
             print(f"⚠️ Cannot search model '{model_name}': component is missing.")
             return [[] for _ in queries]
-        query_array = embedder.encode_batch(queries)
-        scores_batch, indices_batch = index.search(query_array, k)
+        generation = self.generations.get()
+        if self.microbatch_window_ms > 0:
+            return self._get_batcher(generation, model_name, k).submit(queries)
+        return self._encode_and_search(model_name, queries, k, generation)
+
+    def _encode_and_search(
+        self, model_name: str, queries: List[Any], k: int, generation: Optional[Generation] = None
+    ) -> List[List[Tuple[str, float]]]:
+        data = (generation or self.generations.get()).data
+        index = data.indexes[model_name]
+        embedder = self.embedders[model_name]
+        id_to_path = data.id_to_path_maps[model_name]
+
+        # Text / ảnh trùng nhau (ví dụ "placeholder" hoặc nhiều request cùng query) chỉ encode một lần
+        unique_queries, positions, slots = [], [], {}
+        for query in queries:
+            if isinstance(query, str):
+                key = ('text', query)
+            elif isinstance(query, ImageQuery):
+                key = ('image', query.sha256)
+            else:
+                key = ('object', id(query))
+            if key not in slots:
+                slots[key] = len(unique_queries)
+                unique_queries.append(query)
+            positions.append(slots[key])
+        with span(f"faiss.encode:{model_name}"):
+            query_array = self._encode_queries(model_name, embedder, unique_queries)
+        with span(f"faiss.index_search:{model_name}"):
+            scores_batch, indices_batch = index.search(query_array, k)
+        delta = data.deltas.get(model_name)
+        delta_results = None
+        if delta is not None:
+            with span(f"faiss.delta_search:{model_name}"):
+                delta_results = delta.search(query_array, k)
         batch_results = []
         for scores, indices in zip(scores_batch, indices_batch):
             single_query_results = []
-            for score, idx in zip(scores, indices):
-                if idx != -1 and idx in id_to_path:
-                    single_query_results.append((id_to_path[idx], float(score)))
+            if isinstance(id_to_path, PathTable):
+                # Tra cả hàng một lần (vectorized) thay vì từng id trên bảng mmap
+                for path, score in zip(id_to_path.lookup(indices), scores.tolist()):
+                    if path is not None:
+                        single_query_results.append((path, score))
+            else:
+                for score, idx in zip(scores, indices):
+                    if idx != -1 and idx in id_to_path:
+                        single_query_results.append((id_to_path[idx], float(score)))
             batch_results.append(single_query_results)
-        return batch_results
+        if delta_results is not None:
+            # Gộp kết quả của delta segment theo điểm (cùng metric inner product với index chính)
+            batch_results = [
+                sorted(main + extra, key=lambda item: item[1], reverse=True)[:k]
+                for main, extra in zip(batch_results, delta_results)
+            ]
+        # Mỗi caller nhận list riêng (reranker không sửa, nhưng tránh chia sẻ ngầm)
+        return [list(batch_results[pos]) for pos in positions]
+
+    def _encode_queries(self, model_name: str, embedder: Any, queries: List[Any]) -> np.ndarray:
+        """encode_batch cho ``queries``; ảnh (ImageQuery) đã có embedding trong image_cache thì không encode lại."""
+        cached: Dict[int, np.ndarray] = {}
+        if self.image_cache is not None:
+            for i, query in enumerate(queries):
+                if isinstance(query, ImageQuery):
+                    embedding = self.image_cache.get_embedding(model_name, query.sha256)
+                    if embedding is not None:
+                        cached[i] = embedding
+
+        to_encode = [i for i in range(len(queries)) if i not in cached]
+        encoded = None
+        if to_encode:
+            encoded = embedder.encode_batch([
+                queries[i].image if isinstance(queries[i], ImageQuery) else queries[i] for i in to_encode
+            ])
+            if self.image_cache is not None:
+                for row, i in enumerate(to_encode):
+                    if isinstance(queries[i], ImageQuery):
+                        self.image_cache.put_embedding(model_name, queries[i].sha256, encoded[row].copy())
+        if not cached:
+            return encoded
+
+        dim = encoded.shape[1] if encoded is not None else len(next(iter(cached.values())))
+        query_array = np.empty((len(queries), dim), dtype=np.float32)
+        for i, embedding in cached.items():
+            query_array[i] = embedding
+        if encoded is not None:
+            query_array[to_encode] = encoded
+        return query_array
 
     def search(
         self,
@@ -214,11 +495,20 @@ class FAISSSearchEngine:
         k: int = 100
     ) -> List[List[Tuple[str, float]]]:
 
+        with span("faiss.search"), self.generations.pin():
+            return self._search(queries, models_to_search, k)
+
+    def _search(
+        self,
+        queries: List[Any],
+        models_to_search: List[Dict[str, Any]],
+        k: int
+    ) -> List[List[Tuple[str, float]]]:
         raw_results_by_model: Dict[str, List[List[Tuple[str, float]]]] = {}
         model_configs = {m['model_name']: m for m in models_to_search}
         with concurrent.futures.ThreadPoolExecutor() as executor:
             future_to_model = {
-                executor.submit(self._search_single_model, model_name, queries, k): model_name
+                submit(executor, self._search_single_model, model_name, queries, k): model_name
                 for model_name in model_configs.keys() if model_name in self.indexes
             }
             for future in concurrent.futures.as_completed(future_to_model):
@@ -230,14 +520,14 @@ class FAISSSearchEngine:
                     raw_results_by_model[model_name] = [[] for _ in queries]
 
         list_batch_result = [batch_result for model_name, batch_result in raw_results_by_model.items()]
-        final_reranked_results = self.reranker(list_batch_result=list_batch_result, top_k=k)
+        with span("faiss.rerank"):
+            final_reranked_results = self.reranker(list_batch_result=list_batch_result, top_k=k)
         return final_reranked_results
     
     def cleanup_gpu_memory(self):
         if self.gpu_resources_map:
-            del self.indexes
+            self.generations.current.data.indexes.clear()
             del self.gpu_resources_map
-            self.indexes = {}
             self.gpu_resources_map = {}
             if torch.cuda.is_available(): 
                 torch.cuda.empty_cache()
@@ -0,0 +1,88 @@
+"""
+Thế hệ dữ liệu có đếm tham chiếu, dùng cho hot reload index FAISS và segment caches.
+
+Mỗi query ``pin()`` thế hệ hiện tại khi bắt đầu: mọi lần đọc trong query (kể cả ở các
+thread con tạo bằng ``tracing.submit`` / ``run_in_threadpool``, vì pin nằm trong contextvar)
+đều thấy cùng một thế hệ. ``swap()`` thay thế hệ mới cho các query sau; thế hệ cũ được giữ
+tới khi các query đang chạy trên nó kết thúc (``wait_drained``) rồi mới giải phóng.
+"""
+
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+
+class Generation:
+    def __init__(self, number: int, data: Any):
+        self.number = number
+        self.data = data
+        self._refs = 0
+        self._cond = threading.Condition()
+
+    @property
+    def refs(self) -> int:
+        with self._cond:
+            return self._refs
+
+    def acquire(self):
+        with self._cond:
+            self._refs += 1
+
+    def release(self):
+        with self._cond:
+            self._refs -= 1
+            if self._refs == 0:
+                self._cond.notify_all()
+
+    def wait_drained(self, timeout: Optional[float] = None) -> bool:
+        """Chờ tới khi không còn query nào giữ thế hệ này. False nếu hết timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._refs == 0, timeout)
+
+
+class GenerationSlot:
+    """Giữ thế hệ hiện tại của một loại dữ liệu (``name`` dùng để đặt tên contextvar)."""
+
+    def __init__(self, name: str, data: Any):
+        self.name = name
+        self._current = Generation(0, data)
+        self._lock = threading.Lock()
+        self._pinned: contextvars.ContextVar = contextvars.ContextVar(f"generation:{name}", default=None)
+
+    @property
+    def current(self) -> Generation:
+        return self._current
+
+    def get(self) -> Generation:
+        """Thế hệ đã pin trong context hiện tại, hoặc thế hệ mới nhất nếu chưa pin."""
+        pinned = self._pinned.get()
+        return pinned if pinned is not None else self._current
+
+    @contextmanager
+    def pin(self) -> Iterator[Generation]:
+        pinned = self._pinned.get()
+        if pinned is not None:
+            # Đã pin ở tầng ngoài (ví dụ temporal_search gọi vector_engine.search)
+            yield pinned
+            return
+        with self._lock:
+            generation = self._current
+            generation.acquire()
+        token = self._pinned.set(generation)
+        try:
+            yield generation
+        finally:
+            generation.release()
+            try:
+                self._pinned.reset(token)
+            except ValueError:
+                # Generator (iter_temporal_search) bị đóng ở context khác: pin cũ tự mất theo context đó
+                pass
+
+    def swap(self, data: Any) -> Generation:
+        """Đặt thế hệ mới, trả về thế hệ cũ (có thể vẫn còn query đang giữ)."""
+        with self._lock:
+            old = self._current
+            self._current = Generation(old.number + 1, data)
+        return old
@@ -0,0 +1,235 @@
+"""
+Hot reload index FAISS và segment caches khi server đang chạy (``POST /admin/reload``).
+
+Một lần reload chạy nền:
+1. load (hoặc build) thế hệ index mới + path table, dựng segment caches mới,
+2. validate (số vector khớp path table, dim khớp thế hệ cũ, truy vấn thử có kết quả),
+3. swap: segment caches trước rồi tới index, nên query nào cũng thấy segment không cũ hơn index,
+4. drain: chờ các query đang giữ thế hệ cũ kết thúc rồi giải phóng nó.
+
+Query đang chạy không bị ảnh hưởng (xem generations.py); lỗi ở bước 1-2 thì giữ nguyên thế hệ cũ.
+``compact=true`` gộp delta log vào index chính trước bước 1 (xem delta_log.py).
+
+``ingest()`` (``POST /admin/ingest``) thêm vector mới vào delta segment mà không reload; không
+chạy song song với reload để thế hệ đang load không bỏ sót delta vừa ghi.
+
+Với ``API_WORKERS > 1`` mỗi worker giữ thế hệ riêng: worker nhận request ghi yêu cầu ra
+``RELOAD_SIGNAL_PATH``, các worker khác poll file này và tự reload với cùng tham số.
+"""
+
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from delta_log import compact, read_embedding_file
+from faiss_engine import FAISSSearchEngine
+from search_engine import SearchEngine
+
+
+class ReloadInProgress(RuntimeError):
+    pass
+
+
+class ReloadManager:
+    def __init__(
+        self,
+        faiss_engine: FAISSSearchEngine,
+        search_engine: SearchEngine,
+        drain_timeout: float = 120.0,
+        signal_path: Optional[str] = None,
+        poll_seconds: float = 5.0
+    ):
+        self.faiss_engine = faiss_engine
+        self.search_engine = search_engine
+        self.drain_timeout = drain_timeout
+        self.signal_path = Path(signal_path) if signal_path else None
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._job: Optional[Dict[str, Any]] = None
+        self._last_signal_id: Optional[str] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._ingesting = False
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            job = dict(self._job) if self._job else None
+        return {
+            "worker_pid": os.getpid(),
+            "index_generation": self.faiss_engine.generations.current.number,
+            "segment_generation": self.search_engine.segment_generations.current.number,
+            "job": job,
+        }
+
+    def start(self, request: Dict[str, Any], signal_id: Optional[str] = None, publish: bool = True) -> Dict[str, Any]:
+        """Bắt đầu reload nền. ReloadInProgress nếu đang có một lần reload chạy."""
+        with self._lock:
+            if self._job and self._job['status'] == 'running':
+                raise ReloadInProgress(f"Reload {self._job['id']} đang chạy (bước '{self._job['stage']}')")
+            if self._ingesting:
+                raise ReloadInProgress("Đang ingest vector mới")
+            job = {
+                'id': signal_id or uuid.uuid4().hex[:12],
+                'status': 'running',
+                'stage': 'queued',
+                'request': request,
+                'started_at': time.time(),
+                'finished_at': None,
+                'errors': [],
+            }
+            self._job = job
+            self._last_signal_id = job['id']
+        # Compaction chỉ chạy ở worker nhận request; các worker khác được báo sau khi gộp xong
+        if publish and not request.get('compact'):
+            self._publish(job['id'], request)
+        threading.Thread(target=self._run, args=(job, publish), name=f"reload-{job['id']}", daemon=True).start()
+        return dict(job)
+
+    def _set(self, job: Dict[str, Any], **fields):
+        with self._lock:
+            job.update(fields)
+
+    def _run(self, job: Dict[str, Any], publish: bool = False):
+        request = job['request']
+        reload_indexes = request.get('reload_indexes', True)
+        reload_segments = request.get('reload_segments', True)
+        try:
+            index_set = configs = caches = None
+            if request.get('compact'):
+                self._set(job, stage='compacting')
+                start = time.perf_counter()
+                merged = {}
+                for model_name, config in self.faiss_engine.configs.items():
+                    index_dir = (request.get('index_paths') or {}).get(model_name) or config.get('input_index_path')
+                    if index_dir:
+                        merged[model_name] = compact(index_dir)
+                self._set(job, compacted=merged, compact_s=round(time.perf_counter() - start, 2))
+                if publish:
+                    self._publish(job['id'], {**request, 'compact': False})
+
+            if reload_indexes:
+                self._set(job, stage='loading_indexes')
+                start = time.perf_counter()
+                index_set, configs = self.faiss_engine.load_index_set(
+                    request.get('index_paths'), build=request.get('build', False)
+                )
+                self._set(job, load_indexes_s=round(time.perf_counter() - start, 2))
+
+            if reload_segments:
+                self._set(job, stage='loading_segments')
+                start = time.perf_counter()
+                # Warm thế hệ mới bằng các video đang có trong cache (cache vốn lazy)
+                warm = list(self.search_engine.segment_generations.current.data.segments_cache)
+                caches = self.search_engine.load_segment_caches(request.get('segments_dir'), warm_videos=warm)
+                self._set(job, load_segments_s=round(time.perf_counter() - start, 2))
+
+            if index_set is not None:
+                self._set(job, stage='validating')
+                errors = self.faiss_engine.validate_index_set(index_set)
+                if errors:
+                    self._set(job, status='failed', errors=errors, finished_at=time.time())
+                    print(f"❌ Reload {job['id']} rejected: {errors}")
+                    return
+
+            self._set(job, stage='swapping')
+            old_segments = self.search_engine.swap_segment_caches(caches) if caches is not None else None
+            old_indexes = self.faiss_engine.swap_index_set(index_set, configs) if index_set is not None else None
+
+            self._set(job, stage='draining', index_generation=self.faiss_engine.generations.current.number,
+                      segment_generation=self.search_engine.segment_generations.current.number)
+            start = time.perf_counter()
+            drained = True
+            if old_segments is not None:
+                drained &= self.search_engine.release_segment_caches(old_segments, self.drain_timeout)
+            if old_indexes is not None:
+                drained &= self.faiss_engine.release_index_set(old_indexes, self.drain_timeout)
+            self._set(job, status='succeeded', stage='done', drained=drained,
+                      drain_s=round(time.perf_counter() - start, 2), finished_at=time.time())
+            print(f"✅ Reload {job['id']} done")
+        except Exception as e:
+            traceback.print_exc()
+            self._set(job, status='failed', errors=[str(e)], finished_at=time.time())
+
+    def ingest(self, embedding_paths: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Thêm vector từ các embedding pickle (model -> đường dẫn) vào delta segment của worker này,
+        rồi báo các worker khác load lại index (kèm delta log) qua file tín hiệu.
+        """
+        with self._lock:
+            if self._job and self._job['status'] == 'running':
+                raise ReloadInProgress(f"Reload {self._job['id']} đang chạy (bước '{self._job['stage']}')")
+            if self._ingesting:
+                raise ReloadInProgress("Đang ingest vector mới")
+            self._ingesting = True
+        try:
+            start = time.perf_counter()
+            # Đọc hết trước khi thêm: file lỗi không để lại ingest dở dang
+            loaded = {model_name: read_embedding_file(path) for model_name, path in embedding_paths.items()}
+            added = {
+                model_name: self.faiss_engine.add_vectors(model_name, paths, embeddings)
+                for model_name, (paths, embeddings) in loaded.items()
+            }
+            if any(added.values()):
+                signal_id = uuid.uuid4().hex[:12]
+                self._last_signal_id = signal_id
+                self._publish(signal_id, {'reload_indexes': True, 'reload_segments': False})
+            print(f"📥 Ingested {added} in {time.perf_counter() - start:.2f}s")
+            return {
+                "added": added,
+                "delta_vectors": {name: len(delta) for name, delta in self.faiss_engine.deltas.items()},
+                "index_generation": self.faiss_engine.generations.current.number,
+                "ingest_s": round(time.perf_counter() - start, 2),
+            }
+        finally:
+            with self._lock:
+                self._ingesting = False
+
+    # --- Đồng bộ giữa các worker qua file tín hiệu ---
+
+    def _publish(self, signal_id: str, request: Dict[str, Any]):
+        if self.signal_path is None:
+            return
+        try:
+            self.signal_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.signal_path.with_suffix(f".tmp{os.getpid()}")
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'id': signal_id, 'request': request, 'ts': time.time()}, f)
+            os.replace(tmp, self.signal_path)
+        except OSError as e:
+            print(f"⚠️ Could not publish reload signal to {self.signal_path}: {e}")
+
+    def _read_signal(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.signal_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def start_watcher(self):
+        """Poll file tín hiệu, reload khi worker khác nhận yêu cầu mới (chỉ cần khi API_WORKERS > 1)."""
+        if self.signal_path is None or self._watcher is not None:
+            return
+        # Reload trước khi worker (khởi động lại) chạy: nếu chỉ đọc lại cùng đường dẫn thì dữ liệu
+        # vừa load đã mới nhất; nếu có đường dẫn ghi đè thì vòng poll đầu tiên sẽ áp dụng lại
+        signal = self._read_signal()
+        if signal and not (signal['request'].get('index_paths') or signal['request'].get('segments_dir')):
+            self._last_signal_id = signal['id']
+
+        def watch():
+            while True:
+                time.sleep(self.poll_seconds)
+                signal = self._read_signal()
+                if not signal or signal['id'] == self._last_signal_id:
+                    continue
+                try:
+                    self.start(signal['request'], signal_id=signal['id'], publish=False)
+                    print(f"🔁 Reload {signal['id']} triggered by another worker")
+                except ReloadInProgress:
+                    pass  # thử lại ở vòng poll sau
+
+        self._watcher = threading.Thread(target=watch, name="reload-watcher", daemon=True)
+        self._watcher.start()
@@ -0,0 +1,120 @@
+"""
+Cache ảnh truy vấn theo SHA-256 nội dung, để client không phải upload lại cùng một ảnh.
+
+Backend poll cùng một session nhiều lần, mỗi lần gửi lại ảnh của các stage. Với cache này:
+
+- client gửi ``image_hashes`` (``{image_ref: sha256}``) thay cho ``image_files``; nếu worker
+  đã có bytes của hash đó thì dùng luôn, thiếu thì ``/search`` trả 409 kèm danh sách
+  ``missing_images`` và client gửi lại đúng các ảnh đó;
+- embedding của ảnh được cache theo (model, hash): ảnh đã gặp không decode + preprocess +
+  encode lại (xem ``ImageQuery`` và ``FAISSSearchEngine._encode_and_search``).
+
+Mỗi worker một cache riêng trong RAM (LRU theo tổng dung lượng bytes / số embedding).
+"""
+
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from tracing import span
+
+
+def image_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ImageQuery:
+    """
+    Ảnh truy vấn của một stage: hash + bytes, decode sang PIL chỉ khi cần encode.
+    Embedder nhận ``.image`` (PIL), như trước đây stage['image'].
+    """
+
+    __slots__ = ('sha256', 'data', '_image')
+
+    def __init__(self, sha256: str, data: bytes, image: Optional[Image.Image] = None):
+        self.sha256 = sha256
+        self.data = data
+        self._image = image
+
+    @property
+    def image(self) -> Image.Image:
+        if self._image is None:
+            with span("search.image_decode"):
+                self._image = Image.open(io.BytesIO(self.data)).convert('RGB')
+        return self._image
+
+    def __repr__(self) -> str:
+        return f"ImageQuery({self.sha256[:12]})"
+
+
+class ImageCache:
+    """LRU bytes ảnh (giới hạn theo MB) + LRU embedding theo (model, hash) (giới hạn theo số entry)."""
+
+    def __init__(self, max_bytes_mb: int = 256, max_embeddings: int = 4096):
+        self.max_bytes = max_bytes_mb * 1024 * 1024
+        self.max_embeddings = max_embeddings
+        self._lock = threading.Lock()
+        self._images: "OrderedDict[str, bytes]" = OrderedDict()
+        self._image_bytes = 0
+        self._embeddings: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.embedding_hits = 0
+
+    def put_image(self, data: bytes) -> str:
+        sha256 = image_hash(data)
+        if len(data) > self.max_bytes:
+            return sha256
+        with self._lock:
+            if sha256 in self._images:
+                self._images.move_to_end(sha256)
+                return sha256
+            self._images[sha256] = data
+            self._image_bytes += len(data)
+            while self._image_bytes > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self._image_bytes -= len(evicted)
+        return sha256
+
+    def get_image(self, sha256: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._images.get(sha256)
+            if data is None:
+                self.misses += 1
+                return None
+            self._images.move_to_end(sha256)
+            self.hits += 1
+            return data
+
+    def get_embedding(self, model_name: str, sha256: str) -> Optional[np.ndarray]:
+        with self._lock:
+            embedding = self._embeddings.get((model_name, sha256))
+            if embedding is not None:
+                self._embeddings.move_to_end((model_name, sha256))
+                self.embedding_hits += 1
+            return embedding
+
+    def put_embedding(self, model_name: str, sha256: str, embedding: np.ndarray):
+        if self.max_embeddings <= 0:
+            return
+        with self._lock:
+            self._embeddings[(model_name, sha256)] = embedding
+            self._embeddings.move_to_end((model_name, sha256))
+            while len(self._embeddings) > self.max_embeddings:
+                self._embeddings.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                'images': len(self._images),
+                'image_mb': round(self._image_bytes / (1024 * 1024), 2),
+                'embeddings': len(self._embeddings),
+                'hits': self.hits,
+                'misses': self.misses,
+                'embedding_hits': self.embedding_hits,
+            }
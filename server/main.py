@@ -1,18 +1,30 @@
+import asyncio
+import hmac
 import io
 import json
+import threading
 import time
 import traceback
-from typing import List, Optional, Dict, Any
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Tuple
 from PIL import Image
 from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import torch
 
 from config import settings
 from embedder import CLIPEmbedder
+from remote_embedder import RemoteEmbedder
 from meilisearch_service import MeiliSearchService
 from faiss_engine import FAISSSearchEngine
 from search_engine import SearchEngine
+from tracing import METRICS, record, span, trace_request
+from query_log import QueryLogger, result_frames, result_ids
+from encoding import encode_response
+from hot_reload import ReloadInProgress, ReloadManager
+from image_cache import ImageCache, ImageQuery, image_hash
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -34,12 +46,22 @@ app.add_middleware(
 meilisearch_service: MeiliSearchService = None
 faiss_search_engine: FAISSSearchEngine = None
 search_engine: SearchEngine = None
+query_logger: Optional[QueryLogger] = None
+reload_manager: Optional[ReloadManager] = None
+image_cache: Optional[ImageCache] = None
+
+
+def _create_embedder(model_name: str, pretrained: str, device: torch.device):
+    """Encoder trong process này, hoặc client tới encoder process dùng chung nếu có ENCODER_URL."""
+    if settings.encoder_url:
+        return RemoteEmbedder(settings.encoder_url, model_name, timeout=settings.encoder_timeout)
+    return CLIPEmbedder(device=device, model_name=model_name, pretrained=pretrained)
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize all search engines on startup"""
-    global meilisearch_service, faiss_search_engine, search_engine
+    global meilisearch_service, faiss_search_engine, search_engine, query_logger, reload_manager, image_cache
     
     print("🚀 Initializing search engines...")
     
@@ -51,7 +73,8 @@ async def startup_event():
         api_key=settings.meilisearch_api_key,
         ocr_datasets=settings.get_ocr_datasets(),
         subscript_datasets=settings.get_subtitle_datasets(),
-        limit_search=settings.meilisearch_limit_search
+        limit_search=settings.meilisearch_limit_search,
+        state_dir=settings.meilisearch_state_dir
     )
     
     # Create indices (they will be created if not exists)
@@ -71,15 +94,15 @@ async def startup_event():
     
     # 3. Initialize models and embedders
     print("\n🤖 Loading models...")
+    if settings.encoder_url:
+        print(f"🔗 Using shared encoder process at {settings.encoder_url}")
+    if settings.api_workers > 1 and not settings.index_mmap:
+        print("⚠️ API_WORKERS > 1 without INDEX_MMAP: every worker keeps its own copy of the indexes")
     models_config = []
     
     # Model 1
     if settings.model_1_input_index_path:
-        embedder_1 = CLIPEmbedder(
-            device=device_0,
-            model_name=settings.model_1_name,
-            pretrained=settings.model_1_pretrained,
-        )
+        embedder_1 = _create_embedder(settings.model_1_name, settings.model_1_pretrained, device_0)
         
         faiss_config_1 = {
             "model_name": settings.model_1_name,
@@ -97,11 +120,7 @@ async def startup_event():
     
     # Model 2
     if settings.model_2_input_index_path:
-        embedder_2 = CLIPEmbedder(
-            device=device_1,
-            model_name=settings.model_2_name,
-            pretrained=settings.model_2_pretrained,
-        )
+        embedder_2 = _create_embedder(settings.model_2_name, settings.model_2_pretrained, device_1)
         
         faiss_config_2 = {
             "model_name": settings.model_2_name,
@@ -119,7 +138,17 @@ async def startup_event():
     
     # 4. Initialize FAISS search engine
     print("\n🔍 Initializing FAISS search engine...")
-    faiss_search_engine = FAISSSearchEngine(list_faiss_configs=models_config)
+    image_cache = ImageCache(
+        max_bytes_mb=settings.image_cache_max_mb,
+        max_embeddings=settings.image_cache_max_embeddings
+    )
+    faiss_search_engine = FAISSSearchEngine(
+        list_faiss_configs=models_config,
+        microbatch_window_ms=settings.microbatch_window_ms,
+        microbatch_max_size=settings.microbatch_max_size,
+        mmap=settings.index_mmap,
+        image_cache=image_cache
+    )
     faiss_search_engine.load_all_indexes()
     print("✅ FAISS search engine initialized")
     
@@ -130,6 +159,25 @@ async def startup_event():
         ocr_engine=meilisearch_service,
         segments_dir=settings.segment_path
     )
+
+    reload_manager = ReloadManager(
+        faiss_search_engine,
+        search_engine,
+        drain_timeout=settings.reload_drain_timeout,
+        signal_path=settings.reload_signal_path if settings.api_workers > 1 else None,
+        poll_seconds=settings.reload_poll_seconds
+    )
+    if settings.api_workers > 1:
+        reload_manager.start_watcher()
+
+    if settings.query_log_enabled:
+        query_logger = QueryLogger(
+            settings.query_log_path,
+            max_mb=settings.query_log_max_mb,
+            backup_count=settings.query_log_backup_count,
+            store_images=settings.query_log_store_images
+        )
+        print(f"📝 Query log: {settings.query_log_path}")
     print("✅ All engines initialized successfully!\n")
 
 
@@ -151,11 +199,147 @@ async def health_check():
         "meilisearch": meilisearch_service is not None,
         "faiss_engine": faiss_search_engine is not None,
         "search_engine": search_engine is not None,
+        "faiss_microbatch": faiss_search_engine.microbatch_stats() if faiss_search_engine else {},
+        "index_mmap": settings.index_mmap,
+        "index_generation": faiss_search_engine.generations.current.number if faiss_search_engine else None,
+        "segment_generation": search_engine.segment_generations.current.number if search_engine else None,
+        "image_cache": image_cache.stats() if image_cache else None,
+        "encoder_url": settings.encoder_url or None,
         "gpu_available": torch.cuda.is_available(),
         "gpu_count": torch.cuda.device_count() if torch.cuda.is_available() else 0
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Histogram thời gian từng bước search (Prometheus text format)"""
+    return PlainTextResponse(METRICS.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def _parse_json_field(value: Any, field_name: str, expected_type: type, required: bool = False) -> Any:
+    """
+    Parse một tham số JSON (chuỗi trong form-data hoặc đã là object trong batch).
+    None/rỗng -> None (HTTP 400 nếu ``required``); sai định dạng -> HTTP 400.
+    """
+    if value in (None, ""):
+        if required:
+            raise HTTPException(status_code=400, detail=f"Thiếu tham số '{field_name}'.")
+        return None
+    type_label = "một mảng JSON" if expected_type is list else "một JSON object"
+    try:
+        parsed = json.loads(value) if isinstance(value, str) else value
+        if not isinstance(parsed, expected_type):
+            raise ValueError(f"{field_name} phải là {type_label}.")
+    except (json.JSONDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Lỗi phân tích '{field_name}': {e}")
+    return parsed
+
+
+async def _read_uploaded_images(image_files: Optional[List[UploadFile]]) -> Dict[str, bytes]:
+    """Đọc toàn bộ ảnh upload một lần (một ảnh có thể được nhiều stage/request tham chiếu)."""
+    return {file.filename: await file.read() for file in image_files or []}
+
+
+def _resolve_image(image_ref: str, image_bytes: Dict[str, bytes], image_hashes: Dict[str, str], label: str) -> Optional[ImageQuery]:
+    """
+    Ảnh của một image_ref: bytes upload trong request, hoặc bytes đã cache theo hash trong
+    ``image_hashes``. None nếu chỉ có hash mà worker chưa có ảnh đó (client phải gửi lại bytes).
+    """
+    data = image_bytes.get(image_ref)
+    if data is None:
+        sha256 = image_hashes.get(image_ref)
+        if not sha256:
+            raise HTTPException(status_code=400, detail=f"{label}Ảnh '{image_ref}' được tham chiếu nhưng không có trong 'image_files'.")
+        data = image_cache.get_image(sha256) if image_cache is not None else None
+        return ImageQuery(sha256, data) if data is not None else None
+
+    sha256 = image_hash(data)
+    if image_cache is not None and image_cache.get_image(sha256) is not None:
+        # Ảnh đã từng decode thành công: chỉ decode lại nếu embedding không còn trong cache
+        return ImageQuery(sha256, data)
+    try:
+        with span("search.image_decode"):
+            pil_image = Image.open(io.BytesIO(data)).convert('RGB')
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"{label}Không đọc được ảnh '{image_ref}': {e}")
+    if image_cache is not None:
+        image_cache.put_image(data)
+    return ImageQuery(sha256, data, pil_image)
+
+
+def _build_stages(
+    parsed_structure: List[Any],
+    image_bytes: Dict[str, bytes],
+    label: str = "",
+    image_hashes: Optional[Dict[str, str]] = None
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Xây dựng lại các stage cho temporal_search từ queries_structure.
+    Trả về (stages, stages dạng ghi query log: ảnh thay bằng SHA-256).
+    HTTP 409 (``missing_images``) nếu có image_ref chỉ gửi hash mà worker chưa có ảnh.
+    """
+    reconstructed_queries: List[Dict[str, Any]] = []
+    logged_stages: List[Dict[str, Any]] = []
+    missing_images: List[str] = []
+
+    def is_valid(value: Any) -> bool:
+        return value not in [None, "", "null"]
+
+    for i, stage_data in enumerate(parsed_structure):
+        if not isinstance(stage_data, dict):
+            raise HTTPException(status_code=400, detail=f"{label}Stage {i} phải là một object.")
+
+        current_stage = {}
+        if 'text' in stage_data and is_valid(stage_data['text']):
+            current_stage['text'] = stage_data['text']
+        if 'ocr' in stage_data and is_valid(stage_data['ocr']):
+            current_stage['ocr'] = stage_data['ocr']
+        if 'subtitle' in stage_data and is_valid(stage_data['subtitle']):
+            current_stage['subtitle'] = stage_data['subtitle']
+        if 'image_ref' in stage_data and is_valid(stage_data['image_ref']):
+            image_query = _resolve_image(stage_data['image_ref'], image_bytes, image_hashes or {}, label)
+            if image_query is None:
+                missing_images.append(stage_data['image_ref'])
+                continue
+            current_stage['image'] = image_query
+
+        if not current_stage:
+            raise HTTPException(status_code=400, detail=f"{label}Stage {i} không chứa truy vấn hợp lệ (text, ocr, hoặc image_ref).")
+
+        reconstructed_queries.append(current_stage)
+        if query_logger is not None:
+            logged_stage = {key: value for key, value in current_stage.items() if key != 'image'}
+            if 'image' in current_stage:
+                image = current_stage['image']
+                logged_stage['image_sha256'] = query_logger.add_image(image.sha256, image.data)
+            logged_stages.append(logged_stage)
+
+    if missing_images:
+        raise HTTPException(status_code=409, detail={
+            "message": f"{label}Chưa có ảnh cho các hash đã gửi, cần gửi lại trong 'image_files'.",
+            "missing_images": sorted(set(missing_images)),
+        })
+    return reconstructed_queries, logged_stages
+
+
+def _log_query(trace, logged_stages, parsed_weights, parsed_vector_models, k, temporal_time, results,
+               latency_ms=None, **extra):
+    if query_logger is None:
+        return
+    query_logger.log({
+        "stages": logged_stages,
+        "weights": parsed_weights,
+        "vector_models_config": parsed_vector_models,
+        "k": k,
+        "temporal_time": temporal_time,
+        "latency_ms": latency_ms if latency_ms is not None else trace.elapsed_ms(),
+        "timings": trace.to_list(),
+        "result_ids": result_ids(results),
+        "result_frames": result_frames(results),
+        **extra,
+    })
+
+
 @app.post("/search")
 async def handle_search(
     request: Request,
@@ -174,6 +358,12 @@ async def handle_search(
         description="Một danh sách chứa tất cả các file ảnh được tham chiếu trong 'queries_structure'."
     ),
 
+    image_hashes: Optional[str] = Form(
+        None,
+        description='(Optional) JSON {image_ref: sha256} cho ảnh không gửi kèm trong \'image_files\'. '
+                    'Worker chưa có ảnh thì trả 409 với danh sách \'missing_images\'.'
+    ),
+
     weights: Optional[str] = Form(
         None, 
         description='(Optional) Một chuỗi JSON chứa trọng số giữa các loại truy vấn. Ví dụ: \'{"text": 0.5, "ocr": 0.3, "image": 0.2}\''
@@ -182,106 +372,402 @@ async def handle_search(
     vector_models_config: Optional[str] = Form(
         None,
         description='(Optional) Một chuỗi JSON cấu hình các model vector và trọng số. Ví dụ: \'[{"model_name": "clip-vit-h", "weight": 0.7}, {"model_name": "clip-vit-l", "weight": 0.3}]\' '
-    )
+    ),
+
+    debug_timings: bool = Form(False, description="(Optional) Trả về thời gian từng bước (span) trong response.")
 ):
     """
     Thực hiện Temporal Search với cấu hình đa mô hình và trọng số tùy chỉnh.
     """
 
-    try:
-        # --- 1. Phân tích các tham số đầu vào (dưới dạng chuỗi JSON) ---
+    with trace_request() as trace:
         try:
-            parsed_structure = json.loads(queries_structure)
-            if not isinstance(parsed_structure, list):
-                raise ValueError("queries_structure phải là một mảng JSON.")
-        except (json.JSONDecodeError, ValueError) as e:
-            raise HTTPException(status_code=400, detail=f"Lỗi phân tích 'queries_structure': {e}")
-
-        parsed_weights = None
-        if weights:
-            try:
-                parsed_weights = json.loads(weights)
-                if not isinstance(parsed_weights, dict):
-                    raise ValueError("weights phải là một JSON object.")
-            except (json.JSONDecodeError, ValueError) as e:
-                raise HTTPException(status_code=400, detail=f"Lỗi phân tích 'weights': {e}")
+            # --- 1 & 2. Phân tích tham số và xây dựng lại truy vấn với dữ liệu ảnh ---
+            parse_start = time.perf_counter()
+            parsed_structure = _parse_json_field(queries_structure, 'queries_structure', list, required=True)
+            parsed_weights = _parse_json_field(weights, 'weights', dict)
+            parsed_vector_models = _parse_json_field(vector_models_config, 'vector_models_config', list)
+            parsed_hashes = _parse_json_field(image_hashes, 'image_hashes', dict)
+            image_bytes = await _read_uploaded_images(image_files)
+            reconstructed_queries, logged_stages = _build_stages(parsed_structure, image_bytes, image_hashes=parsed_hashes)
+            record("search.parse", parse_start)
+
+            # --- 3. Gọi hàm tìm kiếm với đầy đủ các tham số đã được phân tích ---
+            # Chạy trong threadpool để không chặn event loop: các /search đồng thời mới
+            # chạy song song và được gom micro-batch ở tầng encode + FAISS
+            results = await run_in_threadpool(
+                search_engine.temporal_search,
+                queries=reconstructed_queries, 
+                k=k,
+                time_distance=temporal_time,
+                weights=parsed_weights,
+                # Truyền cấu hình đa mô hình vào đây
+                vector_models_config=parsed_vector_models,
+                format = 'shot'
+            )
+
         
-        # --- THÊM LOGIC PHÂN TÍCH CHO vector_models_config ---
-        parsed_vector_models = None
-        if vector_models_config:
+            # --- 4. Trả kết quả ---
+            response = {
+                "status": "success",
+                "k_requested": k,
+                "results_found": len(results),
+                "query_details": {
+                     "stages_processed": len(reconstructed_queries),
+                     "fusion_weights_used": parsed_weights,
+                     "vector_models_used": parsed_vector_models
+                },
+                "results": results,
+            }
+            if debug_timings:
+                response["debug_timings"] = trace.to_list()
+            # Cùng một thời điểm đo cho query log và header Server-Timing: bench/replay.py so
+            # latency phía server của candidate với latency_ms đã ghi trong log
+            server_ms = trace.elapsed_ms()
+            _log_query(trace, logged_stages, parsed_weights, parsed_vector_models, k, temporal_time, results,
+                       latency_ms=server_ms)
+            # JSON mặc định, hoặc dạng gọn (orjson/msgpack) nếu client gửi Accept tương ứng
+            http_response = encode_response(response, request.headers.get("accept"))
+            http_response.headers["Server-Timing"] = f"app;dur={server_ms}"
+            return http_response
+
+        except HTTPException as http_exc:
+            # Ghi log lỗi và re-raise để FastAPI xử lý
+            print(f"❌ API Error: {http_exc.status_code}, Detail: {http_exc.detail}")
+            raise http_exc
+
+        except Exception as e:
+            # Ghi log lỗi hệ thống để debug
+            print(f"❌ Unhandled System Error: {e}")
+            traceback.print_exc()
+            raise HTTPException(status_code=500, detail=f"Lỗi hệ thống không mong muốn: {str(e)}")
+
+
+@app.post("/search/stream")
+async def handle_search_stream(
+    k: int = Form(10, description="Số lượng chuỗi video kết quả cuối cùng cần trả về."),
+
+    temporal_time: int = Form(10, description="Thời gian tối đa giữa hai frame"),
+
+    queries_structure: str = Form(
+        ...,
+        description='Một chuỗi JSON mô tả các stage. Ví dụ: \'[{"text": "a plane"}, {"ocr": "spirit"}]\' '
+    ),
+
+    image_files: Optional[List[UploadFile]] = Form(
+        [],
+        description="Một danh sách chứa tất cả các file ảnh được tham chiếu trong 'queries_structure'."
+    ),
+
+    image_hashes: Optional[str] = Form(
+        None,
+        description='(Optional) JSON {image_ref: sha256} cho ảnh không gửi kèm trong \'image_files\'. '
+                    'Worker chưa có ảnh thì trả 409 với danh sách \'missing_images\'.'
+    ),
+
+    weights: Optional[str] = Form(None, description="(Optional) Giống /search."),
+
+    vector_models_config: Optional[str] = Form(None, description="(Optional) Giống /search."),
+
+    preview_size: int = Form(20, description="Số ứng viên thô mỗi (stage, modality) trong sự kiện preview. 0 = không gửi preview."),
+
+    debug_timings: bool = Form(False, description="(Optional) Gửi thời gian từng bước (span) trong sự kiện done.")
+):
+    """
+    Temporal Search dạng stream NDJSON (mỗi dòng một JSON object):
+    - ``{"type": "preview", "stage", "modality", "candidates": [[path, score], ...]}``: ứng viên
+      thô của từng modality, gửi ngay sau bước retrieve;
+    - ``{"type": "chain", "rank", "chain"}``: từng chain theo thứ tự điểm, ngay khi được expand xong
+      (``chain`` cùng định dạng phần tử ``results`` của /search);
+    - ``{"type": "done", "results_found", ...}`` hoặc ``{"type": "error", "detail"}`` ở cuối.
+    """
+    # Lỗi tham số vẫn trả HTTP 400 như /search, trước khi bắt đầu stream
+    parsed_structure = _parse_json_field(queries_structure, 'queries_structure', list, required=True)
+    parsed_weights = _parse_json_field(weights, 'weights', dict)
+    parsed_vector_models = _parse_json_field(vector_models_config, 'vector_models_config', list)
+    parsed_hashes = _parse_json_field(image_hashes, 'image_hashes', dict)
+    image_bytes = await _read_uploaded_images(image_files)
+    reconstructed_queries, logged_stages = _build_stages(parsed_structure, image_bytes, image_hashes=parsed_hashes)
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancelled = threading.Event()
+    end_of_stream = object()
+
+    def produce():
+        # Toàn bộ search chạy trên một thread (trace + generator cùng một context)
+        with trace_request() as trace:
             try:
-                parsed_vector_models = json.loads(vector_models_config)
-                if not isinstance(parsed_vector_models, list):
-                    raise ValueError("vector_models_config phải là một mảng JSON.")
-                # (Tùy chọn) Thêm kiểm tra sâu hơn cho từng phần tử trong mảng nếu cần
-            except (json.JSONDecodeError, ValueError) as e:
-                 raise HTTPException(status_code=400, detail=f"Lỗi phân tích 'vector_models_config': {e}")
-
-
-        # --- 2. Xây dựng lại truy vấn với dữ liệu ảnh ---
-        uploaded_images = {file.filename: file for file in image_files}
-        reconstructed_queries: List[Dict[str, Any]] = []
-
-        def is_valid(value: Any) -> bool:
-            return value not in [None, "", "null"]
-
-        for i, stage_data in enumerate(parsed_structure):
-            if not isinstance(stage_data, dict):
-                raise HTTPException(status_code=400, detail=f"Stage {i} phải là một object.")
-
-            current_stage = {}
-            if 'text' in stage_data and is_valid(stage_data['text']):
-                current_stage['text'] = stage_data['text']
-            if 'ocr' in stage_data and is_valid(stage_data['ocr']):
-                current_stage['ocr'] = stage_data['ocr']
-            if 'subtitle' in stage_data and is_valid(stage_data['subtitle']):
-                current_stage['subtitle'] = stage_data['subtitle']
-            if 'image_ref' in stage_data and is_valid(stage_data['image_ref']):
-                image_filename = stage_data['image_ref']
-                if image_filename not in uploaded_images:
-                    raise HTTPException(status_code=400, detail=f"Ảnh '{image_filename}' được tham chiếu nhưng không có trong 'image_files'.")
-                
-                image_file = uploaded_images[image_filename]
-                image_data = await image_file.read()
-                pil_image = Image.open(io.BytesIO(image_data)).convert('RGB')
-                current_stage['image'] = pil_image
-
-            if not current_stage:
-                raise HTTPException(status_code=400, detail=f"Stage {i} không chứa truy vấn hợp lệ (text, ocr, hoặc image_ref).")
-
-            reconstructed_queries.append(current_stage)
-        # --- 3. Gọi hàm tìm kiếm với đầy đủ các tham số đã được phân tích ---
-        results = search_engine.temporal_search(
-            queries=reconstructed_queries, 
-            k=k,
-            time_distance=temporal_time,
-            weights=parsed_weights,
-            # Truyền cấu hình đa mô hình vào đây
-            vector_models_config=parsed_vector_models,
-            format = 'shot'
-        )
+                results = []
+                for kind, payload in search_engine.iter_temporal_search(
+                    queries=reconstructed_queries,
+                    k=k,
+                    time_distance=temporal_time,
+                    weights=parsed_weights,
+                    vector_models_config=parsed_vector_models,
+                    format='shot',
+                    preview_size=preview_size
+                ):
+                    if cancelled.is_set():
+                        return
+                    if kind == 'chain':
+                        event = {"type": "chain", "rank": len(results), "chain": payload}
+                        results.append(payload)
+                    else:
+                        event = {"type": kind, **payload}
+                    loop.call_soon_threadsafe(queue.put_nowait, event)
 
-        
-        # --- 4. Trả kết quả ---
-        return {
-            "status": "success",
-            "k_requested": k,
-            "results_found": len(results),
-            "query_details": {
-                 "stages_processed": len(reconstructed_queries),
-                 "fusion_weights_used": parsed_weights,
-                 "vector_models_used": parsed_vector_models
-            },
-            "results": results,
-        }
+                done = {"type": "done", "k_requested": k, "results_found": len(results)}
+                if debug_timings:
+                    done["debug_timings"] = trace.to_list()
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+                _log_query(trace, logged_stages, parsed_weights, parsed_vector_models, k, temporal_time, results, stream=True)
+            except Exception as e:
+                print(f"❌ Stream search error: {e}")
+                traceback.print_exc()
+                loop.call_soon_threadsafe(queue.put_nowait, {"type": "error", "detail": f"Lỗi hệ thống không mong muốn: {str(e)}"})
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, end_of_stream)
 
-    except HTTPException as http_exc:
-        # Ghi log lỗi và re-raise để FastAPI xử lý
-        print(f"❌ API Error: {http_exc.status_code}, Detail: {http_exc.detail}")
-        raise http_exc
+    async def event_stream():
+        # Giữ tham chiếu: event loop chỉ giữ weak reference tới task
+        producer = asyncio.ensure_future(run_in_threadpool(produce))
+        try:
+            while True:
+                event = await queue.get()
+                if event is end_of_stream:
+                    break
+                yield json.dumps(event, ensure_ascii=False, default=float) + "\n"
+        finally:
+            # Client ngắt kết nối: báo cho producer dừng ở sự kiện kế tiếp rồi chờ thread kết thúc
+            cancelled.set()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                # Request bị huỷ trong lúc chờ: thread vẫn tự dừng nhờ cờ ``cancelled``
+                producer.cancel()
+                raise
 
-    except Exception as e:
-        # Ghi log lỗi hệ thống để debug
-        print(f"❌ Unhandled System Error: {e}")
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Lỗi hệ thống không mong muốn: {str(e)}")
\ No newline at end of file
+    return StreamingResponse(
+        event_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/search/batch")
+async def handle_search_batch(
+    request: Request,
+
+    batch_structure: str = Form(
+        ...,
+        description='Một chuỗi JSON là mảng các request, mỗi phần tử có "queries_structure" (mảng stage như /search) '
+                    'và tuỳ chọn "k", "temporal_time", "weights", "vector_models_config". '
+                    'Ví dụ: \'[{"queries_structure": [{"text": "a plane"}], "k": 10}, {"queries_structure": [{"text": "a red plane"}]}]\' '
+    ),
+
+    image_files: Optional[List[UploadFile]] = Form(
+        [],
+        description="Tất cả các file ảnh được tham chiếu (image_ref) trong các request của batch."
+    ),
+
+    image_hashes: Optional[str] = Form(
+        None,
+        description='(Optional) JSON {image_ref: sha256} cho ảnh không gửi kèm trong \'image_files\'. '
+                    'Worker chưa có ảnh thì trả 409 với danh sách \'missing_images\'.'
+    ),
+
+    debug_timings: bool = Form(False, description="(Optional) Trả về thời gian từng bước (span) của cả batch.")
+):
+    """
+    Nhiều temporal search trong một request. Các truy vấn vector của cả batch được encode và
+    tìm trên FAISS cùng lúc (một encode_batch + một index.search mỗi model), fusion và
+    temporal matching chạy riêng cho từng request. Kết quả trả về theo đúng thứ tự.
+    """
+    with trace_request() as trace:
+        try:
+            parse_start = time.perf_counter()
+            parsed_batch = _parse_json_field(batch_structure, 'batch_structure', list, required=True)
+            if len(parsed_batch) > settings.search_batch_max_size:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Batch có {len(parsed_batch)} request, tối đa {settings.search_batch_max_size}."
+                )
+            parsed_hashes = _parse_json_field(image_hashes, 'image_hashes', dict)
+            image_bytes = await _read_uploaded_images(image_files)
+
+            batch_requests, logged, missing_images = [], [], []
+            for idx, item in enumerate(parsed_batch):
+                label = f"Request {idx}: "
+                if not isinstance(item, dict):
+                    raise HTTPException(status_code=400, detail=f"{label}phải là một object.")
+                try:
+                    k = int(item.get('k', 10))
+                    temporal_time = int(item.get('temporal_time', 10))
+                except (TypeError, ValueError):
+                    raise HTTPException(status_code=400, detail=f"{label}'k' và 'temporal_time' phải là số nguyên.")
+                parsed_structure = _parse_json_field(item.get('queries_structure'), 'queries_structure', list, required=True)
+                parsed_weights = _parse_json_field(item.get('weights'), 'weights', dict)
+                parsed_vector_models = _parse_json_field(item.get('vector_models_config'), 'vector_models_config', list)
+                try:
+                    stages, logged_stages = _build_stages(parsed_structure, image_bytes, label, parsed_hashes)
+                except HTTPException as e:
+                    if e.status_code != 409:
+                        raise
+                    # Gom ảnh thiếu của cả batch vào một lần 409
+                    missing_images.extend(e.detail["missing_images"])
+                    continue
+                batch_requests.append({
+                    'queries': stages,
+                    'k': k,
+                    'time_distance': temporal_time,
+                    'weights': parsed_weights,
+                    'vector_models_config': parsed_vector_models,
+                })
+                logged.append(logged_stages)
+            if missing_images:
+                raise HTTPException(status_code=409, detail={
+                    "message": "Chưa có ảnh cho các hash đã gửi, cần gửi lại trong 'image_files'.",
+                    "missing_images": sorted(set(missing_images)),
+                })
+            record("search.parse", parse_start)
+
+            batch_results = await run_in_threadpool(search_engine.temporal_search_batch, batch_requests, format='shot')
+
+            responses = []
+            for req, logged_stages, results in zip(batch_requests, logged, batch_results):
+                if results is None:
+                    responses.append({"status": "error", "detail": "Temporal search thất bại cho request này."})
+                    continue
+                responses.append({
+                    "status": "success",
+                    "k_requested": req['k'],
+                    "results_found": len(results),
+                    "query_details": {
+                        "stages_processed": len(req['queries']),
+                        "fusion_weights_used": req['weights'],
+                        "vector_models_used": req['vector_models_config']
+                    },
+                    "results": results,
+                })
+                _log_query(
+                    trace, logged_stages, req['weights'], req['vector_models_config'],
+                    req['k'], req['time_distance'], results, batch_size=len(batch_requests)
+                )
+
+            response = {"status": "success", "batch_size": len(batch_requests), "responses": responses}
+            if debug_timings:
+                response["debug_timings"] = trace.to_list()
+            return encode_response(response, request.headers.get("accept"))
+
+        except HTTPException as http_exc:
+            print(f"❌ API Error: {http_exc.status_code}, Detail: {http_exc.detail}")
+            raise http_exc
+
+        except Exception as e:
+            print(f"❌ Unhandled System Error: {e}")
+            traceback.print_exc()
+            raise HTTPException(status_code=500, detail=f"Lỗi hệ thống không mong muốn: {str(e)}")
+
+
+def _check_admin(request: Request):
+    # Không đặt ADMIN_TOKEN thì endpoint admin bị tắt hẳn (không mở cho mọi người)
+    if not settings.admin_token:
+        raise HTTPException(status_code=503, detail="Endpoint admin bị tắt: chưa đặt ADMIN_TOKEN.")
+    token = request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(token.encode(), settings.admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Sai hoặc thiếu header 'X-Admin-Token'.")
+
+
+def _resolve_ingest_paths(embedding_paths: Dict[str, Any]) -> Dict[str, str]:
+    """Đường dẫn embedding đã resolve; chỉ chấp nhận file nằm trong ``INGEST_DIR`` (file được unpickle)."""
+    if not settings.ingest_dir:
+        raise HTTPException(status_code=503, detail="Ingest bị tắt: chưa đặt INGEST_DIR.")
+    root = Path(settings.ingest_dir).resolve()
+    resolved = {}
+    for model_name, path in embedding_paths.items():
+        if not isinstance(path, str) or not path:
+            raise HTTPException(status_code=400, detail=f"Đường dẫn embedding của '{model_name}' không hợp lệ.")
+        # resolve() theo symlink / '..' trước khi so với thư mục gốc
+        candidate = (root / path).resolve()
+        if not candidate.is_relative_to(root):
+            raise HTTPException(status_code=400, detail=f"'{path}' nằm ngoài INGEST_DIR.")
+        resolved[model_name] = str(candidate)
+    return resolved
+
+
+@app.post("/admin/reload", status_code=202)
+async def handle_admin_reload(
+    request: Request,
+
+    index_paths: Optional[str] = Form(
+        None,
+        description='(Optional) JSON object model -> thư mục index mới. Ví dụ: \'{"ViT-L-16-SigLIP-256": "/lucifer_data/faiss-index/v2"}\'. '
+                    'Bỏ trống để đọc lại đường dẫn hiện tại.'
+    ),
+    build: bool = Form(False, description="(Optional) Build index mới từ embeddings thay vì load từ đĩa."),
+    reload_indexes: bool = Form(True, description="(Optional) Reload index FAISS."),
+    reload_segments: bool = Form(True, description="(Optional) Reload segment caches."),
+    segments_dir: Optional[str] = Form(None, description="(Optional) Thư mục segments mới."),
+    compact: bool = Form(False, description="(Optional) Gộp delta log (vector đã ingest) vào index chính trước khi load.")
+):
+    """
+    Load/build thế hệ index + segment caches mới ở nền, validate rồi swap mà không restart.
+    Query đang chạy tiếp tục trên thế hệ cũ tới khi xong. Theo dõi tiến độ bằng ``GET /admin/reload``.
+    """
+    _check_admin(request)
+    if reload_manager is None:
+        raise HTTPException(status_code=503, detail="Search engine chưa sẵn sàng.")
+    reload_request = {
+        'index_paths': _parse_json_field(index_paths, 'index_paths', dict),
+        'build': build,
+        'reload_indexes': reload_indexes,
+        'reload_segments': reload_segments,
+        'segments_dir': segments_dir,
+        'compact': compact,
+    }
+    try:
+        job = reload_manager.start(reload_request)
+    except ReloadInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "accepted", "job": job}
+
+
+@app.get("/admin/reload")
+async def handle_admin_reload_status(request: Request):
+    _check_admin(request)
+    if reload_manager is None:
+        raise HTTPException(status_code=503, detail="Search engine chưa sẵn sàng.")
+    return reload_manager.status()
+
+
+@app.post("/admin/ingest")
+async def handle_admin_ingest(
+    request: Request,
+
+    embedding_paths: str = Form(
+        ...,
+        description='JSON object model -> embedding pickle ({"paths", "embeddings"}) của keyframe mới, nằm trong INGEST_DIR '
+                    '(đường dẫn tuyệt đối hoặc tương đối với INGEST_DIR). '
+                    'Ví dụ: \'{"ViT-L-16-SigLIP-256": "/lucifer_data/embeddings/new_videos.pkl"}\''
+    )
+):
+    """
+    Thêm keyframe mới vào index mà không build lại: vector được ghi vào delta log cạnh index
+    và tìm cùng index chính ngay sau khi request trả về. Gộp định kỳ bằng ``compact=true``
+    trên ``POST /admin/reload`` (hoặc ``python delta_log.py <index_dir>``).
+    """
+    _check_admin(request)
+    if reload_manager is None:
+        raise HTTPException(status_code=503, detail="Search engine chưa sẵn sàng.")
+    parsed_paths = _resolve_ingest_paths(_parse_json_field(embedding_paths, 'embedding_paths', dict, required=True))
+    unknown = [name for name in parsed_paths if name not in faiss_search_engine.indexes]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Model chưa có index: {unknown}")
+    try:
+        result = await run_in_threadpool(reload_manager.ingest, parsed_paths)
+    except ReloadInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except (OSError, ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"Không ingest được: {e}")
+    return {"status": "success", **result}
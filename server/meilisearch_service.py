@@ -1,111 +1,22 @@
-import json
 import os
+import sys
 import threading
 from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 import meilisearch
-from rapidfuzz import fuzz
 import time
-from tqdm import tqdm
 
+# meili_common nằm ở thư mục gốc của repo (trong container: /meili_common)
+_REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
 
-class Score2Text:
-    def __init__(self, w_partial=1, w_ngrams=1, w_token=1):
-        self.w_partial = w_partial
-        self.w_ngrams = w_ngrams
-        self.w_token = w_token
+from meili_common.indexer import BulkIndexer
+from meili_common.client import MeiliHttpClient, MeiliSearcher
+from meili_common.scoring import FuzzyScorer
+from meili_common.text import remove_vietnamese_accents, expansion_query
 
-    def custom_partial_ratio(self, q_no_space, d_no_space):
-        len_q = len(q_no_space)
-        len_d = len(d_no_space)
-        if len_q == 0:
-            return 0
-        if len_q >= len_d:
-            return fuzz.ratio(q_no_space, d_no_space)/100
-        else:
-            return fuzz.partial_ratio(q_no_space, d_no_space)/100
-
-    @staticmethod
-    def generate_ngrams(tokens, n_values=(1,)):
-        results = {}
-        for n in n_values:
-            ngrams = [" ".join(tokens[i:i+n]) for i in range(len(tokens)-n+1)]
-            results[n] = ngrams
-        return results
-        
-    def custom_ngrams_ratio(self, q_split, d_split):
-        len_q = len(q_split)
-        q = ' '.join(q_split)
-        if len_q == 0:
-            return 0
-        if len_q > 1:
-            n_values = (len_q - 1, len_q)
-        else:
-            n_values = (len_q, )
-        ngrams = self.generate_ngrams(d_split, n_values)
-        best = 0
-        for ngram in ngrams.values():
-            for text in ngram:
-                score = fuzz.ratio(q, text)
-                best = max(best, score)
-        return best/100
-
-    def custom_token_ratio(self, q, d):
-        return fuzz.token_set_ratio(q, d)/100
-            
-    def w_score(self, q, d):
-        q_split = q.split()
-        d_split = d.split()
-        q_no_space = ''.join(q_split)
-        d_no_space = ''.join(d_split)
-        partial = self.custom_partial_ratio(q_no_space, d_no_space)
-        ngrams = self.custom_ngrams_ratio(q_split, d_split)
-        token = self.custom_token_ratio(q, d)
-        return (self.w_partial*partial + self.w_ngrams*ngrams + self.w_token*token)/(self.w_partial + self.w_ngrams + self.w_token)
-
-
-def remove_vietnamese_accents(text: str) -> str:
-    """
-    Remove Vietnamese diacritics/accents to match processed dataset format
-    """
-    vietnamese_map = {
-        'à': 'a', 'á': 'a', 'ả': 'a', 'ã': 'a', 'ạ': 'a',
-        'ă': 'a', 'ằ': 'a', 'ắ': 'a', 'ẳ': 'a', 'ẵ': 'a', 'ặ': 'a',
-        'â': 'a', 'ầ': 'a', 'ấ': 'a', 'ẩ': 'a', 'ẫ': 'a', 'ậ': 'a',
-        'è': 'e', 'é': 'e', 'ẻ': 'e', 'ẽ': 'e', 'ẹ': 'e',
-        'ê': 'e', 'ề': 'e', 'ế': 'e', 'ể': 'e', 'ễ': 'e', 'ệ': 'e',
-        'ì': 'i', 'í': 'i', 'ỉ': 'i', 'ĩ': 'i', 'ị': 'i',
-        'ò': 'o', 'ó': 'o', 'ỏ': 'o', 'õ': 'o', 'ọ': 'o',
-        'ô': 'o', 'ồ': 'o', 'ố': 'o', 'ổ': 'o', 'ỗ': 'o', 'ộ': 'o',
-        'ơ': 'o', 'ờ': 'o', 'ớ': 'o', 'ở': 'o', 'ỡ': 'o', 'ợ': 'o',
-        'ù': 'u', 'ú': 'u', 'ủ': 'u', 'ũ': 'u', 'ụ': 'u',
-        'ư': 'u', 'ừ': 'u', 'ứ': 'u', 'ử': 'u', 'ữ': 'u', 'ự': 'u',
-        'ỳ': 'y', 'ý': 'y', 'ỷ': 'y', 'ỹ': 'y', 'ỵ': 'y',
-        'đ': 'd',
-        # Uppercase versions
-        'À': 'A', 'Á': 'A', 'Ả': 'A', 'Ã': 'A', 'Ạ': 'A',
-        'Ă': 'A', 'Ằ': 'A', 'Ắ': 'A', 'Ẳ': 'A', 'Ẵ': 'A', 'Ặ': 'A',
-        'Â': 'A', 'Ầ': 'A', 'Ấ': 'A', 'Ẩ': 'A', 'Ẫ': 'A', 'Ậ': 'A',
-        'È': 'E', 'É': 'E', 'Ẻ': 'E', 'Ẽ': 'E', 'Ẹ': 'E',
-        'Ê': 'E', 'Ề': 'E', 'Ế': 'E', 'Ể': 'E', 'Ễ': 'E', 'Ệ': 'E',
-        'Ì': 'I', 'Í': 'I', 'Ỉ': 'I', 'Ĩ': 'I', 'Ị': 'I',
-        'Ò': 'O', 'Ó': 'O', 'Ỏ': 'O', 'Õ': 'O', 'Ọ': 'O',
-        'Ô': 'O', 'Ồ': 'O', 'Ố': 'O', 'Ổ': 'O', 'Ỗ': 'O', 'Ộ': 'O',
-        'Ơ': 'O', 'Ờ': 'O', 'Ớ': 'O', 'Ở': 'O', 'Ỡ': 'O', 'Ợ': 'O',
-        'Ù': 'U', 'Ú': 'U', 'Ủ': 'U', 'Ũ': 'U', 'Ụ': 'U',
-        'Ư': 'U', 'Ừ': 'U', 'Ứ': 'U', 'Ử': 'U', 'Ữ': 'U', 'Ự': 'U',
-        'Ỳ': 'Y', 'Ý': 'Y', 'Ỷ': 'Y', 'Ỹ': 'Y', 'Ỵ': 'Y',
-        'Đ': 'D'
-    }
-    
-    result = ""
-    for char in text:
-        if char in vietnamese_map:
-            result += vietnamese_map[char]
-        else:
-            result += char
-    
-    return result
+from tracing import span
 
 
 class SingletonMeta(type):
@@ -150,7 +61,8 @@ class MeiliSearchService(metaclass=SingletonMeta):
         api_key: str = "meilisearch-api-key", 
         ocr_datasets: List[Tuple[str, str]] = None, 
         subscript_datasets: List[Tuple[str, str]] = None, 
-        limit_search: int = 500
+        limit_search: int = 500,
+        state_dir: Optional[str] = None
     ):
         # Chỉ khởi tạo nếu chưa được khởi tạo (singleton check)
         if hasattr(self, '_initialized'):
@@ -161,8 +73,10 @@ class MeiliSearchService(metaclass=SingletonMeta):
         self.api_key = api_key
         self.url = f"http://{host}:{port}"
         
-        # Tạo sync client
+        # Tạo sync client (quản lý index / indexing)
         self.client = meilisearch.Client(self.url, api_key)
+        # HTTP session có pool dùng cho search
+        self.http = MeiliHttpClient(self.url, api_key)
         
         # Cấu hình datasets
         self.ocr_datasets = ocr_datasets if ocr_datasets is not None else []
@@ -170,9 +84,11 @@ class MeiliSearchService(metaclass=SingletonMeta):
         self.ocr_index_names = [index_name for _, index_name in self.ocr_datasets]
         self.subscript_index_names = [index_name for _, index_name in self.subscript_datasets]
         self.limit_search = limit_search
+        # Thư mục lưu checkpoint của BulkIndexer
+        self.state_dir = state_dir
         
         # Initialize scoring
-        self.scoring = Score2Text()
+        self.searcher = MeiliSearcher(self.http, FuzzyScorer())
         
         self._initialized = True
     
@@ -184,12 +100,13 @@ class MeiliSearchService(metaclass=SingletonMeta):
         api_key: str = "meilisearch-api-key", 
         ocr_datasets: List[Tuple[str, str]] = None, 
         subscript_datasets: List[Tuple[str, str]] = None, 
-        limit_search: int = 500
+        limit_search: int = 500,
+        state_dir: Optional[str] = None
     ):
         """
         Get singleton instance (alternative way to access)
         """
-        return cls(host, port, api_key, ocr_datasets, subscript_datasets, limit_search)
+        return cls(host, port, api_key, ocr_datasets, subscript_datasets, limit_search, state_dir)
 
     def create_indices(self):
         """
@@ -217,7 +134,7 @@ class MeiliSearchService(metaclass=SingletonMeta):
                     try:
                         settings = {
                             'searchableAttributes': ['text'],
-                            'displayedAttributes': ['video_name', 'frame_index', 'text'],
+                            'displayedAttributes': ['video_name', 'frame_index', 'start_frame', 'end_frame', 'text'],
                             'filterableAttributes': ['video_name', 'frame_index'],
                             'sortableAttributes': [],
                             'rankingRules': [
@@ -253,97 +170,61 @@ class MeiliSearchService(metaclass=SingletonMeta):
             print(f"Error in create_indices: {e}")
             raise
 
-    def index_all_dataset(self):
+    def index_all_dataset(
+        self,
+        reset: bool = False,
+        workers: Optional[int] = None,
+        batch_bytes: int = 8 * 1024 * 1024,
+        max_in_flight: int = 4
+    ):
+        """
+        Index toàn bộ OCR/subtitle datasets bằng BulkIndexer (parse song song,
+        batch NDJSON theo bytes, chờ và kiểm tra từng task, có checkpoint để resume).
+        """
         try:
             total_start = time.time()
             overall_success = 0
             overall_failed = 0
-            
-            BATCH_FILE_COUNT = 100 
+            overall_docs = 0
+
+            indexer = BulkIndexer(
+                self.client,
+                workers=workers,
+                batch_bytes=batch_bytes,
+                max_in_flight=max_in_flight,
+                state_dir=self.state_dir
+            )
+
+            # Subtitle index theo span (start_frame, end_frame), OCR index theo frame
+            datasets = [(data_path, index_name, False) for data_path, index_name in self.ocr_datasets]
+            datasets += [(data_path, index_name, True) for data_path, index_name in self.subscript_datasets]
 
-            for data_path, index_name in self.ocr_datasets + self.subscript_datasets:
+            for data_path, index_name, spans in datasets:
                 if not os.path.exists(data_path):
                     print(f"Bỏ qua {index_name}: Thư mục {data_path} không tồn tại")
                     continue
 
                 print(f"\nBắt đầu index {index_name}...")
-                start_time = time.time()
-                successful_files = 0
-                failed_files = 0
-
-                json_files = list(Path(data_path).rglob('*.json'))
-                if not json_files:
-                    print(f"Không tìm thấy file JSON nào trong {data_path}")
-                    continue
-
                 try:
-                    index = self.client.get_index(index_name)
+                    report = indexer.index_dataset(data_path, index_name, reset=reset, spans=spans)
                 except Exception as e:
-                    print(f"  ✗ Không thể lấy index {index_name}. Bỏ qua bộ dữ liệu này. Lỗi: {e}")
+                    print(f"  ✗ Không thể index {index_name}. Bỏ qua bộ dữ liệu này. Lỗi: {e}")
                     continue
-                
-                document_batch = []
 
-                for i, json_file in enumerate(tqdm(json_files, desc=f"Đang xử lý {index_name}", unit="file")):
-                    try:
-                        with open(json_file, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                        
-                        video_name = Path(json_file).stem
-                        
-                        for frame_index, frame_text in data.items():
-                            if frame_text.strip():
-                                doc = {
-                                    "id": f"{index_name}_{video_name}_{frame_index}",
-                                    "video_name": video_name,
-                                    "frame_index": int(frame_index),
-                                    "text": frame_text.strip(),
-                                    "dataset_type": index_name
-                                }
-                                document_batch.append(doc)
-                        successful_files += 1
-
-                    except Exception as e:
-                        tqdm.write(f"  ✗ Lỗi khi đọc hoặc xử lý file {json_file}: {e}")
-                        failed_files += 1
-
-                    if (i + 1) % BATCH_FILE_COUNT == 0 or (i + 1) == len(json_files):
-                        if document_batch:
-                            try:
-                                task = index.add_documents(document_batch)
-                                document_batch = []
-                            except Exception as e:
-                                tqdm.write(f"  ✗ Lỗi khi index lô dữ liệu kết thúc bằng file {json_file}: {e}")
-                
-                elapsed = time.time() - start_time
-                print(f"  ✓ Hoàn tất {index_name}: Thành công: {successful_files}, Thất bại: {failed_files} (trong {elapsed:.1f} giây)")
-                
-                overall_success += successful_files
-                overall_failed += failed_files
+                print(f"  ✓ Hoàn tất {report.summary()}")
+                overall_success += report.files_ok
+                overall_failed += report.files_failed
+                overall_docs += report.documents
 
             total_elapsed = time.time() - total_start
-            print(f"\n✓ Đã index xong tất cả bộ dữ liệu: Thành công: {overall_success}, Thất bại: {overall_failed} (Tổng thời gian: {total_elapsed:.1f} giây)")
+            print(f"\n✓ Đã index xong tất cả bộ dữ liệu: Thành công: {overall_success}, Thất bại: {overall_failed}, "
+                  f"{overall_docs:,} docs (Tổng thời gian: {total_elapsed:.1f} giây)")
 
         except Exception as e:
             print(f"Một lỗi nghiêm trọng đã xảy ra trong quá trình index: {e}")
 
     def expansion_query(self, query: str) -> List[str]:
-        words = query.strip().split()
-        n = len(words)
-        if n == 0:
-            return []
-
-        all_query = set()
-        if n >= 2:
-            for i in range(n - 1):
-                all_query.add("".join(words[i:i+2]))
-
-        if n == 3:
-            all_query.add("".join(words))
-
-        list_query = [query]
-        list_query.extend(list(all_query))
-        return list_query
+        return expansion_query(query)
     
     def search_ocr(self, query: str, size: int = 1000) -> List[Dict[str, Any]]:
         """
@@ -353,83 +234,23 @@ class MeiliSearchService(metaclass=SingletonMeta):
         if not normalized_queries:
             return []
         try:
-            if not self.ocr_index_names:
-                return []
-            queries = []
-            for index_name in self.ocr_index_names:
-                for normalized_query in normalized_queries:
-                    queries.append({
-                        "indexUid": index_name,
-                        "q": normalized_query,
-                        "limit": self.limit_search,
-                        "attributesToRetrieve": ['*'],
-                        'showRankingScore': False,
-                        'matchingStrategy': 'last',
-                    })
-            
-            multi_search_response = self.client.multi_search(queries)
-            search_result = {}
-            for response in multi_search_response['results']:
-                for doc in response['hits']:
-                    key = (doc['video_name'], doc['frame_index'])
-                    if key not in search_result:
-                        search_result[key] = doc
-            search_result_list = list(search_result.values())
-            
-            for result in search_result_list:
-                text = result.get('text', '').strip()
-                custom_score = self._scoring_matching(text, normalized_queries[0])
-                result['_rankingScore'] = custom_score
-    
-            search_result_list.sort(key=lambda x: x['_rankingScore'], reverse=True)
-            return search_result_list[:size] 
+            with span("meili.search_ocr"):
+                return self.searcher.search(self.ocr_index_names, normalized_queries, size=size, limit=self.limit_search)
         except Exception as e:
             print(f"Multi-search ocr error: {e}")
             return []
     
     def search_subscript(self, query: str, size: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Search subtitle. Mỗi hit là một span: frame_index = start_frame, kèm end_frame
+        (document cũ index theo frame không có start_frame/end_frame).
+        """
         normalized_queries = [expanded_query.lower() for expanded_query in self.expansion_query(query)]
         if not normalized_queries:
             return []
         try:
-            if not self.subscript_index_names:
-                return []
-            queries = []
-            for index_name in self.subscript_index_names:
-                for normalized_query in normalized_queries:
-                    queries.append({
-                        "indexUid": index_name,
-                        "q": normalized_query,
-                        "limit": self.limit_search,
-                        "attributesToRetrieve": ['*'],
-                        'showRankingScore': False,
-                        'matchingStrategy': 'last',
-                    })
-            
-            multi_search_response = self.client.multi_search(queries)
-            search_result = {}
-            for response in multi_search_response['results']:
-                for doc in response['hits']:
-                    key = (doc['video_name'], doc['frame_index'])
-                    if key not in search_result:
-                        search_result[key] = doc
-            search_result_list = list(search_result.values())
-            
-            for result in search_result_list:
-                text = result.get('text', '').strip()
-                custom_score = self._scoring_matching(text, normalized_queries[0])
-                result['_rankingScore'] = custom_score
-    
-            search_result_list.sort(key=lambda x: x['_rankingScore'], reverse=True)
-            return search_result_list[:size] 
+            with span("meili.search_subscript"):
+                return self.searcher.search(self.subscript_index_names, normalized_queries, size=size, limit=self.limit_search)
         except Exception as e:
             print(f"Multi-search subtitle error: {e}")
             return []
-
-    def _scoring_matching(self, text, query):
-        text_norm = ' '.join(text.lower().split())
-        if not query or not text_norm:
-            return 0.0
-        if query in text_norm:
-            return 1.0
-        return self.scoring.w_score(q=query, d=text_norm)
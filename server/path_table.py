@@ -0,0 +1,164 @@
+"""
+Bảng id -> path gọn cho index FAISS, đọc được bằng mmap.
+
+``metadata.pkl`` lưu ``id_to_path`` / ``path_to_id`` dạng dict Python: mỗi worker phải
+unpickle lại hàng triệu string (vài trăm MB mỗi process). PathTable lưu cùng dữ liệu
+trong ba file numpy cạnh ``faiss_index.bin``:
+
+- ``paths.blob.npy``:    bytes UTF-8 của mọi path nối liền (uint8)
+- ``paths.offsets.npy``: offset bắt đầu của path thứ i, dài n + 1 (int64)
+- ``paths.order.npy``:   id sắp xếp theo path, để tra ngược path -> id bằng binary search
+
+Mở với ``mmap=True`` thì các worker dùng chung page cache thay vì mỗi process một bản.
+
+Chuyển một thư mục index đã có sang dạng này:
+    python path_table.py /lucifer_data/faiss-index/clip-index
+"""
+
+import pickle
+import sys
+from pathlib import Path
+from typing import Any, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+BLOB_FILE = "paths.blob.npy"
+OFFSETS_FILE = "paths.offsets.npy"
+ORDER_FILE = "paths.order.npy"
+
+
+class PathTable:
+    """Dùng như ``Dict[int, str]`` (id_to_path): ``table[i]``, ``i in table``, ``table.get(i)``."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, order: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+        self.order = order
+
+    @classmethod
+    def from_paths(cls, paths: List[str]) -> "PathTable":
+        encoded = [p.encode('utf-8') for p in paths]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        order = np.array(sorted(range(len(encoded)), key=encoded.__getitem__), dtype=np.int64)
+        return cls(blob, offsets, order)
+
+    @classmethod
+    def load(cls, directory: Union[str, Path], mmap: bool = True) -> "PathTable":
+        directory = Path(directory)
+        mode = 'r' if mmap else None
+        return cls(
+            np.load(directory / BLOB_FILE, mmap_mode=mode),
+            np.load(directory / OFFSETS_FILE, mmap_mode=mode),
+            np.load(directory / ORDER_FILE, mmap_mode=mode),
+        )
+
+    @staticmethod
+    def exists(directory: Union[str, Path]) -> bool:
+        directory = Path(directory)
+        return all((directory / name).exists() for name in (BLOB_FILE, OFFSETS_FILE, ORDER_FILE))
+
+    def save(self, directory: Union[str, Path]):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / BLOB_FILE, np.asarray(self.blob))
+        np.save(directory / OFFSETS_FILE, np.asarray(self.offsets))
+        np.save(directory / ORDER_FILE, np.asarray(self.order))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _raw(self, idx: int) -> bytes:
+        return self.blob[self.offsets[idx]:self.offsets[idx + 1]].tobytes()
+
+    def __contains__(self, idx: Any) -> bool:
+        try:
+            return 0 <= idx < len(self)
+        except TypeError:
+            return False
+
+    def __getitem__(self, idx: int) -> str:
+        if idx not in self:
+            raise KeyError(idx)
+        return self._raw(idx).decode('utf-8')
+
+    def get(self, idx: int, default: Optional[str] = None) -> Optional[str]:
+        return self[idx] if idx in self else default
+
+    def lookup(self, ids: Any) -> List[Optional[str]]:
+        """Path của cả một hàng id (ví dụ ``indices`` từ ``index.search``); id không hợp lệ (-1) -> None."""
+        ids = np.asarray(ids, dtype=np.int64)
+        valid = (ids >= 0) & (ids < len(self))
+        safe = np.where(valid, ids, 0)
+        starts = self.offsets[safe].tolist()
+        ends = self.offsets[safe + 1].tolist()
+        buf = memoryview(self.blob)
+        return [
+            str(buf[start:end], 'utf-8') if ok else None
+            for start, end, ok in zip(starts, ends, valid.tolist())
+        ]
+
+    def items(self) -> Iterator[Tuple[int, str]]:
+        for idx in range(len(self)):
+            yield idx, self[idx]
+
+    def index_of(self, path: str) -> Optional[int]:
+        """Tra ngược path -> id (binary search trên ``order``). None nếu không có."""
+        target = path.encode('utf-8')
+        lo, hi = 0, len(self.order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._raw(int(self.order[mid])) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.order):
+            idx = int(self.order[lo])
+            if self._raw(idx) == target:
+                return idx
+        return None
+
+    def reverse(self) -> "PathLookup":
+        return PathLookup(self)
+
+
+class PathLookup:
+    """View ``Dict[str, int]`` (path_to_id) trên một PathTable, không tạo dict."""
+
+    def __init__(self, table: PathTable):
+        self.table = table
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __contains__(self, path: Any) -> bool:
+        return isinstance(path, str) and self.table.index_of(path) is not None
+
+    def __getitem__(self, path: str) -> int:
+        idx = self.table.index_of(path)
+        if idx is None:
+            raise KeyError(path)
+        return idx
+
+    def get(self, path: str, default: Optional[int] = None) -> Optional[int]:
+        idx = self.table.index_of(path)
+        return default if idx is None else idx
+
+
+def convert_metadata(index_dir: Union[str, Path]) -> PathTable:
+    """Tạo path table từ ``metadata.pkl`` trong thư mục index."""
+    index_dir = Path(index_dir)
+    with open(index_dir / "metadata.pkl", 'rb') as f:
+        metadata = pickle.load(f)
+    id_to_path = metadata['id_to_path']
+    paths = [id_to_path[i] for i in range(len(id_to_path))]
+    table = PathTable.from_paths(paths)
+    table.save(index_dir)
+    return table
+
+
+if __name__ == '__main__':
+    for directory in sys.argv[1:]:
+        table = convert_metadata(directory)
+        print(f"✅ {directory}: {len(table)} paths, {table.blob.nbytes / 1e6:.1f} MB")
@@ -0,0 +1,109 @@
+"""
+Query log của /search: mỗi request là một dòng JSON trong file xoay vòng
+(``RotatingFileHandler``), dùng để replay và so sánh các build/cấu hình (xem bench/replay.py).
+
+Ảnh truy vấn được thay bằng SHA-256 của nội dung (``image_sha256``, cùng hash với image cache
+và ``Query.image_hash`` của backend); nếu bật ``store_images`` thì bytes ảnh được lưu một lần
+theo hash tại ``<thư mục log>/images/<sha256>``. Log cũ ghi ``image_sha1`` vẫn replay được.
+"""
+
+import json
+import logging
+import os
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+
+def _chain_paths(chain: Any) -> List[str]:
+    # Một stage: kết quả là cặp (path, score); nhiều stage: list các (path, scores)
+    if chain and isinstance(chain[0], str):
+        return [chain[0]]
+    return [item[0] for item in chain]
+
+
+def chain_id(chain: List[Any]) -> str:
+    """
+    Id ổn định của một chain kết quả: ``video/frame_đầu-frame_cuối``
+    (chain là list ``(path, scores)`` như temporal_search trả về, hoặc một cặp
+    ``(path, score)`` với truy vấn một stage).
+    """
+    paths = _chain_paths(chain)
+    if not paths:
+        return ''
+    first, last = paths[0], paths[-1]
+    video = os.path.dirname(first)
+    start = os.path.splitext(os.path.basename(first))[0]
+    end = os.path.splitext(os.path.basename(last))[0]
+    return f"{video}/{start}-{end}"
+
+
+def result_ids(results: List[List[Any]]) -> List[str]:
+    return [chain_id(chain) for chain in results]
+
+
+def result_frames(results: List[List[Any]]) -> List[str]:
+    return [path for chain in results for path in _chain_paths(chain)]
+
+
+class QueryLogger:
+    def __init__(self, path: str, max_mb: int = 64, backup_count: int = 10, store_images: bool = False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.store_images = store_images
+        self.image_dir = self.path.parent / 'images'
+        if store_images:
+            self.image_dir.mkdir(parents=True, exist_ok=True)
+
+        # Logger riêng, không propagate để không lẫn vào log của uvicorn
+        self._logger = logging.getLogger(f"query_log.{self.path}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        if not self._logger.handlers:
+            handler = RotatingFileHandler(
+                self.path, maxBytes=max_mb * 1024 * 1024, backupCount=backup_count, encoding='utf-8'
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self._logger.addHandler(handler)
+
+    def add_image(self, digest: str, data: bytes) -> str:
+        """Lưu ảnh theo hash (SHA-256 đã tính ở ``ImageQuery``) nếu bật store_images; trả về hash."""
+        if self.store_images:
+            target = self.image_dir / digest
+            if not target.exists():
+                tmp = target.with_suffix(f".tmp{os.getpid()}")
+                with open(tmp, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp, target)
+        return digest
+
+    def log(self, entry: Dict[str, Any]):
+        try:
+            self._logger.info(json.dumps({'ts': time.time(), **entry}, ensure_ascii=False, default=str))
+        except Exception as e:
+            print(f"⚠️ Query log error: {e}")
+
+
+def iter_log(path: str) -> Iterator[Dict[str, Any]]:
+    """Đọc query log theo thứ tự thời gian, gồm cả các file đã xoay vòng (path.N ... path.1, path)."""
+    base = Path(path)
+    rotated = sorted(
+        (p for p in base.parent.glob(base.name + '.*') if p.suffix[1:].isdigit()),
+        key=lambda p: int(p.suffix[1:]),
+        reverse=True
+    )
+    for file_path in rotated + ([base] if base.exists() else []):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def load_image(log_path: str, digest: str) -> Optional[bytes]:
+    target = Path(log_path).parent / 'images' / digest
+    if not target.exists():
+        return None
+    with open(target, 'rb') as f:
+        return f.read()
@@ -0,0 +1,47 @@
+"""
+Client của encoder_server.py, cùng interface ``encode_batch`` với CLIPEmbedder.
+
+Dùng khi search API chạy nhiều worker (``API_WORKERS > 1``) và ``ENCODER_URL`` được đặt:
+các worker không load model mà gửi query tới một encoder process dùng chung.
+"""
+
+import json
+from types import SimpleNamespace
+from typing import Any, List
+
+import numpy as np
+import requests
+
+from tracing import span
+
+
+class RemoteEmbedder:
+    def __init__(self, url: str, model_name: str, timeout: float = 30.0):
+        self.url = url.rstrip('/')
+        self.model_name = model_name
+        self.timeout = timeout
+        # faiss_engine chỉ đọc device.type / device.index: index luôn ở CPU của worker
+        self.device = SimpleNamespace(type='cpu', index=None)
+        self._session = requests.Session()
+
+    def encode_batch(self, queries: List[Any]) -> np.ndarray:
+        items, files = [], []
+        for query in queries:
+            if isinstance(query, str):
+                items.append({'text': query})
+                continue
+            image = query.convert('RGB')
+            items.append({'image': len(files), 'width': image.width, 'height': image.height})
+            files.append(('images', (f"{len(files)}.rgb", image.tobytes(), 'application/octet-stream')))
+
+        with span(f"encode.remote:{self.model_name}"):
+            response = self._session.post(
+                f"{self.url}/encode",
+                data={'model_name': self.model_name, 'queries': json.dumps(items, ensure_ascii=False)},
+                files=files or None,
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+
+        n, d = (int(x) for x in response.headers['X-Embedding-Shape'].split(','))
+        return np.frombuffer(response.content, dtype='<f4').reshape(n, d).astype(np.float32)
@@ -1,13 +1,28 @@
+import json
+import time
 from pathlib import Path
 import numpy as np
-from typing import List, Dict, Tuple, Optional, Any
+from typing import List, Dict, Tuple, Optional, Any, Iterator
 from collections import defaultdict
 import os
-from PIL import Image
 import concurrent.futures
+from contextlib import ExitStack, contextmanager
 
 from faiss_engine import FAISSSearchEngine
+from generations import Generation, GenerationSlot
+from image_cache import ImageQuery
 from meilisearch_service import MeiliSearchService
+from tracing import record, span, submit
+
+class SegmentCaches:
+    """Segment caches của một thế hệ (thay thế cùng lúc khi hot reload)."""
+
+    def __init__(self, segments_dir: str):
+        self.segments_dir = segments_dir
+        self.segments_cache = {}  # {video_name: list of segments}
+        self.frame_to_segment_cache = {}  # {video_name: {frame_idx: segment_info}}
+        self.segment_shots_cache = {}  # {video_name: {segment_idx: [shot_frames]}}
+
 
 class SearchEngine:
     """
@@ -37,14 +52,66 @@ class SearchEngine:
         """
         self.vector_engine = vector_engine
         self.ocr_engine = ocr_engine
-        self.segments_dir = segments_dir
         
-        # Cache tối ưu: lưu cả segments và lookup table
-        self.segments_cache = {}  # {video_name: list of segments}
-        self.frame_to_segment_cache = {}  # {video_name: {frame_idx: segment_info}}
-        self.segment_shots_cache = {}  # {video_name: {segment_idx: [shot_frames]}}
+        # Cache tối ưu: lưu cả segments và lookup table. Cả bộ cache nằm trong một thế hệ
+        # (SegmentCaches) để hot reload thay một lúc; các thuộc tính bên dưới là property
+        self.segment_generations = GenerationSlot("segments", SegmentCaches(segments_dir))
         
         print("✅ Main SearchEngine (Optimized Multi-Model Version) initialized.")
+
+    @property
+    def segments_dir(self) -> str:
+        return self.segment_generations.get().data.segments_dir
+
+    @property
+    def segments_cache(self) -> Dict[str, List[Dict[str, int]]]:
+        return self.segment_generations.get().data.segments_cache
+
+    @property
+    def frame_to_segment_cache(self) -> Dict[str, Dict[int, Dict[str, Any]]]:
+        return self.segment_generations.get().data.frame_to_segment_cache
+
+    @property
+    def segment_shots_cache(self) -> Dict[str, Dict[int, List[int]]]:
+        return self.segment_generations.get().data.segment_shots_cache
+
+    @contextmanager
+    def _pin_generations(self):
+        """Cả query dùng cùng một thế hệ segment caches và index FAISS, kể cả khi đang hot reload."""
+        with ExitStack() as stack:
+            stack.enter_context(self.segment_generations.pin())
+            vector_generations = getattr(self.vector_engine, 'generations', None)
+            if vector_generations is not None:
+                stack.enter_context(vector_generations.pin())
+            yield
+
+    def load_segment_caches(self, segments_dir: Optional[str] = None, warm_videos: Optional[List[str]] = None) -> SegmentCaches:
+        """
+        Dựng segment caches thế hệ mới từ ``segments_dir`` (mặc định: thư mục hiện tại) mà không
+        đụng tới thế hệ đang phục vụ. ``warm_videos``: load sẵn các video này (ví dụ các video
+        đang có trong cache); None thì preload toàn bộ thư mục.
+        """
+        staging = SearchEngine(vector_engine=None, ocr_engine=None, segments_dir=segments_dir or self.segments_dir)
+        if warm_videos is None:
+            staging.preload_all_segments()
+        else:
+            for video_name in warm_videos:
+                staging._load_video_segments(video_name)
+        return staging.segment_generations.current.data
+
+    def swap_segment_caches(self, caches: SegmentCaches) -> Generation:
+        old = self.segment_generations.swap(caches)
+        print(f"🔁 Segment caches swapped: generation {old.number} -> {self.segment_generations.current.number}")
+        return old
+
+    def release_segment_caches(self, generation: Generation, timeout: Optional[float] = None) -> bool:
+        if not generation.wait_drained(timeout):
+            print(f"⚠️ Segment generation {generation.number} still has {generation.refs} in-flight queries; leaving it to GC")
+            return False
+        generation.data.segments_cache.clear()
+        generation.data.frame_to_segment_cache.clear()
+        generation.data.segment_shots_cache.clear()
+        return True
     
     def preload_all_segments(self):
         """
@@ -195,6 +262,21 @@ class SearchEngine:
         shot_frames = sorted(set(shot_frames))
         return shot_frames
 
+    def _expand_subtitle_span(self, hit: Dict[str, Any]) -> List[int]:
+        """
+        Expand một subtitle span thành các frame ứng viên: frame đầu, frame cuối
+        và các shot frame (precomputed) của những segment mà span đi qua.
+        Document index theo frame (không có start/end) chỉ trả về chính frame đó.
+        """
+        start_frame = hit.get('start_frame', hit.get('frame_index'))
+        end_frame = hit.get('end_frame', start_frame)
+        if end_frame <= start_frame:
+            return [start_frame]
+        frames = set(self._get_shot_frames_for_range(hit['video_name'], start_frame, end_frame))
+        frames.add(start_frame)
+        frames.add(end_frame)
+        return sorted(frames)
+
     def _fuse_and_rerank_candidates(
         self,
         raw_text_results: List[Tuple[str, float]],
@@ -226,8 +308,10 @@ class SearchEngine:
             frame_index = ocr_hit.get('frame_index', -1)
             ocr_score = ocr_hit.get('_rankingScore', 0.0) 
             if video_name and frame_index != -1:
-                path = f"{video_name}/{frame_index}.jpg"
-                all_scores[path]['subtitle'] = ocr_score
+                for frame in self._expand_subtitle_span(ocr_hit):
+                    path = f"{video_name}/{frame}.jpg"
+                    if ocr_score > all_scores[path]['subtitle']:
+                        all_scores[path]['subtitle'] = ocr_score
 
         if not all_scores:
             return []
@@ -297,26 +381,48 @@ class SearchEngine:
     def hybrid_search(
         self,
         text_query: Optional[str] = None,
-        image_query: Optional[Image.Image] = None,
+        image_query: Optional[ImageQuery] = None,
         ocr_query: Optional[str] = None,
         subtitle_query: Optional[str] = None,
         k: int = 100,
         weights: Dict[str, float] = None,
-        vector_models_config: Optional[List[Dict[str, Any]]] = None
+        vector_models_config: Optional[List[Dict[str, Any]]] = None,
+        vector_results: Optional[List[List[Tuple[str, float]]]] = None
     ) -> List[Tuple[str, float]]:
         """
         Thực hiện tìm kiếm hybrid cho một truy vấn đơn giản (một stage).
+        ``vector_results``: kết quả vector đã tính sẵn (theo thứ tự text, image), khi đó bỏ qua
+        bước vector search (dùng cho temporal_search_batch).
         """
         if weights is None: 
             weights = {'text': 0.3, 'ocr': 0.3, 'image': 0.1, 'subtitle': 0.3}
-        if vector_models_config is None:
-            available_model_names = list(self.vector_engine.configs.keys())
-            num_models = len(available_model_names)
-            if num_models > 0:
-                equal_weight = 1.0 / num_models
-                vector_models_config = [{'model_name': model_name, 'weight': equal_weight} for model_name in available_model_names]
-            else:
-                vector_models_config = []
+        with self._pin_generations():
+            raw_results = self._hybrid_retrieve(
+                text_query, image_query, ocr_query, subtitle_query, k, vector_models_config, vector_results
+            )
+
+        with span("hybrid.fusion"):
+            combined_results = self._fuse_and_rerank_candidates(
+                raw_text_results=raw_results['text'],
+                raw_image_results=raw_results['image'],
+                raw_ocr_results=raw_results['ocr'],
+                raw_subtitle_results=raw_results['subtitle'],
+                weights=weights
+            )
+        return combined_results[:k]
+
+    def _hybrid_retrieve(
+        self,
+        text_query: Optional[str],
+        image_query: Optional[ImageQuery],
+        ocr_query: Optional[str],
+        subtitle_query: Optional[str],
+        k: int,
+        vector_models_config: Optional[List[Dict[str, Any]]],
+        vector_results: Optional[List[List[Tuple[str, float]]]] = None
+    ) -> Dict[str, List[Any]]:
+        """Lấy kết quả thô của từng modality cho một stage (chưa fusion)."""
+        vector_models_config = self._resolve_models_config(vector_models_config)
 
         raw_results = {'text': [], 'image': [], 'ocr': [], 'subtitle': []}
         vector_queries, vector_types = [], []
@@ -327,18 +433,21 @@ class SearchEngine:
             vector_queries.append(image_query)
             vector_types.append('image')
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
+        with span("hybrid.retrieve"), concurrent.futures.ThreadPoolExecutor() as executor:
             future_vector = None
-            if vector_queries:
-                future_vector = executor.submit(self.vector_engine.search, vector_queries, vector_models_config, k)
+            if vector_results is not None:
+                for i, q_type in enumerate(vector_types):
+                    raw_results[q_type] = vector_results[i]
+            elif vector_queries:
+                future_vector = submit(executor, self.vector_engine.search, vector_queries, vector_models_config, k)
             
             future_subtitle = None
             if subtitle_query:
-                future_subtitle = executor.submit(self.ocr_engine.search_subscript, subtitle_query, k)
+                future_subtitle = submit(executor, self.ocr_engine.search_subscript, subtitle_query, k)
             
             future_ocr = None
             if ocr_query:
-                future_ocr = executor.submit(self.ocr_engine.search_ocr, ocr_query, k)
+                future_ocr = submit(executor, self.ocr_engine.search_ocr, ocr_query, k)
             if future_vector:
                 batch_vector_results = future_vector.result()
                 for i, q_type in enumerate(vector_types):
@@ -349,15 +458,7 @@ class SearchEngine:
 
             if future_subtitle:
                 raw_results['subtitle'] = future_subtitle.result()
-
-        combined_results = self._fuse_and_rerank_candidates(
-            raw_text_results=raw_results['text'],
-            raw_image_results=raw_results['image'],
-            raw_ocr_results=raw_results['ocr'],
-            raw_subtitle_results=raw_results['subtitle'],
-            weights=weights
-        )
-        return combined_results[:k]
+        return raw_results
 
     def temporal_search(
         self,
@@ -367,71 +468,290 @@ class SearchEngine:
         initial_search_k: int = 2048, # num_of_frames
         weights: Dict[str, float] = None,
         vector_models_config: Optional[List[Dict[str, Any]]] = None,
-        format: str = "all"
+        format: str = "all",
+        vector_results: Optional[List[List[Tuple[str, float]]]] = None
     ) -> List[List[Tuple[str, float]]]:
+        with span("temporal_search"), self._pin_generations():
+            return self._temporal_search(
+                queries, k, time_distance, initial_search_k, weights, vector_models_config, format, vector_results
+            )
+
+    def _resolve_models_config(self, vector_models_config: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Mặc định: dùng tất cả model đang có với trọng số bằng nhau."""
+        if vector_models_config is not None:
+            return vector_models_config
+        available_model_names = list(self.vector_engine.configs.keys())
+        if not available_model_names:
+            return []
+        equal_weight = 1.0 / len(available_model_names)
+        return [{'model_name': model_name, 'weight': equal_weight} for model_name in available_model_names]
+
+    @staticmethod
+    def _plan_vector_queries(queries: List[Dict[str, Any]]) -> Tuple[List[Any], List[Dict[str, Any]]]:
+        """
+        Danh sách truy vấn vector gửi cho ``vector_engine.search`` (đúng thứ tự temporal_search
+        dùng) và mapping từng phần tử về stage. Một stage gồm text/image; với nhiều stage,
+        stage chỉ có OCR dùng chung một truy vấn "placeholder".
+        """
+        vector_queries, vector_batch_map = [], []
+        if len(queries) <= 1:
+            stage_data = queries[0] if queries else {}
+            for q_type in ('text', 'image'):
+                if stage_data.get(q_type):
+                    vector_queries.append(stage_data[q_type])
+                    vector_batch_map.append({'stage_idx': 0, 'type': q_type})
+            return vector_queries, vector_batch_map
+
+        placeholder_query = "placeholder"
+        has_placeholder = False
+        for stage_idx, stage_data in enumerate(queries):
+            has_vector_query_in_stage = False
+            if stage_data.get('text'):
+                vector_queries.append(stage_data['text'])
+                vector_batch_map.append({'stage_idx': stage_idx, 'type': 'text'})
+                has_vector_query_in_stage = True
+            if stage_data.get('image'):
+                vector_queries.append(stage_data['image'])
+                vector_batch_map.append({'stage_idx': stage_idx, 'type': 'image'})
+                has_vector_query_in_stage = True
+            if not has_vector_query_in_stage and stage_data.get('ocr'):
+                if not has_placeholder:
+                    vector_queries.append(placeholder_query)
+                    has_placeholder = True
+                vector_batch_map.append({'stage_idx': stage_idx, 'type': 'placeholder', 'query_ref': placeholder_query})
+        return vector_queries, vector_batch_map
+
+    def temporal_search_batch(
+        self,
+        requests: List[Dict[str, Any]],
+        initial_search_k: int = 2048,
+        format: str = "all",
+        max_workers: int = 8
+    ) -> List[Optional[List[List[Tuple[str, float]]]]]:
+        """
+        Chạy nhiều temporal_search cùng lúc. Mỗi request là dict với ``queries`` và tuỳ chọn
+        ``k``, ``time_distance``, ``weights``, ``vector_models_config``.
+
+        Các request dùng cùng bộ model được gom lại: toàn bộ truy vấn vector (text trùng nhau
+        chỉ tính một lần) đi qua MỘT lần ``vector_engine.search`` -> mỗi model một lần
+        ``encode_batch`` và một lần ``index.search`` trên ma trận query xếp chồng. Sau đó
+        fusion + temporal matching chạy riêng cho từng request.
+
+        Trả về list kết quả theo thứ tự request; request lỗi trả về None.
+        """
+        if not requests:
+            return []
+        with self._pin_generations():
+            return self._temporal_search_batch(requests, initial_search_k, format, max_workers)
+
+    def _temporal_search_batch(
+        self,
+        requests: List[Dict[str, Any]],
+        initial_search_k: int,
+        format: str,
+        max_workers: int
+    ) -> List[Optional[List[List[Tuple[str, float]]]]]:
+        models_per_request = [self._resolve_models_config(req.get('vector_models_config')) for req in requests]
+        groups: Dict[Tuple[str, ...], List[int]] = defaultdict(list)
+        for i, models in enumerate(models_per_request):
+            # Reranker chỉ dùng tên model, nên gom theo tập tên model
+            groups[tuple(sorted(m['model_name'] for m in models))].append(i)
+
+        # None: không có kết quả gom sẵn -> request tự vector search như bình thường
+        vector_results: List[Optional[List[List[Tuple[str, float]]]]] = [None] * len(requests)
+        with span("batch.vector_search"):
+            for request_indices in groups.values():
+                stacked, slots, positions = [], {}, []
+                for i in request_indices:
+                    vector_queries, _ = self._plan_vector_queries(requests[i].get('queries') or [])
+                    request_positions = []
+                    for query in vector_queries:
+                        if isinstance(query, str):
+                            key = ('text', query)
+                        elif isinstance(query, ImageQuery):
+                            key = ('image', query.sha256)
+                        else:
+                            key = ('object', id(query))
+                        if key not in slots:
+                            slots[key] = len(stacked)
+                            stacked.append(query)
+                        request_positions.append(slots[key])
+                    if request_positions:
+                        positions.append((i, request_positions))
+                    else:
+                        vector_results[i] = []
+                if not stacked:
+                    continue
+                try:
+                    batch_results = self.vector_engine.search(stacked, models_per_request[request_indices[0]], initial_search_k)
+                except Exception as e:
+                    print(f"Lỗi batch vector search: {e}")
+                    continue
+                for i, request_positions in positions:
+                    vector_results[i] = [batch_results[pos] for pos in request_positions]
+
+        def run_one(i: int):
+            req = requests[i]
+            return self.temporal_search(
+                queries=req.get('queries'),
+                k=req.get('k', 10),
+                time_distance=req.get('time_distance', 30),
+                initial_search_k=initial_search_k,
+                weights=req.get('weights'),
+                vector_models_config=models_per_request[i],
+                format=format,
+                vector_results=vector_results[i]
+            )
+
+        outputs: List[Optional[List[List[Tuple[str, float]]]]] = [None] * len(requests)
+        with span("batch.temporal"), concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(requests))) as executor:
+            futures = {submit(executor, run_one, i): i for i in range(len(requests))}
+            for future in concurrent.futures.as_completed(futures):
+                i = futures[future]
+                try:
+                    outputs[i] = future.result()
+                except Exception as e:
+                    print(f"❌ Temporal search lỗi cho request {i} trong batch: {e}")
+        return outputs
+
+    def _temporal_search(
+        self,
+        queries: Optional[List[Dict[str, Any]]] = None,
+        k: int = 10, # top_k
+        time_distance: int = 30, # time_distance in seconds
+        initial_search_k: int = 2048, # num_of_frames
+        weights: Dict[str, float] = None,
+        vector_models_config: Optional[List[Dict[str, Any]]] = None,
+        format: str = "all",
+        vector_results: Optional[List[List[Tuple[str, float]]]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        return [
+            payload for kind, payload in self._iter_temporal_search(
+                queries, k, time_distance, initial_search_k, weights, vector_models_config, format, vector_results
+            )
+            if kind == 'chain'
+        ]
+
+    def iter_temporal_search(
+        self,
+        queries: Optional[List[Dict[str, Any]]] = None,
+        k: int = 10,
+        time_distance: int = 30,
+        initial_search_k: int = 2048,
+        weights: Dict[str, float] = None,
+        vector_models_config: Optional[List[Dict[str, Any]]] = None,
+        format: str = "all",
+        preview_size: int = 20
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Giống temporal_search nhưng trả về dần từng sự kiện để stream cho UI:
+        - ``('preview', {'stage', 'modality', 'candidates'})``: top ``preview_size`` ứng viên thô
+          của từng modality mỗi stage, ngay sau bước retrieve (trước fusion/DP);
+        - ``('chain', chain)``: từng chain kết quả theo thứ tự điểm giảm dần, ngay khi chain
+          đó được expand xong (cùng định dạng với phần tử của temporal_search).
+        Generator phải được tiêu thụ hết trên cùng một thread.
+        """
+        start = time.perf_counter()
+        with self._pin_generations():
+            yield from self._iter_temporal_search(
+                queries, k, time_distance, initial_search_k, weights, vector_models_config, format,
+                preview_size=preview_size
+            )
+        record("temporal_search", start)
+
+    @staticmethod
+    def _preview_events(raw_results_by_stage: Dict[int, Dict[str, List[Any]]], preview_size: int) -> List[Tuple[str, Any]]:
+        """Top ứng viên thô mỗi (stage, modality), quy về cặp (path, score) như kết quả vector."""
+        events = []
+        for stage_idx in sorted(raw_results_by_stage):
+            for modality, results in raw_results_by_stage[stage_idx].items():
+                if not results:
+                    continue
+                candidates = []
+                for item in results[:preview_size]:
+                    if isinstance(item, dict):
+                        candidates.append((f"{item.get('video_name', '')}/{item.get('frame_index', -1)}.jpg", item.get('_rankingScore', 0.0)))
+                    else:
+                        candidates.append((item[0], item[1]))
+                events.append(('preview', {'stage': stage_idx, 'modality': modality, 'candidates': candidates}))
+        return events
+
+    def _iter_temporal_search(
+        self,
+        queries: Optional[List[Dict[str, Any]]] = None,
+        k: int = 10, # top_k
+        time_distance: int = 30, # time_distance in seconds
+        initial_search_k: int = 2048, # num_of_frames
+        weights: Dict[str, float] = None,
+        vector_models_config: Optional[List[Dict[str, Any]]] = None,
+        format: str = "all",
+        vector_results: Optional[List[List[Tuple[str, float]]]] = None,
+        preview_size: int = 0
+    ) -> Iterator[Tuple[str, Any]]:
         """
         Thực hiện tìm kiếm tuần tự theo thời gian, áp dụng logic xử lý mới từ người dùng.
         Phần quy hoạch động đã được sửa lại để đảm bảo tính đúng đắn.
-        Định dạng output là List[List[Tuple[str, float]]].
+        Sinh ra các sự kiện ``('chain', chain)`` theo thứ tự kết quả (xem iter_temporal_search),
+        cộng thêm ``('preview', ...)`` nếu ``preview_size > 0``.
         
         Args:
             format: Định dạng trả về, có thể là:
                 - "all": Trả về tất cả frames trong mỗi chain
                 - "agent": Chỉ trả về các frames có điểm cao nhất cho mỗi stage
                 - "shot": Trả về đầu và cuối của mỗi shot segment với các stage điểm cao nhất
+            vector_results: Kết quả vector search đã tính sẵn cho ``_plan_vector_queries(queries)``
+                (theo đúng thứ tự), khi đó không gọi lại vector_engine.search.
         """
 
         if not queries:
-            return []
+            return
         
+        vector_models_config = self._resolve_models_config(vector_models_config)
         num_stages = len(queries)
         if num_stages <= 1:
             stage_query = queries[0] if queries else {}
-            results = self.hybrid_search(
-                text_query=stage_query.get('text'),
-                image_query=stage_query.get('image'),
-                ocr_query=stage_query.get('ocr'),
-                subtitle_query=stage_query.get('subtitle'),
-                k=initial_search_k,
-                weights=weights,
-                vector_models_config=vector_models_config
+            raw_results = self._hybrid_retrieve(
+                stage_query.get('text'),
+                stage_query.get('image'),
+                stage_query.get('ocr'),
+                stage_query.get('subtitle'),
+                initial_search_k,
+                vector_models_config,
+                vector_results
             )
-            # Chuyển đổi sang định dạng output mong muốn
-            return results[:k] if results else []
+            if preview_size > 0:
+                yield from self._preview_events({0: raw_results}, preview_size)
+            with span("hybrid.fusion"):
+                results = self._fuse_and_rerank_candidates(
+                    raw_text_results=raw_results['text'],
+                    raw_image_results=raw_results['image'],
+                    raw_ocr_results=raw_results['ocr'],
+                    raw_subtitle_results=raw_results['subtitle'],
+                    weights=weights if weights is not None else {'text': 0.3, 'ocr': 0.3, 'image': 0.1, 'subtitle': 0.3}
+                )
+            # Một stage: mỗi kết quả là một cặp (path, score)
+            for result in results[:min(k, initial_search_k)]:
+                yield ('chain', result)
+            return
         # === BƯỚC 1 & 2: TÌM KIẾM BAN ĐẦU (Giữ nguyên để tối ưu hiệu năng) ===
-        vector_queries_to_process, vector_batch_map, ocr_queries_to_process, subtitle_queries_to_process = [], [], [], []
-        # ... (logic tập hợp và thực thi song song không đổi)
-        placeholder_query = "placeholder"
-        has_placeholder = False
-        for stage_idx, stage_data in enumerate(queries):
-            has_vector_query_in_stage = False
-            if stage_data.get('text'):
-                vector_queries_to_process.append(stage_data['text'])
-                vector_batch_map.append({'stage_idx': stage_idx, 'type': 'text'})
-                has_vector_query_in_stage = True
-            if stage_data.get('image'):
-                vector_queries_to_process.append(stage_data['image'])
-                vector_batch_map.append({'stage_idx': stage_idx, 'type': 'image'})
-                has_vector_query_in_stage = True
-            if not has_vector_query_in_stage and stage_data.get('ocr'):
-                if not has_placeholder:
-                    vector_queries_to_process.append(placeholder_query)
-                    has_placeholder = True
-                vector_batch_map.append({'stage_idx': stage_idx, 'type': 'placeholder', 'query_ref': placeholder_query})
-            if stage_data.get('ocr'):
-                ocr_queries_to_process.append((stage_idx, stage_data['ocr']))
-            if stage_data.get('subtitle'):
-                subtitle_queries_to_process.append((stage_idx, stage_data['subtitle']))
+        vector_queries_to_process, vector_batch_map = self._plan_vector_queries(queries)
+        ocr_queries_to_process = [(stage_idx, stage_data['ocr']) for stage_idx, stage_data in enumerate(queries) if stage_data.get('ocr')]
+        subtitle_queries_to_process = [(stage_idx, stage_data['subtitle']) for stage_idx, stage_data in enumerate(queries) if stage_data.get('subtitle')]
         batch_vector_results, ocr_results_by_stage, subtitle_results_by_stage = [], defaultdict(list), defaultdict(list)
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future_vector = executor.submit(self.vector_engine.search, vector_queries_to_process, vector_models_config, initial_search_k)
-            future_ocr = {executor.submit(self.ocr_engine.search_ocr, ocr_text, 1024): stage_idx for stage_idx, ocr_text in ocr_queries_to_process}
-            future_subtitle = {executor.submit(self.ocr_engine.search_subscript, subtitle_text, 1024): stage_idx for stage_idx, subtitle_text in subtitle_queries_to_process}
+        with span("temporal.retrieve"), concurrent.futures.ThreadPoolExecutor() as executor:
+            future_vector = None
+            if vector_results is not None:
+                batch_vector_results = vector_results
+            else:
+                future_vector = submit(executor, self.vector_engine.search, vector_queries_to_process, vector_models_config, initial_search_k)
+            future_ocr = {submit(executor, self.ocr_engine.search_ocr, ocr_text, 1024): stage_idx for stage_idx, ocr_text in ocr_queries_to_process}
+            future_subtitle = {submit(executor, self.ocr_engine.search_subscript, subtitle_text, 1024): stage_idx for stage_idx, subtitle_text in subtitle_queries_to_process}
 
-            try: 
-                batch_vector_results = future_vector.result()
-            except Exception as e: 
-                print(f"Lỗi batch vector search: {e}")
+            if future_vector:
+                try: 
+                    batch_vector_results = future_vector.result()
+                except Exception as e: 
+                    print(f"Lỗi batch vector search: {e}")
             for future in concurrent.futures.as_completed(future_ocr):
                 try: 
                     ocr_results_by_stage[future_ocr[future]] = future.result()
@@ -444,7 +764,6 @@ class SearchEngine:
                 except Exception as e: 
                     print(f"Lỗi OCR search cho stage {future_subtitle[future]}: {e}")
 
-        # === BƯỚC 3: TẠO CẤU TRÚC DỮ LIỆU `full_resuit` (Theo logic mới) ===
         raw_results_by_stage = defaultdict(lambda: {'text': [], 'image': [], 'ocr': [], 'subtitle': []})
         for i, mapping in enumerate(vector_batch_map):
             if mapping['type'] != 'placeholder':
@@ -455,7 +774,12 @@ class SearchEngine:
 
         for stage_idx, results in subtitle_results_by_stage.items():
             raw_results_by_stage[stage_idx]['subtitle'] = results       
-            
+
+        if preview_size > 0:
+            yield from self._preview_events(raw_results_by_stage, preview_size)
+
+        # === BƯỚC 3: TẠO CẤU TRÚC DỮ LIỆU `full_resuit` (Theo logic mới) ===
+        step_start = time.perf_counter()
         full_resuit_map = defaultdict(lambda: {'scores': [0.0] * num_stages, 'info': None, 'path': ''})
         for stage_idx in range(num_stages):
             stage_data = raw_results_by_stage[stage_idx]
@@ -482,8 +806,11 @@ class SearchEngine:
         valid_results = [v for k, v in full_resuit_map.items() if v['info']]
         full_resuit = [(item['info'], tuple(item['scores']), item['path']) for item in valid_results]
 
+        record("temporal.fusion", step_start)
+
         # === BƯỚC 4: SẮP XẾP VÀ NHÓM THEO THỜI GIAN (Theo logic mới) ===
-        if not full_resuit: return []
+        if not full_resuit: return
+        step_start = time.perf_counter()
         full_resuit.sort(key=lambda x: (x[0][0], x[0][1])) # Sắp xếp theo video, rồi theo frame
 
         rerank_results = []
@@ -497,7 +824,10 @@ class SearchEngine:
             else:
                 rerank_results[-1].append(item)
 
+        record("temporal.grouping", step_start)
+
         # === BƯỚC 5: QUY HOẠCH ĐỘNG ĐỂ TÌM CHUỖI TỐT NHẤT (Logic được sửa lại cho đúng) ===
+        step_start = time.perf_counter()
         final_chains = []
         for group in rerank_results:
             if not group: continue
@@ -591,6 +921,7 @@ class SearchEngine:
         
         # Lấy top-k chains trước khi expand shots
         top_k_chains = final_chains[:k]
+        record("temporal.dp", step_start)
         
         # # === BƯỚC 7: EXPAND SHOTS CHỈ CHO TOP-K (GIẢM SỐ LƯỢNG XỬ LÝ) ===
         # output_results = []
@@ -632,8 +963,8 @@ class SearchEngine:
         # return output_results
 
         # === BƯỚC 7: EXPAND SHOTS CHỈ CHO TOP-K (GIẢM SỐ LƯỢNG XỬ LÝ) ===
-        output_results = []
-        start_ = time.time()
+        # Mỗi chain được yield ngay khi expand xong (theo thứ tự top-k)
+        step_start = time.perf_counter()
         MAX_IMAGES = 16
 
         for item in top_k_chains:
@@ -740,7 +1071,7 @@ class SearchEngine:
                             (frame_path, (dummy_scores, item['score'], False, -1))
                         )
 
-                output_results.append(formatted_chain)
+                yield ('chain', formatted_chain)
 
             else:
                 # Xử lý format "agent" hoặc "all" như cũ
@@ -772,10 +1103,9 @@ class SearchEngine:
                     
                     score_for_stage = (frame_data[1], item['score'], is_peak_frame, peak_stage)
                     formatted_chain.append((frame_path, score_for_stage))
-                output_results.append(formatted_chain)
+                yield ('chain', formatted_chain)
 
-        print('time', time.time()-start_)
-        return output_results
+        record("temporal.shot_expansion", step_start)
     
     def get_cache_stats(self) -> Dict[str, Any]:
         """
@@ -0,0 +1,156 @@
+"""
+Đo thời gian theo span cho search server.
+
+- ``span(name)``: context manager đo một bước. Thời gian luôn được cộng vào histogram
+  (xem ``/metrics``); nếu request đang có trace (``trace_request``) thì span còn được
+  ghi lại kèm span cha để trả về trong ``debug_timings``.
+- Trace và span cha nằm trong ``contextvars``, nên khi đẩy việc sang ThreadPoolExecutor
+  phải dùng ``submit(executor, fn, ...)`` để mang context theo.
+"""
+
+import contextvars
+import itertools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+
+# Bucket (giây) cho histogram, từ tokenize vài trăm µs tới temporal search vài giây
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # bucket cuối là +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Histogram thời gian theo tên span, xuất ra định dạng text của Prometheus.
+    """
+
+    def __init__(self, metric_name: str = 'search_span_duration_seconds', buckets=DEFAULT_BUCKETS):
+        self.metric_name = metric_name
+        self.buckets = buckets
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, span_name: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(span_name)
+            if histogram is None:
+                histogram = self._histograms[span_name] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def render_prometheus(self) -> str:
+        name = self.metric_name
+        lines = [
+            f"# HELP {name} Thời gian xử lý từng bước của search server.",
+            f"# TYPE {name} histogram",
+        ]
+        with self._lock:
+            for span_name in sorted(self._histograms):
+                histogram = self._histograms[span_name]
+                label = span_name.replace('\\', '\\\\').replace('"', '\\"')
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{span="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{span="{label}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_sum{{span="{label}"}} {histogram.sum}')
+                lines.append(f'{name}_count{{span="{label}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+
+class Trace:
+    """Các span đã hoàn thành của một request."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.start) * 1000, 3)
+
+    def next_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+
+    def add(self, span_id: int, parent: Optional[int], name: str, start: float, duration: float):
+        with self._lock:
+            self.spans.append({
+                'id': span_id,
+                'parent': parent,
+                'name': name,
+                'start_ms': round((start - self.start) * 1000, 3),
+                'duration_ms': round(duration * 1000, 3),
+            })
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return sorted(self.spans, key=lambda s: (s['start_ms'], s['id']))
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('search_trace', default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar('search_span', default=None)
+
+
+@contextmanager
+def trace_request():
+    """Bắt đầu trace cho một request; yield ``Trace``."""
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str):
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    span_id = trace.next_id() if trace is not None else None
+    token = _current_span.set(span_id)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        _current_span.reset(token)
+        METRICS.observe(name, duration)
+        if trace is not None:
+            trace.add(span_id, parent, name, start, duration)
+
+
+def submit(executor, fn, *args, **kwargs):
+    """``executor.submit`` nhưng chạy ``fn`` trong bản sao context hiện tại (giữ trace/span cha)."""
+    ctx = contextvars.copy_context()
+    return executor.submit(ctx.run, fn, *args, **kwargs)
+
+
+def record(name: str, start: float):
+    """
+    Ghi một span đã kết thúc, bắt đầu từ ``start`` (``time.perf_counter()``) tới bây giờ.
+    Dùng cho các bước tuần tự dài mà không muốn bọc cả khối code trong ``with span``.
+    """
+    duration = time.perf_counter() - start
+    METRICS.observe(name, duration)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(trace.next_id(), _current_span.get(), name, start, duration)